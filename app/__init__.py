@@ -1,4 +1,6 @@
-from flask import Flask
+import atexit
+import os
+from flask import Flask, request
 
 def create_app():
     """Create and configure the Flask application"""
@@ -7,10 +9,27 @@ def create_app():
         SECRET_KEY='dev',
         DEBUG=True
     )
+    # Recount capacity after every mutating request (slow, for debugging only);
+    # off unless CHECK_COUNTERS=1 is set in the environment
+    app.config.setdefault('CHECK_COUNTERS',
+                          os.environ.get('CHECK_COUNTERS', '').lower() in ('1', 'true', 'yes'))
+    # A .db, .sqlite or .sqlite3 file selects the SQLite storage backend
+    app.config.setdefault('DATA_FILE', 'warehouse_data.json')
+    # "sync" fsyncs before each response, "async" within PERSISTENCE_MAX_DELAY
+    # seconds, "interval" at most every PERSISTENCE_INTERVAL seconds
+    app.config.setdefault('PERSISTENCE_MODE', 'async')
+    app.config.setdefault('PERSISTENCE_MAX_DELAY', 0.05)
+    app.config.setdefault('PERSISTENCE_INTERVAL', 1.0)
     
     # Initialize warehouse system
     from app.models.warehouse_system import WarehouseSystem
-    app.warehouse_system = WarehouseSystem()
+    app.warehouse_system = WarehouseSystem(
+        app.config['DATA_FILE'],
+        durability=app.config['PERSISTENCE_MODE'],
+        max_delay=app.config['PERSISTENCE_MAX_DELAY'],
+        flush_interval=app.config['PERSISTENCE_INTERVAL']
+    )
+    atexit.register(app.warehouse_system.close)
     
     # Register blueprints
     from app.routes import warehouse, line, package, pallet, dashboard
@@ -24,4 +43,15 @@ def create_app():
     def index():
         return dashboard.index()
     
+    if app.config['CHECK_COUNTERS']:
+        @app.after_request
+        def check_counters(response):
+            if request.method != 'GET':
+                # The recount walks every index, so writers must wait for it
+                with app.warehouse_system.lock:
+                    mismatches = app.warehouse_system.manager.check_counters()
+                for mismatch in mismatches:
+                    app.logger.error(f"Capacity counter drift: {mismatch}")
+            return response
+    
     return app
\ No newline at end of file
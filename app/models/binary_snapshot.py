@@ -0,0 +1,495 @@
+import json
+import mmap
+import os
+import struct
+from app.models.partition_summary import summarize_partition
+
+# Binary snapshot layout (little-endian):
+#
+#   header       magic, version, partition count, lsn, offload order
+#   sections     (offset, byte size) for each entry in SECTIONS
+#   rows         one run per partition in each of PARTITION_SECTIONS
+#   partitions   (offset, byte size) of the partition's run in each of
+#                PARTITION_SECTIONS, relative to the section
+#   summaries    JSON list of partition summaries, so totals can be reported
+#                without decoding the partitions
+#
+# Objects are grouped into partitions: one per warehouse (holding its lines,
+# the pallets on them and every package on those) and partitions for
+# everything not placed in a warehouse. A partition only refers to its own
+# rows: serials, names and quality marks are ids into the partition's string
+# table, and member and history starts count from the partition's run. So a
+# partition can be decoded on its own, and copied into a new snapshot byte
+# for byte. Each partition's serials are sorted for lookups.
+#
+# Versions 2 and 3 shared one string table and serial index between all
+# partitions (section counts instead of sizes, offload order as a string id,
+# version 2 without summaries); they are still read.
+
+MAGIC = b"BHCZSNAP"
+SNAPSHOT_VERSION = 4
+READABLE_VERSIONS = (2, 3, 4)
+
+HEADER = struct.Struct("<8sIIqi")
+SECTION = struct.Struct("<qq")
+PARTITION_SECTIONS = ("string_offsets", "strings", "warehouses", "lines", "pallets",
+                      "packages", "members", "history", "serials")
+SECTIONS = PARTITION_SECTIONS + ("partitions", "summaries")
+LEGACY_SECTIONS = ("string_offsets", "strings", "warehouses", "lines", "pallets",
+                   "packages", "members", "history", "partitions", "serials", "summaries")
+
+STRING_OFFSET = struct.Struct("<q")
+STRING_SPAN = struct.Struct("<qq")
+WAREHOUSE = struct.Struct("<IIdq")          # serial, name, max_capacity, created_ts
+LINE = struct.Struct("<IqdBBiIIIIII")       # serial, line_number, max_capacity, capacity_type,
+                                            # mixed_quality_approved, max_quality_types,
+                                            # cartons, pallets and history as (start, count)
+PALLET = struct.Struct("<IIqqII")           # serial, quality_mark, max_capacity, created_ts,
+                                            # packages as (start, count)
+PACKAGE = struct.Struct("<IBIdqB")          # serial, package_type, quality_mark, mass,
+                                            # created_ts, discarded
+MEMBER = struct.Struct("<I")                # Serial of a carton, pallet or pallet package
+HISTORY = struct.Struct("<IBq")             # package serial, action, timestamp
+PARTITION = struct.Struct("<" + "qq" * len(PARTITION_SECTIONS))
+SERIAL = struct.Struct("<I")                # serial; sorted by serial
+LEGACY_PARTITION = struct.Struct("<IIIIIIII")  # warehouses, lines, pallets, packages as (start, count)
+LEGACY_SERIAL = struct.Struct("<II")           # serial, partition; sorted by serial
+
+CAPACITY_TYPES = ("weight", "count")
+PACKAGE_TYPES = ("loose", "carton")
+OFFLOAD_ORDERS = ("oldest_first", "newest_first")
+
+
+class StringTable:
+    """Interns strings to sequential ids while a snapshot is written"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+
+def group_partitions(state):
+    """
+    Split a state into partitions
+
+    Args:
+        state (dict): State produced by persistence.dump_state
+
+    Returns:
+        list: One dict per warehouse, then one for everything outside
+            warehouses, each with the warehouses, lines, pallets and
+            packages keys of the state
+    """
+    global_partition = len(state["warehouses"])
+    partition_count = global_partition + 1
+
+    # Assign every object to the partition of the warehouse holding it
+    warehouse_partitions = {row[0]: i for i, row in enumerate(state["warehouses"])}
+    line_partitions = []
+    pallet_partitions = {}
+    package_partitions = {}
+    for line in state["lines"]:
+        partition = warehouse_partitions.get(line["warehouse"], global_partition)
+        line_partitions.append(partition)
+        for serial_number in line["cartons"]:
+            package_partitions[serial_number] = partition
+        for serial_number in line["pallets"]:
+            pallet_partitions[serial_number] = partition
+    for pallet in state["pallets"]:
+        partition = pallet_partitions.get(pallet[0], global_partition)
+        for serial_number in pallet[4]:
+            package_partitions[serial_number] = partition
+
+    grouped = [{name: [] for name in ("warehouses", "lines", "pallets", "packages")}
+               for _ in range(partition_count)]
+    for i, warehouse in enumerate(state["warehouses"]):
+        grouped[i]["warehouses"].append(warehouse)
+    for line, partition in zip(state["lines"], line_partitions):
+        grouped[partition]["lines"].append(line)
+    for pallet in state["pallets"]:
+        grouped[pallet_partitions.get(pallet[0], global_partition)]["pallets"].append(pallet)
+    for package in state["packages"]:
+        grouped[package_partitions.get(package[0], global_partition)]["packages"].append(package)
+    return grouped
+
+
+def encode_partition(partition):
+    """
+    Pack the rows of one partition
+
+    Args:
+        partition (dict): Warehouses, lines, pallets and packages in
+            persistence.dump_state format
+
+    Returns:
+        dict: Bytes of the partition's run in each of PARTITION_SECTIONS
+    """
+    strings = StringTable()
+    intern = strings.intern
+    sections = {name: bytearray() for name in PARTITION_SECTIONS}
+    serials = []
+    members = []
+    history = []
+
+    def add_members(serial_numbers):
+        start = len(members)
+        members.extend(intern(serial_number) for serial_number in serial_numbers)
+        return start, len(members) - start
+
+    for serial_number, name, max_capacity, created_ts in partition["warehouses"]:
+        sections["warehouses"] += WAREHOUSE.pack(intern(serial_number), intern(name), max_capacity, created_ts)
+        serials.append(serial_number)
+
+    for line in partition["lines"]:
+        cartons = add_members(line["cartons"])
+        pallets = add_members(line["pallets"])
+        history_start = len(history)
+        history.extend((intern(serial_number), action, timestamp)
+                       for serial_number, action, timestamp in line["history"])
+        sections["lines"] += LINE.pack(
+            intern(line["serial_number"]), line["line_number"], line["max_capacity"],
+            CAPACITY_TYPES.index(line["capacity_type"]), line["mixed_quality_approved"],
+            line["max_quality_types"], *cartons, *pallets,
+            history_start, len(history) - history_start)
+        serials.append(line["serial_number"])
+
+    for serial_number, quality_mark, max_capacity, created_ts, contents in partition["pallets"]:
+        sections["pallets"] += PALLET.pack(intern(serial_number), intern(quality_mark),
+                                           max_capacity, created_ts, *add_members(contents))
+        serials.append(serial_number)
+
+    for serial_number, package_type, quality_mark, mass, created_ts, discarded in partition["packages"]:
+        sections["packages"] += PACKAGE.pack(intern(serial_number), PACKAGE_TYPES.index(package_type),
+                                             intern(quality_mark), mass, created_ts, discarded)
+        serials.append(serial_number)
+
+    for member in members:
+        sections["members"] += MEMBER.pack(member)
+    for row in history:
+        sections["history"] += HISTORY.pack(*row)
+    for serial_number in sorted(serials):
+        sections["serials"] += SERIAL.pack(intern(serial_number))
+
+    offset = 0
+    for value in strings.strings:
+        sections["string_offsets"] += STRING_OFFSET.pack(offset)
+        encoded = value.encode()
+        sections["strings"] += encoded
+        offset += len(encoded)
+    sections["string_offsets"] += STRING_OFFSET.pack(offset)
+    return sections
+
+
+def write_snapshot(path, state, source=None):
+    """
+    Atomically write a binary snapshot
+
+    The partitions named in state["unloaded"] are taken from source: copied
+    byte for byte along with their summaries when source has this layout,
+    or decoded and packed again from an older one. None of their objects
+    are built.
+
+    Args:
+        path (str): Snapshot file path
+        state (dict): State produced by persistence.dump_state
+        source (SnapshotReader, optional): Snapshot holding the unloaded
+            partitions
+
+    Returns:
+        list: New partition number of each unloaded partition, in order
+    """
+    # Each part is (section -> byte size, function returning a section's bytes)
+    parts = []
+    summaries = []
+    versions = state.get("versions", {})
+    for partition in group_partitions(state):
+        packed = encode_partition(partition)
+        parts.append(({name: len(data) for name, data in packed.items()}, packed.__getitem__))
+        warehouse = partition["warehouses"][0][0] if partition["warehouses"] else None
+        summaries.append(summarize_partition(partition, versions.get(warehouse)))
+
+    unloaded = state.get("unloaded", [])
+    placed = list(range(len(parts), len(parts) + len(unloaded)))
+    source_summaries = source.summaries() if unloaded else {}
+    for partition in unloaded:
+        summary = source_summaries.get(partition)
+        if source.version == SNAPSHOT_VERSION:
+            parts.append(source.packed(partition))
+        else:
+            decoded = source.partition_state(partition)
+            packed = encode_partition(decoded)
+            parts.append(({name: len(data) for name, data in packed.items()}, packed.__getitem__))
+            if summary is None:
+                summary = summarize_partition(decoded)
+        summaries.append(summary)
+
+    partition_table = bytearray()
+    sizes = dict.fromkeys(SECTIONS, 0)
+    for part_sizes, _ in parts:
+        values = []
+        for name in PARTITION_SECTIONS:
+            values += [sizes[name], part_sizes[name]]
+            sizes[name] += part_sizes[name]
+        partition_table += PARTITION.pack(*values)
+    summary_bytes = json.dumps(summaries, separators=(",", ":")).encode()
+    sizes["partitions"] = len(partition_table)
+    sizes["summaries"] = len(summary_bytes)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(parts), state["lsn"],
+                            OFFLOAD_ORDERS.index(state["offload_order"])))
+        position = HEADER.size + SECTION.size * len(SECTIONS)
+        for name in SECTIONS:
+            f.write(SECTION.pack(position, sizes[name]))
+            position += sizes[name]
+        for name in PARTITION_SECTIONS:
+            for _, section in parts:
+                f.write(section(name))
+        f.write(partition_table)
+        f.write(summary_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return placed
+
+
+class SnapshotReader:
+    """Memory-mapped binary snapshot, decoded one partition at a time"""
+
+    def __init__(self, path):
+        """
+        Map a snapshot file
+
+        Only the header is read here, rows are decoded on demand.
+
+        Args:
+            path (str): Snapshot file path
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version
+        """
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.version, self.partition_count, self.lsn, offload_order = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or self.version not in READABLE_VERSIONS:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} snapshot")
+
+        self.sections = {}
+        if self.version >= 4:
+            names = SECTIONS
+        else:
+            names = LEGACY_SECTIONS if self.version == 3 else LEGACY_SECTIONS[:-1]
+        for i, name in enumerate(names):
+            self.sections[name] = SECTION.unpack_from(self.map, HEADER.size + SECTION.size * i)
+        if self.version >= 4:
+            self.offload_order = OFFLOAD_ORDERS[offload_order]
+        else:
+            self.offload_order = self.string(self._legacy_tables(), offload_order)
+
+    def partitions(self):
+        """Partition numbers in the snapshot"""
+        return range(self.partition_count)
+
+    def close(self):
+        """Unmap the file"""
+        self.map.close()
+
+    def _spans(self, partition):
+        """Absolute (offset, byte size) of a partition's run in each section"""
+        values = PARTITION.unpack_from(self.map, self.sections["partitions"][0] + PARTITION.size * partition)
+        return {name: (self.sections[name][0] + values[2 * i], values[2 * i + 1])
+                for i, name in enumerate(PARTITION_SECTIONS)}
+
+    def _legacy_tables(self):
+        """Offsets of the string table, members and history shared by every legacy partition"""
+        return {name: self.sections[name][0] for name in ("string_offsets", "strings", "members", "history")}
+
+    def _layout(self, partition):
+        """
+        Locate a partition's rows
+
+        Returns:
+            tuple: (tables, runs) where tables maps string_offsets, strings,
+                members and history to the offset their ids count from, and
+                runs maps warehouses, lines, pallets and packages to the
+                (offset, count) of the partition's rows
+        """
+        layouts = (("warehouses", WAREHOUSE), ("lines", LINE), ("pallets", PALLET), ("packages", PACKAGE))
+        if self.version >= 4:
+            spans = self._spans(partition)
+            tables = {name: spans[name][0] for name in ("string_offsets", "strings", "members", "history")}
+            runs = {name: (spans[name][0], spans[name][1] // layout.size) for name, layout in layouts}
+            return tables, runs
+
+        values = self.row("partitions", LEGACY_PARTITION, partition)
+        runs = {name: (self.sections[name][0] + layout.size * values[2 * i], values[2 * i + 1])
+                for i, (name, layout) in enumerate(layouts)}
+        return self._legacy_tables(), runs
+
+    def row(self, section, layout, index):
+        """Unpack one fixed-width row of a section"""
+        return layout.unpack_from(self.map, self.sections[section][0] + layout.size * index)
+
+    def rows(self, offset, layout, start, count):
+        """Unpack count consecutive rows of a table starting at offset"""
+        offset += layout.size * start
+        return layout.iter_unpack(self.map[offset:offset + layout.size * count])
+
+    def string(self, tables, string_id):
+        """Decode a string from a string table"""
+        # Consecutive offsets give the start and end of the string
+        start, end = STRING_SPAN.unpack_from(self.map, tables["string_offsets"] + STRING_OFFSET.size * string_id)
+        base = tables["strings"]
+        return self.map[base + start:base + end].decode()
+
+    def find(self, serial_number, partitions=None):
+        """
+        Find the partition holding a serial number
+
+        Args:
+            serial_number (str): Serial number of any object
+            partitions (iterable, optional): Only search these partitions
+
+        Returns:
+            int: The partition, or None if the snapshot has no such object
+        """
+        if self.version < 4:
+            tables = self._legacy_tables()
+            offset, count = self.sections["serials"]
+            index = self._search(tables, offset, LEGACY_SERIAL, count, serial_number)
+            if index is None:
+                return None
+            return LEGACY_SERIAL.unpack_from(self.map, offset + LEGACY_SERIAL.size * index)[1]
+
+        for partition in (self.partitions() if partitions is None else sorted(partitions)):
+            spans = self._spans(partition)
+            tables = {name: spans[name][0] for name in ("string_offsets", "strings")}
+            offset, size = spans["serials"]
+            if self._search(tables, offset, SERIAL, size // SERIAL.size, serial_number) is not None:
+                return partition
+        return None
+
+    def _search(self, tables, offset, layout, count, serial_number):
+        """Binary search sorted serial rows, returning the matching row index"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            value = self.string(tables, layout.unpack_from(self.map, offset + layout.size * middle)[0])
+            if value == serial_number:
+                return middle
+            if value < serial_number:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def summaries(self):
+        """
+        Decode the partition summaries
+
+        Returns:
+            dict: Partition -> summary, empty for snapshots written without them
+        """
+        if "summaries" not in self.sections:
+            return {}
+        offset, size = self.sections["summaries"]
+        return dict(enumerate(json.loads(self.map[offset:offset + size])))
+
+    def packed(self, partition):
+        """
+        Get the packed rows of a partition, for copying into a new snapshot
+
+        Args:
+            partition (int): Partition number
+
+        Returns:
+            tuple: (section -> byte size, function returning a section's bytes)
+        """
+        spans = self._spans(partition)
+
+        def section(name):
+            offset, size = spans[name]
+            return self.map[offset:offset + size]
+
+        return {name: size for name, (_, size) in spans.items()}, section
+
+    def partition_state(self, partition):
+        """
+        Decode one partition
+
+        Args:
+            partition (int): Partition number
+
+        Returns:
+            dict: The partition's objects in persistence.dump_state format
+        """
+        tables, runs = self._layout(partition)
+
+        def string(string_id):
+            return self.string(tables, string_id)
+
+        def members(start, count):
+            return [string(string_id) for (string_id,) in self.rows(tables["members"], MEMBER, start, count)]
+
+        warehouses = [
+            [string(serial), string(name), max_capacity, created_ts]
+            for serial, name, max_capacity, created_ts
+            in self.rows(runs["warehouses"][0], WAREHOUSE, 0, runs["warehouses"][1])
+        ]
+        warehouse = warehouses[0][0] if warehouses else None
+
+        lines = []
+        for (serial, line_number, max_capacity, capacity_type, approved, max_quality_types,
+             carton_start, carton_count, pallet_member_start, pallet_member_count,
+             history_start, history_count) in self.rows(runs["lines"][0], LINE, 0, runs["lines"][1]):
+            lines.append({
+                "serial_number": string(serial),
+                "line_number": line_number,
+                "max_capacity": max_capacity,
+                "capacity_type": CAPACITY_TYPES[capacity_type],
+                "max_quality_types": max_quality_types,
+                "mixed_quality_approved": bool(approved),
+                "warehouse": warehouse,
+                "cartons": members(carton_start, carton_count),
+                "pallets": members(pallet_member_start, pallet_member_count),
+                "history": [
+                    [string(package), action, timestamp]
+                    for package, action, timestamp
+                    in self.rows(tables["history"], HISTORY, history_start, history_count)
+                ]
+            })
+
+        pallets = [
+            [string(serial), string(quality_mark), max_capacity, created_ts,
+             members(member_start, member_count)]
+            for serial, quality_mark, max_capacity, created_ts, member_start, member_count
+            in self.rows(runs["pallets"][0], PALLET, 0, runs["pallets"][1])
+        ]
+
+        packages = [
+            [string(serial), PACKAGE_TYPES[package_type], string(quality_mark),
+             mass, created_ts, bool(discarded)]
+            for serial, package_type, quality_mark, mass, created_ts, discarded
+            in self.rows(runs["packages"][0], PACKAGE, 0, runs["packages"][1])
+        ]
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "lsn": self.lsn,
+            "offload_order": self.offload_order,
+            "warehouses": warehouses,
+            "lines": lines,
+            "pallets": pallets,
+            "packages": packages
+        }
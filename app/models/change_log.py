@@ -0,0 +1,100 @@
+from collections import deque
+
+# Change records kept per warehouse; older versions get a full snapshot instead
+CHANGE_LOG_SIZE = 10000
+
+
+class ChangeLog:
+    """Bounded ring of the most recent changes to a warehouse's contents"""
+
+    __slots__ = ("records", "floor")
+
+    def __init__(self, capacity=CHANGE_LOG_SIZE, floor=0):
+        """
+        Initialize an empty log
+
+        Args:
+            capacity (int): Maximum number of records kept
+            floor (int): Version the log starts at, older versions get None
+        """
+        # Records are (version, action, kind, item, line number, pallet, package serials)
+        self.records = deque(maxlen=capacity)
+        self.floor = floor  # Every change after this version is still in the ring
+
+    def append(self, version, action, kind, item, line_number, pallet=None, packages=None):
+        """
+        Add a change record, dropping the oldest one if the ring is full
+
+        Args:
+            version (int): Warehouse version the change produced
+            action (str): "added", "removed" or "discarded"
+            kind (str): "carton", "pallet" or "package"
+            item: The Package or Pallet that changed
+            line_number (int): Number of the line involved
+            pallet: The Pallet a loose package went onto or left, if any
+            packages (tuple): Serial numbers of an added pallet's packages
+        """
+        if len(self.records) == self.records.maxlen:
+            self.floor = self.records[0][0]
+        self.records.append((version, action, kind, item, line_number, pallet, packages))
+
+    def reset(self, version):
+        """
+        Drop every record, for changes the records cannot describe
+
+        Args:
+            version (int): Warehouse version after the change
+        """
+        self.records.clear()
+        self.floor = version
+
+    def since(self, version):
+        """
+        Get the records after a version
+
+        Args:
+            version (int): Version the caller last saw
+
+        Returns:
+            list: Records in order, None if some have already been dropped
+        """
+        if version < self.floor:
+            return None
+        changes = []
+        for record in reversed(self.records):
+            if record[0] <= version:
+                break
+            changes.append(record)
+        changes.reverse()
+        return changes
+
+
+def format_change(record):
+    """
+    Convert a change record to a JSON-ready dict
+
+    Args:
+        record (tuple): A record from ChangeLog.since
+
+    Returns:
+        dict: The change, with the details of the package or pallet involved
+    """
+    version, action, kind, item, line_number, pallet, packages = record
+    change = {
+        "version": version,
+        "action": action,
+        "kind": kind,
+        "serial_number": item.serial_number,
+        "line_number": line_number,
+        "quality_mark": item.quality_mark,
+    }
+    if kind == "pallet":
+        change["max_capacity"] = item.max_capacity
+        if packages is not None:
+            change["packages"] = list(packages)
+    else:
+        change["mass"] = item.mass
+        change["created_at"] = item.created_at.isoformat()
+    if pallet is not None:
+        change["pallet"] = pallet.serial_number
+    return change
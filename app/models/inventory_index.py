@@ -0,0 +1,241 @@
+from array import array
+from bisect import bisect_left
+from heapq import merge
+
+
+def package_placement(package):
+    """
+    Get where a package currently sits
+
+    Args:
+        package: The Package to look at
+
+    Returns:
+        str: "pallet" for a loose package on a pallet, "line" for a carton
+            on a line, "unassigned" otherwise
+    """
+    if getattr(package, "pallet", None) is not None:
+        return "pallet"
+    return "line" if package.location is not None else "unassigned"
+
+
+def pallet_placement(pallet):
+    """
+    Get where a pallet currently sits
+
+    Args:
+        pallet: The Pallet to look at
+
+    Returns:
+        str: "line" for a pallet on a line, "unassigned" otherwise
+    """
+    return "line" if pallet.location is not None else "unassigned"
+
+
+class InventoryIndex:
+    """Secondary indexes over packages or pallets, for filtered queries"""
+
+    def __init__(self, items, fixed, states, position=None):
+        """
+        Initialize an empty index
+
+        Args:
+            items: The manager's sequence of indexed objects, which grows in
+                the same order objects are added here
+            fixed (dict): Field name -> key function, for values that never
+                change once an object is added
+            states (dict): Field name -> key function, for values that change
+                as objects move or are discarded
+            position (function, optional): Object -> its index in items;
+                positions are tracked here when not given
+        """
+        self.items = items
+        self.fixed = fixed
+        self.states = states
+        self.position = position
+        self.positions = {} if position is None else None  # object -> position
+        # Fixed postings only grow, so arrays of positions stay in order
+        self.fixed_postings = {name: {} for name in fixed}  # name -> value -> array of positions
+        self.state_postings = {name: {} for name in states}  # name -> value -> set of positions
+        self.created = array("i")  # positions ordered by creation time
+        self.created_sorted = True
+
+    def _position(self, item):
+        if self.positions is not None:
+            return self.positions.get(item)
+        return self.position(item)
+
+    def _created_ts(self, position):
+        return self.items[position].created_ts
+
+    def add(self, item):
+        """
+        Index an object just appended to items
+
+        Args:
+            item: The Package or Pallet to add
+        """
+        if self.positions is not None:
+            if item in self.positions:
+                return
+            self.positions[item] = len(self.positions)
+        position = self._position(item)
+        for name, key in self.fixed.items():
+            postings = self.fixed_postings[name]
+            value = key(item)
+            if value not in postings:
+                postings[value] = array("i")
+            postings[value].append(position)
+        for name, key in self.states.items():
+            self.state_postings[name].setdefault(key(item), set()).add(position)
+        if self.created and item.created_ts < self._created_ts(self.created[-1]):
+            self.created_sorted = False
+        self.created.append(position)
+
+    def extend(self, items):
+        """
+        Index many objects just appended to items
+
+        Args:
+            items: Iterable of Package or Pallet objects
+        """
+        if self.positions is not None:
+            for item in items:
+                self.add(item)
+            return
+        # Filled one field at a time, which keeps bulk imports cheap
+        items = list(items)
+        if not items:
+            return
+        positions = list(map(self.position, items))
+        for name, key in self.fixed.items():
+            postings = self.fixed_postings[name]
+            for value, position in zip(map(key, items), positions):
+                posting = postings.get(value)
+                if posting is None:
+                    posting = postings[value] = array("i")
+                posting.append(position)
+        for name, key in self.states.items():
+            postings = self.state_postings[name]
+            for value, position in zip(map(key, items), positions):
+                posting = postings.get(value)
+                if posting is None:
+                    posting = postings[value] = set()
+                posting.add(position)
+        created = [item.created_ts for item in items]
+        if self.created:
+            created.insert(0, self._created_ts(self.created[-1]))
+        if any(later < earlier for earlier, later in zip(created, created[1:])):
+            self.created_sorted = False
+        self.created.extend(positions)
+
+    def update(self, item):
+        """
+        Re-file an object after it moved or was discarded
+
+        Args:
+            item: The Package or Pallet that changed
+        """
+        position = self._position(item)
+        if position is None:
+            return
+        for name, key in self.states.items():
+            postings = self.state_postings[name]
+            value = key(item)
+            current = postings.get(value)
+            if current is not None and position in current:
+                continue
+            for posting in postings.values():
+                posting.discard(position)
+            postings.setdefault(value, set()).add(position)
+
+    def is_current(self, item):
+        """
+        Check that an object is filed under its current states
+
+        Args:
+            item: The Package or Pallet to check
+
+        Returns:
+            bool: True if every state posting matches the object
+        """
+        position = self._position(item)
+        for name, key in self.states.items():
+            value = key(item)
+            for posting_value, posting in self.state_postings[name].items():
+                if (position in posting) != (posting_value == value):
+                    return False
+        return True
+
+    def query(self, created_after=None, created_before=None, **filters):
+        """
+        Find the objects matching every filter
+
+        The most selective posting drives the scan and the other filters
+        are checked per object, so no query walks the whole inventory
+        unless it has no filters at all.
+
+        Args:
+            created_after (int, optional): Earliest creation time, epoch
+                microseconds, inclusive
+            created_before (int, optional): Latest creation time, epoch
+                microseconds, exclusive
+            **filters: Field name -> value, or a list/tuple/set of accepted
+                values
+
+        Returns:
+            iterator: Matching objects in the order they were added
+
+        Raises:
+            ValueError: If a filter names a field that is not indexed
+        """
+        plans = []  # (size, ordered positions factory, position check)
+        for name, values in filters.items():
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = (values,)
+            values = set(values)
+            if name in self.fixed:
+                postings = [self.fixed_postings[name][value]
+                            for value in values if value in self.fixed_postings[name]]
+                key = self.fixed[name]
+                plans.append((sum(map(len, postings)),
+                              lambda postings=postings: merge(*postings),
+                              lambda position, key=key, values=values: key(self.items[position]) in values))
+            elif name in self.states:
+                postings = [self.state_postings[name][value]
+                            for value in values if value in self.state_postings[name]]
+                plans.append((sum(map(len, postings)),
+                              lambda postings=postings: sorted(set().union(*postings)),
+                              lambda position, postings=postings: any(position in posting for posting in postings)))
+            else:
+                raise ValueError(f"Cannot filter on {name}")
+
+        if created_after is not None or created_before is not None:
+            if not self.created_sorted:
+                # Creation times only arrive out of order on imports, so this is rare
+                self.created = array("i", sorted(self.created, key=self._created_ts))
+                self.created_sorted = True
+            low = bisect_left(self.created, created_after, key=self._created_ts) if created_after is not None else 0
+            high = (bisect_left(self.created, created_before, key=self._created_ts)
+                    if created_before is not None else len(self.created))
+            after = created_after if created_after is not None else float("-inf")
+            before = created_before if created_before is not None else float("inf")
+            plans.append((max(high - low, 0),
+                          lambda low=low, high=high: sorted(self.created[low:high]),
+                          lambda position: after <= self._created_ts(position) < before))
+
+        if not plans:
+            return self._scan(range(len(self.items)), ())
+        plans.sort(key=lambda plan: plan[0])
+        return self._scan(plans[0][1](), [plan[2] for plan in plans])
+
+    def _scan(self, positions, checks):
+        """Yield the objects at positions that pass every check"""
+        items = self.items
+        for position in positions:
+            # Checks are repeated for the driving posting too, since the
+            # object may have changed since the scan started
+            if all(check(position) for check in checks):
+                yield items[position]
@@ -1,9 +1,17 @@
 import uuid
-from datetime import datetime
+from app.models.offload_queue import OffloadQueue
+from app.models.ordered_set import OrderedSet
+from app.models.package_history import PackageHistory
+from app.models.quality_registry import quality_registry
 
 class Line:
     """Storage line within a warehouse rack"""
     
+    __slots__ = ("serial_number", "line_number", "max_capacity", "capacity_type",
+                 "max_quality_types", "packages", "pallets", "package_history",
+                 "total_mass", "package_count", "quality_counts", "quality_mask",
+                 "mixed_quality_approved", "warehouse", "manager", "offload_queue")
+    
     def __init__(self, line_number, max_capacity, capacity_type="weight", max_quality_types=1, serial_number=None):
         """
         Initialize a storage line
@@ -20,20 +28,89 @@ class Line:
         self.max_capacity = max_capacity
         self.capacity_type = capacity_type  # "weight" or "count"
         self.max_quality_types = max_quality_types
-        self.packages = []  # For cartons
-        self.pallets = []   # For loose packages
-        self.package_history = []  # All packages ever placed in this line
+        self.packages = OrderedSet()  # For cartons
+        self.pallets = OrderedSet()   # For loose packages
+        self.package_history = PackageHistory()  # All packages ever placed in this line
+        self.offload_queue = OffloadQueue()  # Stored packages ordered by creation time
+        self.total_mass = 0  # Running totals, updated on add/remove
+        self.package_count = 0
+        self.quality_counts = {}  # quality id -> number of cartons/pallets
+        self.quality_mask = 0  # Bit per quality id present on the line
         self.mixed_quality_approved = max_quality_types > 1
         self.warehouse = None  # Will be set when assigned to a warehouse
+        self.manager = None  # Set when registered with a LogisticsManager
     
     @property
     def current_capacity_usage(self):
-        """Calculate current capacity usage based on type"""
+        """Current capacity usage based on type"""
         if self.capacity_type == "count":
-            return len(self.packages)
+            return self.package_count
         else:  # weight
-            total = sum(pallet.total_mass for pallet in self.pallets)
-            return total
+            return self.total_mass
+    
+    def adjust_totals(self, mass, count):
+        """
+        Apply a change in stored mass and package count
+        
+        Args:
+            mass (float): Change in stored mass in kg
+            count (int): Change in number of stored packages
+        """
+        usage_before = self.current_capacity_usage
+        self.total_mass += mass
+        self.package_count += count
+        usage = self.current_capacity_usage - usage_before
+        if self.warehouse is not None:
+            self.warehouse.adjust_totals(mass, count, usage)
+        if self.manager is not None:
+            self.manager.stats.adjust_line(self, mass, count, usage)
+            if usage:
+                self.manager.line_capacity_index.update(self)
+    
+    def enqueue_packages(self, packages):
+        """
+        Add packages to the offload queues of this line and its warehouse
+        
+        Args:
+            packages: Iterable of Package objects now stored on the line
+        """
+        warehouse_queue = self.warehouse.offload_queue if self.warehouse is not None else None
+        for package in packages:
+            self.offload_queue.add(package)
+            if warehouse_queue is not None:
+                warehouse_queue.add(package)
+        if self.manager is not None:
+            self.manager.stats.store(packages, 1)
+    
+    def dequeue_packages(self, packages):
+        """
+        Remove packages from the offload queues of this line and its warehouse
+        
+        Args:
+            packages: Iterable of Package objects no longer stored on the line
+        """
+        warehouse_queue = self.warehouse.offload_queue if self.warehouse is not None else None
+        for package in packages:
+            self.offload_queue.remove(package)
+            if warehouse_queue is not None:
+                warehouse_queue.remove(package)
+        if self.manager is not None:
+            self.manager.stats.store(packages, -1)
+    
+    def recount_totals(self):
+        """
+        Recalculate mass, package count and usage from scratch
+        
+        Returns:
+            tuple: (total mass, package count, capacity usage)
+        """
+        mass = sum(carton.mass for carton in self.packages)
+        count = len(self.packages)
+        for pallet in self.pallets:
+            mass += pallet.recount_total_mass()
+            count += len(pallet.packages)
+        usage = len(self.packages) if self.capacity_type == "count" else mass
+        return mass, count, usage
     
     @property
     def available_capacity(self):
@@ -43,15 +120,12 @@ class Line:
     @property
     def is_mixed(self):
         """Check if line contains mixed quality packages"""
-        return len(self.quality_marks) > 1
+        return len(self.quality_counts) > 1
     
     @property
     def quality_marks(self):
         """Get all unique quality marks in this line"""
-        if self.capacity_type == "count":
-            return set(package.quality_mark for package in self.packages)
-        else:
-            return set(pallet.quality_mark for pallet in self.pallets)
+        return set(quality_registry.get_mark(quality_id) for quality_id in self.quality_counts)
     
     @property
     def line_type(self):
@@ -72,19 +146,65 @@ class Line:
             bool: True if quality can be added, False otherwise
         """
         # If quality already exists in the line
-        if quality_mark in self.quality_marks:
+        quality_id = quality_registry.get_id(quality_mark)
+        if quality_id is not None and self.quality_mask >> quality_id & 1:
             return True
+        
+        quality_types = len(self.quality_counts)
             
         # If this would exceed max allowed quality types
-        if len(self.quality_marks) >= self.max_quality_types:
+        if quality_types >= self.max_quality_types:
             return False
             
         # If this would mix qualities but it's not approved
-        if len(self.quality_marks) > 0 and not self.mixed_quality_approved:
+        if quality_types > 0 and not self.mixed_quality_approved:
             return False
             
         return True
     
+    def quality_count(self, quality_mark):
+        """
+        Count the cartons and pallets of a quality mark on this line
+        
+        Args:
+            quality_mark (str): The quality mark to count
+            
+        Returns:
+            int: Number of cartons and pallets with that quality mark
+        """
+        quality_id = quality_registry.get_id(quality_mark)
+        return self.quality_counts.get(quality_id, 0) if quality_id is not None else 0
+    
+    def _tally_quality(self, quality_mark, delta):
+        """Adjust the reference count for a quality mark on this line"""
+        quality_id = quality_registry.intern(quality_mark)
+        count = self.quality_counts.get(quality_id, 0) + delta
+        if count > 0:
+            self.quality_counts[quality_id] = count
+            self.quality_mask |= 1 << quality_id
+        else:
+            self.quality_counts.pop(quality_id, None)
+            self.quality_mask &= ~(1 << quality_id)
+        
+        # The set of quality marks changed, so the line accepts different items
+        if count == 0 or count == delta:
+            if self.manager is not None:
+                self.manager.line_capacity_index.update(self)
+    
+    def record_change(self, action, kind, item, pallet=None, packages=None):
+        """
+        Add a record to the change log of this line's warehouse
+        
+        Args:
+            action (str): "added", "removed" or "discarded"
+            kind (str): "carton", "pallet" or "package"
+            item: The Package or Pallet that changed
+            pallet: The Pallet a loose package went onto or left, if any
+            packages (tuple): Serial numbers of an added pallet's packages
+        """
+        if self.warehouse is not None:
+            self.warehouse.record_change(action, kind, item, self, pallet, packages)
+    
     def add_carton(self, carton):
         """
         Add a carton package directly to the line
@@ -100,7 +220,7 @@ class Line:
             raise ValueError("This line is for loose packages (pallets), not cartons")
         
         # Check capacity
-        if self.current_capacity_usage >= self.max_capacity:
+        if self.package_count >= self.max_capacity:
             return False
         
         # Check quality compatibility
@@ -108,13 +228,15 @@ class Line:
             return False
         
         # Add carton to line
-        self.packages.append(carton)
         carton.assign_location(self)
-        self.package_history.append({
-            "package": carton,
-            "action": "added",
-            "timestamp": datetime.now()
-        })
+        self.packages.append(carton)
+        self.adjust_totals(carton.mass, 1)
+        self._tally_quality(carton.quality_mark, 1)
+        self.enqueue_packages((carton,))
+        if self.manager is not None:
+            self.manager.record_location(carton, line=self)
+        self.package_history.append(carton, "added")
+        self.record_change("added", "carton", carton)
         return True
     
     def add_pallet(self, pallet):
@@ -140,17 +262,20 @@ class Line:
             return False
         
         # Add pallet to line
-        self.pallets.append(pallet)
         pallet.assign_location(self)
+        self.pallets.append(pallet)
+        self.adjust_totals(pallet.total_mass, len(pallet.packages))
+        self._tally_quality(pallet.quality_mark, 1)
+        self.enqueue_packages(pallet.packages)
+        if self.manager is not None:
+            self.manager.record_location(pallet, line=self)
         
         # Add all packages in pallet to history
         for package in pallet.packages:
-            self.package_history.append({
-                "package": package,
-                "action": "added",
-                "timestamp": datetime.now()
-            })
+            self.package_history.append(package, "added")
         
+        self.record_change("added", "pallet", pallet,
+                           packages=tuple(package.serial_number for package in pallet.packages))
         return True
     
     def remove_carton(self, carton):
@@ -166,11 +291,13 @@ class Line:
         if carton in self.packages:
             self.packages.remove(carton)
             carton.location = None
-            self.package_history.append({
-                "package": carton,
-                "action": "removed",
-                "timestamp": datetime.now()
-            })
+            self.adjust_totals(-carton.mass, -1)
+            self._tally_quality(carton.quality_mark, -1)
+            self.dequeue_packages((carton,))
+            if self.manager is not None:
+                self.manager.clear_location(carton)
+            self.package_history.append(carton, "removed")
+            self.record_change("removed", "carton", carton)
             return True
         return False
     
@@ -187,18 +314,32 @@ class Line:
         if pallet in self.pallets:
             self.pallets.remove(pallet)
             pallet.location = None
+            self.adjust_totals(-pallet.total_mass, -len(pallet.packages))
+            self._tally_quality(pallet.quality_mark, -1)
+            self.dequeue_packages(pallet.packages)
+            if self.manager is not None:
+                self.manager.clear_location(pallet)
             
             # Record removal of all packages in pallet
             for package in pallet.packages:
-                self.package_history.append({
-                    "package": package,
-                    "action": "removed",
-                    "timestamp": datetime.now()
-                })
+                self.package_history.append(package, "removed")
             
+            self.record_change("removed", "pallet", pallet)
             return True
         return False
     
+    def remove_package(self, package):
+        """
+        Remove a package stored directly on the line
+        
+        Args:
+            package: The carton to remove
+            
+        Returns:
+            bool: True if removed successfully, False if package not found
+        """
+        return self.remove_carton(package)
+    
     def set_mixed_quality_approval(self, approved, max_types=3):
         """
         Set approval for mixed quality packages on this line
@@ -209,16 +350,26 @@ class Line:
         """
         self.mixed_quality_approved = approved
         self.max_quality_types = max_types if approved else 1
+        if self.warehouse is not None:
+            self.warehouse.bump_version()
+        if self.manager is not None:
+            self.manager.line_capacity_index.update(self)
         return True
     
-    def get_package_history(self):
+    def get_package_history(self, since=None, until=None, limit=None, offset=0):
         """
-        Get the history of all packages ever placed in this line
+        Get the history of packages placed in this line
         
+        Args:
+            since (datetime, optional): Only entries at or after this time
+            until (datetime, optional): Only entries at or before this time
+            limit (int, optional): Maximum number of entries to return
+            offset (int): Number of matching entries to skip
+            
         Returns:
-            list: List of all package history entries
+            list: Package history entries in chronological order
         """
-        return self.package_history
+        return self.package_history.entries(since, until, limit, offset)
     
     def __str__(self):
         return f"Line({self.line_number}, Type: {self.line_type}, Usage: {self.current_capacity_usage}/{self.max_capacity})"
\ No newline at end of file
@@ -0,0 +1,153 @@
+from bisect import bisect_left, insort
+from heapq import merge
+from app.models.quality_registry import quality_registry
+
+# Bucket for lines that would take a quality mark they do not hold yet
+OPEN = None
+
+
+class LineCapacityIndex:
+    """Warehouse lines ordered by available capacity, bucketed by what they accept"""
+
+    def __init__(self):
+        """Initialize an empty index"""
+        # (capacity type, quality id or OPEN) -> sorted [(available, seq, line)]
+        # A line that accepts new quality marks sits in its OPEN bucket only,
+        # any other line sits in the bucket of each quality mark it holds
+        self.buckets = {}
+        self.entries = {}  # Line -> ((available, seq, line), bucket keys)
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, line):
+        return line in self.entries
+
+    @staticmethod
+    def bucket_keys(line):
+        """
+        Get the buckets a line belongs in
+
+        Args:
+            line: The Line to place
+
+        Returns:
+            tuple: Bucket keys for the line's current quality state
+        """
+        quality_types = len(line.quality_counts)
+        if quality_types < line.max_quality_types and (quality_types == 0 or line.mixed_quality_approved):
+            return ((line.capacity_type, OPEN),)
+        return tuple((line.capacity_type, quality_id) for quality_id in line.quality_counts)
+
+    def add(self, line):
+        """
+        Add a line, or re-file it if it is already indexed
+
+        Args:
+            line: The Line to add
+        """
+        if line in self.entries:
+            self.update(line)
+            return
+        self.seq += 1
+        self._insert(line, self.seq)
+
+    def remove(self, line):
+        """
+        Remove a line
+
+        Args:
+            line: The Line to remove
+
+        Returns:
+            bool: True if removed, False if the line was not indexed
+        """
+        entry = self.entries.pop(line, None)
+        if entry is None:
+            return False
+        key, bucket_keys = entry
+        for bucket_key in bucket_keys:
+            bucket = self.buckets[bucket_key]
+            del bucket[bisect_left(bucket, key)]
+            if not bucket:
+                del self.buckets[bucket_key]
+        return True
+
+    def update(self, line):
+        """
+        Re-file a line after its usage, quality marks or approval changed
+
+        Args:
+            line: The Line that changed
+        """
+        entry = self.entries.get(line)
+        if entry is None:
+            return
+        key, bucket_keys = entry
+        if key[0] == line.available_capacity and bucket_keys == self.bucket_keys(line):
+            return
+        self.remove(line)
+        self._insert(line, key[1])
+
+    def _insert(self, line, seq):
+        key = (line.available_capacity, seq, line)
+        bucket_keys = self.bucket_keys(line)
+        for bucket_key in bucket_keys:
+            insort(self.buckets.setdefault(bucket_key, []), key)
+        self.entries[line] = (key, bucket_keys)
+
+    def candidates(self, capacity_type, quality_mark, demand):
+        """
+        Iterate the lines that could take an item, least free capacity first
+
+        Args:
+            capacity_type (str): "weight" or "count"
+            quality_mark (str): The item's quality mark
+            demand (float): Capacity the item needs
+
+        Returns:
+            iterator: Lines with at least demand free that accept the quality mark
+        """
+        bucket_keys = [(capacity_type, OPEN)]
+        quality_id = quality_registry.get_id(quality_mark)
+        if quality_id is not None:
+            bucket_keys.append((capacity_type, quality_id))
+
+        runs = []
+        for bucket_key in bucket_keys:
+            bucket = self.buckets.get(bucket_key)
+            if bucket:
+                start = bisect_left(bucket, (demand,))
+                runs.append(map(bucket.__getitem__, range(start, len(bucket))))
+        return (key[2] for key in merge(*runs))
+
+    def smallest(self, capacity_type, quality_mark, demand):
+        """
+        Find the line with the least free capacity that can take an item
+
+        Args:
+            capacity_type (str): "weight" or "count"
+            quality_mark (str): The item's quality mark
+            demand (float): Capacity the item needs
+
+        Returns:
+            Line: The tightest fitting line, None if no line fits
+        """
+        return next(self.candidates(capacity_type, quality_mark, demand), None)
+
+    def is_current(self, line):
+        """
+        Check that a line is indexed under its current state
+
+        Args:
+            line: The Line to check
+
+        Returns:
+            bool: True if the line's entry matches its capacity and quality marks
+        """
+        entry = self.entries.get(line)
+        if entry is None:
+            return False
+        key, bucket_keys = entry
+        return key[0] == line.available_capacity and bucket_keys == self.bucket_keys(line)
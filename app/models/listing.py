@@ -0,0 +1,160 @@
+from bisect import bisect_left, insort
+from itertools import islice
+
+# Up to this many new items are inserted one by one, more are merged with a sort
+INSERT_LIMIT = 64
+
+
+class Listing:
+    """Objects in insertion order, with a maintained sort order per column for paging"""
+
+    def __init__(self, columns, buckets=(), prefixes=(), removable=False):
+        """
+        Initialize an empty listing
+
+        Args:
+            columns (dict): Column name -> key function; values must never
+                change once an object is added
+            buckets (tuple): Columns matched exactly by a search term
+            prefixes (tuple): String columns a search term may be the start of
+            removable (bool): Whether objects can be removed and added again;
+                otherwise each object must be added once and never removed
+        """
+        self.columns = columns
+        self.items = []  # position -> object
+        self.positions = {} if removable else None  # object -> position
+        self.removed = set()  # positions of objects taken out of the listing
+        self.keys = {name: [] for name in columns}    # name -> position -> key
+        self.orders = {name: [] for name in columns}  # name -> positions sorted by key
+        self.buckets = {name: {} for name in buckets}  # name -> key -> positions
+        self.prefixes = prefixes
+        self.unsorted = 0  # Positions at the end not yet in self.orders
+
+    def __len__(self):
+        return len(self.items) - len(self.removed)
+
+    def add(self, item):
+        """
+        Add an object, or put a removed one back
+
+        Args:
+            item: The object to add
+        """
+        position = len(self.items)
+        if self.positions is not None:
+            if item in self.positions:
+                self.removed.discard(self.positions[item])
+                return
+            self.positions[item] = position
+        self.items.append(item)
+        for name, key in self.columns.items():
+            value = key(item)
+            self.keys[name].append(value)
+            if name in self.buckets:
+                self.buckets[name].setdefault(value, []).append(position)
+        self.unsorted += 1
+
+    def extend(self, items):
+        """
+        Add many new objects
+
+        Args:
+            items: Iterable of objects to add
+        """
+        for item in items:
+            self.add(item)
+
+    def remove(self, item):
+        """
+        Take an object out of the listing
+
+        Args:
+            item: The object to remove, in a removable listing
+        """
+        position = self.positions.get(item)
+        if position is not None:
+            self.removed.add(position)
+
+    def _sort(self):
+        """Bring the per-column orders up to date with the added objects"""
+        if not self.unsorted:
+            return
+        added = range(len(self.items) - self.unsorted, len(self.items))
+        for name, order in self.orders.items():
+            key = self.keys[name].__getitem__
+            if self.unsorted <= INSERT_LIMIT:
+                for position in added:
+                    insort(order, position, key=key)
+            else:
+                # Timsort finds the sorted run and merges the new tail into it
+                order.extend(added)
+                order.sort(key=key)
+        self.unsorted = 0
+
+    def _matches(self, search):
+        """Positions matching a search term, or None when there is no term"""
+        if not search:
+            return None
+        matches = set()
+        for name, bucket in self.buckets.items():
+            matches.update(bucket.get(search, ()))
+        for name in self.prefixes:
+            order = self.orders[name]
+            key = self.keys[name].__getitem__
+            start = bisect_left(order, search, key=key)
+            for position in islice(order, start, None):
+                value = key(position)
+                if not value.startswith(search):
+                    break
+                matches.add(position)
+        return matches - self.removed
+
+    def page(self, column=None, descending=False, start=0, length=10, search=None, sort_key=None):
+        """
+        Get one page of the listing
+
+        Args:
+            column (str, optional): Indexed column to order by, insertion
+                order if None
+            descending (bool): Reverse the order
+            start (int): Number of matching objects to skip
+            length (int): Maximum number of objects to return
+            search (str, optional): Keep objects whose bucket columns equal
+                the term or whose prefix columns start with it
+            sort_key (function, optional): Order by this function instead of
+                an indexed column; sorts the matches on every call, so only
+                for small listings
+
+        Returns:
+            tuple: (total count, matching count, list of objects)
+        """
+        self._sort()
+        matches = self._matches(search)
+        total = len(self)
+        filtered = total if matches is None else len(matches)
+
+        if sort_key is not None:
+            positions = range(len(self.items)) if matches is None else matches
+            items = sorted((self.items[p] for p in positions if p not in self.removed),
+                           key=sort_key, reverse=descending)
+            return total, filtered, items[start:start + length]
+
+        order = self.orders[column] if column is not None else range(len(self.items))
+        if matches is not None and len(matches) * 8 < len(order):
+            # Few matches: sorting them beats walking the whole order
+            key = self.keys[column].__getitem__ if column is not None else None
+            positions = sorted(matches, key=key, reverse=descending)
+            return total, filtered, [self.items[p] for p in positions[start:start + length]]
+
+        if matches is None and not self.removed:
+            if not descending:
+                return total, filtered, [self.items[p] for p in order[start:start + length]]
+            return total, filtered, [self.items[p] for p in islice(reversed(order), start, start + length)]
+
+        if descending:
+            order = reversed(order)
+        if matches is None:
+            positions = (p for p in order if p not in self.removed)
+        else:
+            positions = (p for p in order if p in matches)
+        return total, filtered, [self.items[p] for p in islice(positions, start, start + length)]
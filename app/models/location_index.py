@@ -0,0 +1,52 @@
+class LocationIndex:
+    """Reverse map from serial number to storage location"""
+
+    def __init__(self):
+        """Initialize an empty location index"""
+        # serial number -> (line, pallet)
+        # Cartons and pallets map to the line holding them, loose packages
+        # map to their pallet so a pallet move does not touch its packages
+        self.locations = {}
+
+    def place(self, serial_number, line=None, pallet=None):
+        """
+        Record the location of a package or pallet
+
+        Args:
+            serial_number (str): Serial number of the package or pallet
+            line: The Line holding the item, if any
+            pallet: The Pallet holding the item, if any
+        """
+        self.locations[serial_number] = (line, pallet)
+
+    def remove(self, serial_number):
+        """
+        Forget the location of a package or pallet
+
+        Args:
+            serial_number (str): Serial number of the package or pallet
+        """
+        self.locations.pop(serial_number, None)
+
+    def locate(self, serial_number):
+        """
+        Resolve the location of a package or pallet
+
+        Args:
+            serial_number (str): Serial number of the package or pallet
+
+        Returns:
+            tuple: (warehouse, line, pallet) if known, None otherwise
+        """
+        entry = self.locations.get(serial_number)
+        if entry is None:
+            return None
+
+        line, pallet = entry
+        if line is None and pallet is not None:
+            pallet_entry = self.locations.get(pallet.serial_number)
+            if pallet_entry is not None:
+                line = pallet_entry[0]
+
+        warehouse = line.warehouse if line is not None else None
+        return warehouse, line, pallet
@@ -1,4 +1,43 @@
+import math
 from datetime import datetime
+from heapq import merge
+from itertools import repeat
+from operator import attrgetter
+from app.models.line_capacity_index import LineCapacityIndex
+from app.models.listing import Listing
+from app.models.inventory_index import InventoryIndex, package_placement, pallet_placement
+from app.models.location_index import LocationIndex
+from app.models.open_pallet_index import OpenPalletIndex
+from app.models.package_store import PackageStore
+from app.models.pallet import Pallet
+from app.models.partition_summary import may_hold
+from app.models.put_away import best_fit, item_demand, line_accepts, resolve_strategy
+from app.models.system_stats import SystemStats
+from app.models.timestamps import to_epoch_us
+
+OFFLOAD_ORDERS = ("oldest_first", "newest_first")
+PICK_UNITS = ("units", "kg")
+
+# Changing columns of the small listings, sorted on request rather than indexed
+COMPUTED_COLUMNS = {
+    "line": {
+        "warehouse": lambda line: line.warehouse.name if line.warehouse else "",
+        "current_capacity_usage": attrgetter("current_capacity_usage"),
+        "mixed_quality_approved": attrgetter("mixed_quality_approved"),
+    },
+    "warehouse": {
+        "lines": lambda warehouse: len(warehouse.lines),
+        "current_capacity_usage": attrgetter("current_capacity_usage"),
+    },
+}
+
+# Objects a stored partition adds to each listing, read from its summary
+SUMMARY_COUNTS = {
+    "package": lambda summary: summary["packages"],
+    "pallet": lambda summary: summary["pallets"],
+    "line": lambda summary: summary["lines"],
+    "warehouse": lambda summary: 1 if summary["warehouse"] is not None else 0,
+}
 
 class LogisticsManager:
     """Manager class to handle logistics operations"""
@@ -6,9 +45,69 @@ class LogisticsManager:
     def __init__(self):
         """Initialize the logistics manager"""
         self.warehouses = []
-        self.packages = []
+        self.packages = PackageStore()  # Columnar store, iterates as Package objects
         self.pallets = []
         self.offload_order = "oldest_first"  # Default offload order
+        
+        # Serial number indexes for O(1) lookups
+        self.warehouse_index = {}
+        self.line_index = {}
+        self.pallet_index = {}
+        self.package_index = {}
+        self.line_number_index = {}  # (warehouse serial, line number) -> Line
+        self.location_index = LocationIndex()
+        self.line_capacity_index = LineCapacityIndex()  # Lines in warehouses by free capacity
+        self.open_pallet_index = OpenPalletIndex()  # Pallets with room, per quality mark
+        self.stats = SystemStats()  # Rollups by capacity type, quality mark and package type
+        
+        # Secondary indexes for filtered package and pallet queries
+        self.package_filters = InventoryIndex(self.packages, {
+            "quality_mark": attrgetter("quality_mark"),
+            "package_type": attrgetter("package_type"),
+        }, {
+            "placement": package_placement,
+            "discarded": attrgetter("discarded"),
+        }, position=attrgetter("row"))
+        self.pallet_filters = InventoryIndex(self.pallets, {
+            "quality_mark": attrgetter("quality_mark"),
+        }, {
+            "placement": pallet_placement,
+        })
+        
+        # Sorted listings for the paged index pages
+        self.listings = {
+            "package": Listing({
+                "serial_number": attrgetter("serial_number"),
+                "package_type": attrgetter("package_type"),
+                "quality_mark": attrgetter("quality_mark"),
+                "mass": attrgetter("mass"),
+                "created_at": attrgetter("created_ts"),
+            }, buckets=("package_type", "quality_mark"), prefixes=("serial_number",)),
+            "pallet": Listing({
+                "serial_number": attrgetter("serial_number"),
+                "quality_mark": attrgetter("quality_mark"),
+                "max_capacity": attrgetter("max_capacity"),
+                "created_at": attrgetter("created_ts"),
+            }, buckets=("quality_mark",), prefixes=("serial_number",)),
+            "line": Listing({
+                "serial_number": attrgetter("serial_number"),
+                "line_number": attrgetter("line_number"),
+                "capacity_type": attrgetter("capacity_type"),
+                "max_capacity": attrgetter("max_capacity"),
+            }, buckets=("capacity_type",), prefixes=("serial_number",), removable=True),
+            "warehouse": Listing({
+                "name": attrgetter("name"),
+                "max_capacity": attrgetter("max_capacity"),
+                "created_at": attrgetter("created_ts"),
+            }, prefixes=("name",), removable=True),
+        }
+        self.loader = None  # LazyLoader while objects remain in a snapshot
+        
+        # System-wide running totals, updated as warehouses change
+        self.total_mass = 0
+        self.package_count = 0
+        self.current_capacity_usage = 0
+        self.total_capacity = 0
     
     def add_warehouse(self, warehouse):
         """
@@ -21,6 +120,16 @@ class LogisticsManager:
             bool: True if added successfully
         """
         self.warehouses.append(warehouse)
+        self.warehouse_index[warehouse.serial_number] = warehouse
+        self.listings["warehouse"].add(warehouse)
+        warehouse.manager = self
+        self.total_capacity += warehouse.max_capacity
+        self.adjust_totals(warehouse.total_mass, warehouse.package_count,
+                           warehouse.current_capacity_usage)
+        
+        # Index any lines the warehouse already holds
+        for line in warehouse.lines:
+            self.register_line(line)
         return True
     
     def remove_warehouse(self, warehouse):
@@ -33,11 +142,191 @@ class LogisticsManager:
         Returns:
             bool: True if removed successfully, False if not found
         """
-        if warehouse in self.warehouses:
+        if warehouse.serial_number in self.warehouse_index:
             self.warehouses.remove(warehouse)
+            del self.warehouse_index[warehouse.serial_number]
+            self.listings["warehouse"].remove(warehouse)
+            for line in warehouse.lines:
+                self.unregister_line(line)
+            warehouse.manager = None
+            self.total_capacity -= warehouse.max_capacity
+            self.adjust_totals(-warehouse.total_mass, -warehouse.package_count,
+                               -warehouse.current_capacity_usage)
             return True
         return False
     
+    def adjust_totals(self, mass, count, usage):
+        """
+        Apply a change in stored mass, package count and capacity usage
+        
+        Args:
+            mass (float): Change in stored mass in kg
+            count (int): Change in number of stored packages
+            usage (float): Change in capacity usage
+        """
+        self.total_mass += mass
+        self.package_count += count
+        self.current_capacity_usage += usage
+    
+    def check_counters(self):
+        """
+        Compare the running totals against a full recount
+        
+        This walks the whole inventory and is meant for debug mode only.
+        
+        Returns:
+            list: Descriptions of any counters that disagree with the recount
+        """
+        mismatches = []
+        
+        def compare(owner, name, stored, expected):
+            if not math.isclose(stored, expected, rel_tol=1e-9, abs_tol=1e-6):
+                mismatches.append(f"{owner} {name}: counter={stored}, recount={expected}")
+        
+        for pallet in self.pallets:
+            compare(pallet, "total_mass", pallet.total_mass, pallet.recount_total_mass())
+            if not self.open_pallet_index.is_current(pallet):
+                mismatches.append(f"{pallet} open pallet index entry is stale")
+            if not self.pallet_filters.is_current(pallet):
+                mismatches.append(f"{pallet} filter index entry is stale")
+        
+        system_totals = [0, 0, 0]
+        capacity_types = {}  # capacity type -> [mass, count, usage]
+        stored_by_quality = {}  # quality mark -> [packages, mass]
+        for warehouse in self.warehouses:
+            for line in warehouse.lines:
+                mass, count, usage = line.recount_totals()
+                compare(line, "total_mass", line.total_mass, mass)
+                compare(line, "package_count", line.package_count, count)
+                compare(line, "capacity_usage", line.current_capacity_usage, usage)
+                totals = capacity_types.setdefault(line.capacity_type, [0, 0, 0])
+                totals[0] += mass
+                totals[1] += count
+                totals[2] += usage
+                
+                qualities = set(carton.quality_mark for carton in line.packages)
+                qualities.update(pallet.quality_mark for pallet in line.pallets)
+                if line.quality_marks != qualities:
+                    mismatches.append(f"{line} quality_marks: tally={line.quality_marks}, recount={qualities}")
+                
+                stored = set(line.packages)
+                for pallet in line.pallets:
+                    stored.update(pallet.packages)
+                for package in stored:
+                    totals = stored_by_quality.setdefault(package.quality_mark, [0, 0])
+                    totals[0] += 1
+                    totals[1] += package.mass
+                    if not self.package_filters.is_current(package):
+                        mismatches.append(f"{package} filter index entry is stale")
+                if set(line.offload_queue.live) != stored:
+                    mismatches.append(f"{line} offload_queue: queued={len(line.offload_queue)}, stored={len(stored)}")
+                if not self.line_capacity_index.is_current(line):
+                    mismatches.append(f"{line} capacity index entry is stale")
+            
+            mass, count, usage = warehouse.recount_totals()
+            compare(warehouse, "total_mass", warehouse.total_mass, mass)
+            compare(warehouse, "package_count", warehouse.package_count, count)
+            compare(warehouse, "capacity_usage", warehouse.current_capacity_usage, usage)
+            if set(warehouse.offload_queue.live) != set(warehouse.get_all_packages()):
+                mismatches.append(f"{warehouse} offload_queue: queued={len(warehouse.offload_queue)}, stored={count}")
+            system_totals[0] += mass
+            system_totals[1] += count
+            system_totals[2] += usage
+        
+        compare("System", "total_mass", self.total_mass, system_totals[0])
+        compare("System", "package_count", self.package_count, system_totals[1])
+        compare("System", "capacity_usage", self.current_capacity_usage, system_totals[2])
+        compare("System", "total_capacity", self.total_capacity,
+                sum(w.max_capacity for w in self.warehouses))
+        
+        for capacity_type, (mass, count, usage) in capacity_types.items():
+            _, _, stat_usage, stat_mass, stat_count = self.stats.capacity_types.get(capacity_type, (0, 0, 0, 0, 0))
+            compare(f"Stats {capacity_type} lines", "total_mass", stat_mass, mass)
+            compare(f"Stats {capacity_type} lines", "package_count", stat_count, count)
+            compare(f"Stats {capacity_type} lines", "capacity_usage", stat_usage, usage)
+        for quality_mark in set(stored_by_quality) | set(self.stats.stored_by_quality):
+            count, mass = stored_by_quality.get(quality_mark, (0, 0))
+            stat_count, stat_mass = self.stats.stored_by_quality.get(quality_mark, (0, 0))
+            compare(f"Stats quality {quality_mark}", "stored_packages", stat_count, count)
+            compare(f"Stats quality {quality_mark}", "stored_mass", stat_mass, mass)
+        return mismatches
+    
+    def add_line_to_warehouse(self, line, warehouse):
+        """
+        Add a line to a warehouse and index it
+        
+        Args:
+            line: The Line object to add
+            warehouse: The Warehouse object to add the line to
+            
+        Returns:
+            bool: True if added successfully
+        """
+        # Moving a line between warehouses drops its old line number key
+        if line.warehouse is not None and line.warehouse is not warehouse:
+            self.unregister_line(line)
+            line.warehouse.remove_line(line)
+        
+        result = warehouse.add_line(line)
+        if warehouse.serial_number in self.warehouse_index:
+            self.register_line(line)
+        return result
+    
+    def register_line(self, line):
+        """
+        Register a line in the serial number and line number indexes
+        
+        Args:
+            line: A Line object assigned to a warehouse
+            
+        Returns:
+            bool: True if registered successfully
+        """
+        self.line_index[line.serial_number] = line
+        if line.warehouse is not None:
+            key = (line.warehouse.serial_number, line.line_number)
+            self.line_number_index[key] = line
+        
+        # Index anything already stored on the line
+        if line.manager is not self:
+            self.stats.add_line(line)
+        line.manager = self
+        self.line_capacity_index.add(line)
+        self.listings["line"].add(line)
+        self.packages.set_line_warehouse(line, line.warehouse)
+        for carton in line.packages:
+            self.record_location(carton, line=line)
+        for pallet in line.pallets:
+            self.record_location(pallet, line=line)
+        return True
+    
+    def unregister_line(self, line):
+        """
+        Remove a line from the lookup indexes
+        
+        Args:
+            line: The Line object to unregister
+            
+        Returns:
+            bool: True if removed successfully, False if not found
+        """
+        if self.line_index.pop(line.serial_number, None) is None:
+            return False
+        line.manager = None
+        self.stats.add_line(line, -1)
+        self.line_capacity_index.remove(line)
+        self.listings["line"].remove(line)
+        self.packages.set_line_warehouse(line, None)
+        for carton in line.packages:
+            self.clear_location(carton)
+        for pallet in line.pallets:
+            self.clear_location(pallet)
+        if line.warehouse is not None:
+            key = (line.warehouse.serial_number, line.line_number)
+            if self.line_number_index.get(key) is line:
+                del self.line_number_index[key]
+        return True
+    
     def register_package(self, package):
         """
         Register a package in the system
@@ -48,7 +337,38 @@ class LogisticsManager:
         Returns:
             bool: True if registered successfully
         """
+        if package.serial_number in self.package_index:
+            return True
         self.packages.append(package)
+        self.package_index[package.serial_number] = package
+        package.manager = self
+        self.stats.register(package)
+        self.listings["package"].add(package)
+        self.package_filters.add(package)
+        if package.location is not None:
+            self.record_location(package, line=package.location)
+        elif getattr(package, "pallet", None) is not None:
+            self.record_location(package, pallet=package.pallet)
+        return True
+    
+    def register_packages(self, packages):
+        """
+        Register many new, unplaced packages at once
+        
+        Args:
+            packages (list): Package objects not yet in any location
+            
+        Returns:
+            bool: True if registered successfully
+        """
+        packages = [package for package in packages if package.serial_number not in self.package_index]
+        self.packages.extend(packages)
+        self.package_index.update((package.serial_number, package) for package in packages)
+        for package in packages:
+            package.manager = self
+            self.stats.register(package)
+        self.listings["package"].extend(packages)
+        self.package_filters.extend(packages)
         return True
     
     def register_pallet(self, pallet):
@@ -61,9 +381,158 @@ class LogisticsManager:
         Returns:
             bool: True if registered successfully
         """
+        if pallet.serial_number in self.pallet_index:
+            return True
         self.pallets.append(pallet)
+        self.pallet_index[pallet.serial_number] = pallet
+        pallet.manager = self
+        self.open_pallet_index.add(pallet)
+        self.listings["pallet"].add(pallet)
+        self.pallet_filters.add(pallet)
+        for package in pallet.packages:
+            self.record_location(package, pallet=pallet)
         return True
     
+    def record_location(self, item, line=None, pallet=None):
+        """
+        Record where a package or pallet is stored
+        
+        Called by Line and Pallet whenever they take on an item.
+        
+        Args:
+            item: The Package or Pallet that moved
+            line: The Line now holding the item, if any
+            pallet: The Pallet now holding the item, if any
+        """
+        self.location_index.place(item.serial_number, line, pallet)
+        if isinstance(item, Pallet):
+            self.packages.set_pallet_line(item, line)
+            self.open_pallet_index.update(item)
+            self.pallet_filters.update(item)
+        else:
+            self.packages.set_location(item, line, pallet)
+            self.package_filters.update(item)
+    
+    def clear_location(self, item):
+        """
+        Record that a package or pallet is no longer stored anywhere
+        
+        Args:
+            item: The Package or Pallet that was removed
+        """
+        self.location_index.remove(item.serial_number)
+        if isinstance(item, Pallet):
+            self.packages.set_pallet_line(item, None)
+            self.open_pallet_index.update(item)
+            self.pallet_filters.update(item)
+        else:
+            self.packages.set_location(item)
+            self.package_filters.update(item)
+    
+    def record_discard(self, package):
+        """
+        Record that a package was discarded
+        
+        Args:
+            package: The discarded Package
+        """
+        self.clear_location(package)
+        self.packages.set_discarded(package)
+        self.stats.discard(package)
+    
+    def get_warehouse(self, serial_number):
+        """
+        Look up a warehouse by serial number
+        
+        Args:
+            serial_number (str): Serial number of the warehouse
+            
+        Returns:
+            Warehouse: The warehouse if found, None otherwise
+        """
+        return self._lookup(self.warehouse_index, serial_number)
+    
+    def get_line(self, serial_number):
+        """
+        Look up a line by serial number
+        
+        Args:
+            serial_number (str): Serial number of the line
+            
+        Returns:
+            Line: The line if found, None otherwise
+        """
+        return self._lookup(self.line_index, serial_number)
+    
+    def _lookup(self, index, serial_number):
+        """Find an object in an index, hydrating it from the snapshot if needed"""
+        found = index.get(serial_number)
+        if found is None and self.loader is not None and self.loader.hydrate_serial(serial_number):
+            found = index.get(serial_number)
+        return found
+    
+    def hydrate_all(self):
+        """Build every object still held only in the snapshot"""
+        if self.loader is not None:
+            self.loader.hydrate_all()
+    
+    def hydrate_where(self, needed):
+        """
+        Build the stored partitions a call may need
+        
+        Args:
+            needed (function): Called with a partition summary (see
+                partition_summary), returns True if the partition must be built
+        """
+        if self.loader is not None:
+            self.loader.hydrate_where(needed)
+    
+    def pending_summaries(self):
+        """
+        Summarize the stored partitions not built yet
+        
+        Returns:
+            dict: Partition -> summary, None where storage has no summary
+        """
+        return self.loader.summaries() if self.loader is not None else {}
+    
+    def get_line_by_number(self, warehouse, line_number):
+        """
+        Look up a line by its number within a warehouse
+        
+        Args:
+            warehouse: The Warehouse object holding the line
+            line_number (int): Line identifier number
+            
+        Returns:
+            Line: The line if found, None otherwise
+        """
+        return self.line_number_index.get((warehouse.serial_number, line_number))
+    
+    def get_pallet(self, serial_number):
+        """
+        Look up a pallet by serial number
+        
+        Args:
+            serial_number (str): Serial number of the pallet
+            
+        Returns:
+            Pallet: The pallet if found, None otherwise
+        """
+        return self._lookup(self.pallet_index, serial_number)
+    
+    def get_package(self, serial_number):
+        """
+        Look up a package by serial number
+        
+        Args:
+            serial_number (str): Serial number of the package
+            
+        Returns:
+            Package: The package if found, None otherwise
+        """
+        return self._lookup(self.package_index, serial_number)
+    
     def load_package_to_line(self, package, line):
         """
         Load a package to a line
@@ -76,7 +545,7 @@ class LogisticsManager:
             bool: True if loaded successfully, False otherwise
         """
         # Register package if not registered
-        if package not in self.packages:
+        if package.serial_number not in self.package_index:
             self.register_package(package)
         
         # Load package based on type
@@ -101,11 +570,11 @@ class LogisticsManager:
             bool: True if loaded successfully, False otherwise
         """
         # Register package if not registered
-        if package not in self.packages:
+        if package.serial_number not in self.package_index:
             self.register_package(package)
         
         # Register pallet if not registered
-        if pallet not in self.pallets:
+        if pallet.serial_number not in self.pallet_index:
             self.register_pallet(pallet)
         
         try:
@@ -126,7 +595,7 @@ class LogisticsManager:
             bool: True if loaded successfully, False otherwise
         """
         # Register pallet if not registered
-        if pallet not in self.pallets:
+        if pallet.serial_number not in self.pallet_index:
             self.register_pallet(pallet)
         
         try:
@@ -145,13 +614,12 @@ class LogisticsManager:
         Returns:
             bool: True if offloaded successfully, False otherwise
         """
-        if package.location:
-            if package.package_type == "carton":
+        if package.package_type == "carton":
+            if package.location:
                 return package.location.remove_carton(package)
-            else:
-                # For loose packages, we need to remove from pallet
-                if package.pallet:
-                    return package.pallet.remove_package(package)
+        elif package.pallet:
+            # Loose packages are stored on a pallet, which holds the line reference
+            return package.pallet.remove_package(package)
         return False
     
     def offload_pallet(self, pallet):
@@ -191,7 +659,7 @@ class LogisticsManager:
         Returns:
             bool: True if set successfully, False if invalid order
         """
-        if order in ["oldest_first", "newest_first"]:
+        if order in OFFLOAD_ORDERS:
             self.offload_order = order
             return True
         return False
@@ -206,26 +674,239 @@ class LogisticsManager:
         Returns:
             list: Ordered list of packages for offloading
         """
-        packages = []
+        queue = location.offload_queue
+        return queue.peek(len(queue), self.offload_order)
+    
+    def next_to_offload(self, location, n, quality=None):
+        """
+        Get the next packages to offload based on current order setting
+        
+        Args:
+            location: The location (Line or Warehouse) to get packages from
+            n (int): Maximum number of packages to return
+            quality (str, optional): Only return packages of this quality mark
+            
+        Returns:
+            list: Up to n packages in offload order
+        """
+        return location.offload_queue.peek(n, self.offload_order, quality)
+    
+    def plan_pick(self, quality, quantity, unit="units", order=None):
+        """
+        Choose the packages that fill an outbound order
+        
+        The offload queues of every line of the quality mark are merged, so
+        packages come out in offload order across all warehouses and only
+        the packages picked are visited.
+        
+        Args:
+            quality (str): Quality mark to pick
+            quantity (float): Number of packages, or kilograms if unit is "kg"
+            unit (str): Either "units" or "kg"
+            order (str, optional): "oldest_first" or "newest_first", defaults
+                to the current offload order
+            
+        Returns:
+            dict: The pick list, with "warehouses" holding
+                {"warehouse", "lines": [{"line", "packages"}]} groups in the
+                order they are first reached, and the picked and short totals
+            
+        Raises:
+            ValueError: If the unit, order or quantity is invalid
+        """
+        order = order or self.offload_order
+        if unit not in PICK_UNITS:
+            raise ValueError(f"Unit must be one of: {', '.join(PICK_UNITS)}")
+        if order not in OFFLOAD_ORDERS:
+            raise ValueError(f"Order must be one of: {', '.join(OFFLOAD_ORDERS)}")
+        if not math.isfinite(quantity) or quantity <= 0:
+            raise ValueError("Quantity must be a positive number")
+        
+        self.hydrate_where(lambda summary: quality in summary["stored_by_quality"])
+        runs = []
+        for warehouse in self.warehouses:
+            for line in warehouse.lines:
+                if quality in line.offload_queue.heaps:
+                    runs.append(zip(line.offload_queue.ordered(order, quality), repeat(line)))
+        
+        groups = {}  # Warehouse -> {Line -> packages}
+        picked_units = 0
+        picked_mass = 0
+        merged = merge(*runs, key=lambda pair: pair[0].created_ts, reverse=order == "newest_first")
+        for package, line in merged:
+            picked = picked_mass if unit == "kg" else picked_units
+            if picked >= quantity:
+                break
+            groups.setdefault(line.warehouse, {}).setdefault(line, []).append(package)
+            picked_units += 1
+            picked_mass += package.mass
+        
+        picked = picked_mass if unit == "kg" else picked_units
+        return {
+            "quality_mark": quality,
+            "quantity": quantity,
+            "unit": unit,
+            "order": order,
+            "picked_units": picked_units,
+            "picked_mass": picked_mass,
+            "short": max(0, quantity - picked),
+            "warehouses": [
+                {"warehouse": warehouse,
+                 "lines": [{"line": line, "packages": packages} for line, packages in lines.items()]}
+                for warehouse, lines in groups.items()
+            ],
+        }
+    
+    def plan_palletization(self, packages, pallet_capacity):
+        """
+        Plan how to put unassigned loose packages on pallets
+        
+        Packages go, by quality mark, onto existing pallets that are not on
+        a line (fullest first), then onto new pallets of pallet_capacity.
+        The input is read once, so planning is linear in its size.
+        
+        Args:
+            packages: Iterable of Package objects
+            pallet_capacity (int): Capacity of any new pallet
+            
+        Returns:
+            tuple: (plan, skipped) where plan is a list of
+                [pallet or None for a new pallet, quality_mark, packages]
+                and skipped is a list of (package, reason)
+        """
+        # Pallets off the lines are all outside warehouses
+        self.hydrate_where(lambda summary: summary["warehouse"] is None)
+        candidates = {}  # quality mark -> unplaced pallets with room, fullest first
+        
+        plan = []
+        skipped = []
+        seen = set()
+        filling = {}  # quality mark -> [plan entry, remaining capacity]
+        for package in packages:
+            if package in seen:
+                skipped.append((package, "Package is listed more than once"))
+                continue
+            seen.add(package)
+            if package.package_type != "loose":
+                skipped.append((package, "Only loose packages can be palletized"))
+                continue
+            if package.discarded:
+                skipped.append((package, "Package is discarded"))
+                continue
+            if package.pallet is not None:
+                skipped.append((package, "Package is already on a pallet"))
+                continue
+            
+            quality_mark = package.quality_mark
+            current = filling.get(quality_mark)
+            if current is None or current[1] == 0:
+                pending = candidates.get(quality_mark)
+                if pending is None:
+                    pending = candidates[quality_mark] = self.open_pallet_index.pallets(quality_mark, placed=False)
+                pallet = next(pending, None)
+                if pallet is not None:
+                    current = [[pallet, quality_mark, []], pallet.available_capacity]
+                else:
+                    current = [[None, quality_mark, []], pallet_capacity]
+                filling[quality_mark] = current
+                plan.append(current[0])
+            
+            current[0][2].append(package)
+            current[1] -= 1
+        
+        return plan, skipped
+    
+    def best_open_pallet(self, quality_mark, placed=None):
+        """
+        Find the fullest pallet of a quality mark that still has room
         
-        if hasattr(location, 'get_all_packages'):
-            # For warehouses
-            packages = location.get_all_packages()
-        elif hasattr(location, 'packages'):
-            # For lines with direct packages (cartons)
-            packages.extend(location.packages)
+        Args:
+            quality_mark (str): Quality mark of the package to be palletized
+            placed (bool, optional): True to only consider pallets on a line,
+                False to only consider pallets not on a line
             
-            # For lines with pallets
-            for pallet in location.pallets:
-                packages.extend(pallet.packages)
+        Returns:
+            Pallet: The best pallet, None if every pallet is full
+        """
+        self.hydrate_where(lambda summary: summary["warehouse"] is None or (
+            placed is not False and quality_mark in summary["open_pallet_qualities"]))
+        return self.open_pallet_index.best(quality_mark, placed)
+    
+    def suggest_location(self, item, strategy="best_fit"):
+        """
+        Choose a line for a pallet or carton across all warehouses
         
-        # Sort packages based on offload order
-        if self.offload_order == "oldest_first":
-            packages.sort(key=lambda p: p.created_at)
-        else:  # newest_first
-            packages.sort(key=lambda p: p.created_at, reverse=True)
+        Args:
+            item: A Pallet or Carton to place
+            strategy: A put-away strategy name ("best_fit", "first_fit",
+                "least_mixed", "keep_qualities_together") or function
+            
+        Returns:
+            Line: The chosen line, None if no line can take the item
+        """
+        rank = resolve_strategy(strategy)
+        if getattr(item, "package_type", None) == "loose":
+            return None
+        
+        demand = item_demand(item)
+        capacity_type = "weight" if isinstance(item, Pallet) else "count"
+        self.hydrate_where(lambda summary: summary["available"].get(capacity_type, 0) >= demand)
+        candidates = (line for line in self.line_capacity_index.candidates(capacity_type, item.quality_mark, demand)
+                      if line is not item.location and line_accepts(line, item, demand))
+        
+        # Candidates arrive least free capacity first, so best fit is the first one
+        if rank is best_fit:
+            return next(candidates, None)
         
-        return packages
+        best = None
+        best_key = None
+        for line in candidates:
+            key = rank(line, item, demand)
+            if best is None or key < best_key:
+                best, best_key = line, key
+        return best
+    
+    def place_item(self, item, line):
+        """
+        Load a pallet or carton onto a line
+        
+        Args:
+            item: A Pallet or Carton
+            line: The Line to load it onto
+            
+        Returns:
+            bool: True if loaded successfully
+        """
+        if isinstance(item, Pallet):
+            return self.load_pallet_to_line(item, line)
+        return self.load_package_to_line(item, line)
+    
+    def auto_put_away(self, items, strategy="best_fit", place=None):
+        """
+        Place many pallets and cartons, largest first (best-fit decreasing)
+        
+        Items already on a line, and loose packages, are not placed.
+        
+        Args:
+            items: Iterable of Pallet and Carton objects
+            strategy: A put-away strategy name or function
+            place (function, optional): Called as place(item, line) to load
+                an item, defaults to place_item
+            
+        Returns:
+            list: (item, line) pairs, line is None for items not placed
+        """
+        resolve_strategy(strategy)
+        place = place or self.place_item
+        placements = []
+        for item in sorted(items, key=item_demand, reverse=True):
+            line = None
+            if item.location is None:
+                line = self.suggest_location(item, strategy)
+                if line is not None and not place(item, line):
+                    line = None
+            placements.append((item, line))
+        return placements
     
     def approve_mixed_quality_line(self, line, max_types=3):
         """
@@ -240,17 +921,126 @@ class LogisticsManager:
         """
         return line.set_mixed_quality_approval(True, max_types)
     
-    def get_package_history(self, line):
+    def get_package_history(self, line, since=None, until=None, limit=None, offset=0):
         """
-        Get the history of all packages ever placed in a line
+        Get the history of packages placed in a line
         
         Args:
             line: The Line object to get history for
+            since (datetime, optional): Only entries at or after this time
+            until (datetime, optional): Only entries at or before this time
+            limit (int, optional): Maximum number of entries to return
+            offset (int): Number of matching entries to skip
             
         Returns:
             list: Package history
         """
-        return line.get_package_history()
+        return line.get_package_history(since, until, limit, offset)
+    
+    def count_package_history(self, line, since=None, until=None):
+        """
+        Count the history entries of a line inside a time range
+        
+        Args:
+            line: The Line object to count history for
+            since (datetime, optional): Only entries at or after this time
+            until (datetime, optional): Only entries at or before this time
+            
+        Returns:
+            int: Number of matching entries
+        """
+        start, end = line.package_history.window(since, until)
+        return end - start
+    
+    def list_page(self, kind, column=None, descending=False, start=0, length=10, search=None):
+        """
+        Get one page of packages, pallets, lines or warehouses
+        
+        Indexed columns are read from a maintained sort order; the changing
+        columns of lines and warehouses are sorted on request, and any other
+        column falls back to creation order. Unsearched pages in creation
+        order only build the stored partitions needed to fill them.
+        
+        Args:
+            kind (str): "package", "pallet", "line" or "warehouse"
+            column (str, optional): Column to order by
+            descending (bool): Reverse the order
+            start (int): Number of matching objects to skip
+            length (int): Maximum number of objects to return
+            search (str, optional): Exact quality mark, package or capacity
+                type, or the start of a serial number (warehouse name for
+                warehouses)
+            
+        Returns:
+            tuple: (total count, matching count, list of objects)
+        """
+        listing = self.listings[kind]
+        sort_key = COMPUTED_COLUMNS.get(kind, {}).get(column)
+        if column not in listing.columns:
+            column = None
+        if column is None and sort_key is None and search is None and not descending:
+            return self._creation_page(kind, start, length)
+        self.hydrate_all()
+        return listing.page(column, descending, start, length, search, sort_key)
+    
+    def _creation_page(self, kind, start, length):
+        """Page through creation order, building partitions until the page is full"""
+        listing = self.listings[kind]
+        loader = self.loader
+        pending = self.pending_summaries()
+        # Built partitions append to the order, so earlier pages stay put
+        for partition, summary in sorted(pending.items()):
+            if summary is None or len(listing) < start + length:
+                loader.hydrate(partition)
+        
+        total, _, items = listing.page(None, False, start, length)
+        total += sum(SUMMARY_COUNTS[kind](summary) for partition, summary in pending.items()
+                     if partition in loader.pending)
+        return total, total, items
+    
+    def query(self, kind, created_after=None, created_before=None, **filters):
+        """
+        Find packages or pallets by their indexed attributes
+        
+        Packages can be filtered on quality_mark, package_type, placement
+        ("unassigned", "pallet" or "line") and discarded; pallets on
+        quality_mark and placement ("unassigned" or "line"). Each filter
+        takes one value or a list of accepted values.
+        
+        Args:
+            kind (str): "package" or "pallet"
+            created_after (datetime, optional): Earliest creation time, inclusive
+            created_before (datetime, optional): Latest creation time, exclusive
+            **filters: Field name -> value or list of values
+            
+        Returns:
+            iterator: Matching objects in the order they were registered
+            
+        Raises:
+            ValueError: If the kind or a filter field is unknown
+        """
+        index = {"package": self.package_filters, "pallet": self.pallet_filters}.get(kind)
+        if index is None:
+            raise ValueError(f"Cannot query {kind}s")
+        self.hydrate_where(lambda summary: may_hold(summary, kind, filters))
+        return index.query(
+            to_epoch_us(created_after) if created_after is not None else None,
+            to_epoch_us(created_before) if created_before is not None else None,
+            **filters
+        )
+    
+    def get_stats(self):
+        """
+        Get the inventory rollups
+        
+        Returns:
+            dict: Totals, and breakdowns by warehouse, capacity type,
+                quality mark and package type
+        """
+        # Stored partitions are counted from their summaries, only those
+        # without one, or without a warehouse version, are built
+        self.hydrate_where(lambda summary: summary["warehouse"] is not None and summary.get("version") is None)
+        return self.stats.to_dict(self, self.pending_summaries().values())
     
     def get_warehouse_snapshot(self, warehouse):
         """
@@ -274,11 +1064,22 @@ class LogisticsManager:
         Returns:
             dict: Package information if found, None otherwise
         """
-        for warehouse in self.warehouses:
-            result = warehouse.search_package(serial_number)
-            if result:
-                return result
-        return None
+        package = self.get_package(serial_number)
+        location = self.location_index.locate(serial_number)
+        if package is None or location is None:
+            return None
+        
+        warehouse, line, pallet = location
+        if warehouse is None or warehouse.serial_number not in self.warehouse_index:
+            return None
+        
+        return {
+            "package": package,
+            "line_number": line.line_number,
+            "warehouse_name": warehouse.name,
+            "type": "loose" if pallet is not None else "carton",
+            "pallet": pallet
+        }
     
     def search_pallet(self, serial_number):
         """
@@ -290,11 +1091,21 @@ class LogisticsManager:
         Returns:
             dict: Pallet information if found, None otherwise
         """
-        for warehouse in self.warehouses:
-            result = warehouse.search_pallet(serial_number)
-            if result:
-                return result
-        return None
+        pallet = self.get_pallet(serial_number)
+        location = self.location_index.locate(serial_number)
+        if pallet is None or location is None:
+            return None
+        
+        warehouse, line, _ = location
+        if warehouse is None or warehouse.serial_number not in self.warehouse_index:
+            return None
+        
+        return {
+            "pallet": pallet,
+            "line_number": line.line_number,
+            "warehouse_name": warehouse.name,
+            "packages": pallet.packages
+        }
     
     def get_all_warehouses(self):
         """
@@ -303,4 +1114,25 @@ class LogisticsManager:
         Returns:
             list: All warehouses
         """
-        return self.warehouses
\ No newline at end of file
+        self.hydrate_all()
+        return self.warehouses
+    
+    def get_all_pallets(self):
+        """
+        Get all pallets in the system
+        
+        Returns:
+            list: All pallets
+        """
+        self.hydrate_all()
+        return self.pallets
+    
+    def get_all_packages(self):
+        """
+        Get all packages in the system
+        
+        Returns:
+            PackageStore: All packages
+        """
+        self.hydrate_all()
+        return self.packages
\ No newline at end of file
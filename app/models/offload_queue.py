@@ -0,0 +1,119 @@
+from heapq import heapify, heappop, heappush
+from itertools import islice
+
+
+class OffloadQueue:
+    """Packages at a location ordered by creation time for offloading"""
+
+    def __init__(self):
+        """Initialize an empty queue"""
+        # quality mark -> (oldest-first heap, newest-first heap)
+        # Heap entries are (key, seq, package); seq breaks ties in insertion order
+        self.heaps = {}
+        self.live = {}  # Package -> seq of its current entries
+        self.seq = 0
+        self.stale = 0  # Entries left in the heaps for removed packages
+
+    def __len__(self):
+        return len(self.live)
+
+    def __contains__(self, package):
+        return package in self.live
+
+    def add(self, package):
+        """
+        Add a package to the queue
+
+        Args:
+            package: The Package to add
+        """
+        if package in self.live:
+            return
+        self.seq += 1
+        self.live[package] = self.seq
+
+        oldest, newest = self.heaps.setdefault(package.quality_mark, ([], []))
+        heappush(oldest, (package.created_ts, self.seq, package))
+        heappush(newest, (-package.created_ts, self.seq, package))
+
+    def remove(self, package):
+        """
+        Remove a package from the queue
+
+        Entries are dropped lazily and the heaps are compacted once stale
+        entries outnumber live ones.
+
+        Args:
+            package: The Package to remove
+        """
+        if self.live.pop(package, None) is None:
+            return
+        self.stale += 1
+        if self.stale > 64 and self.stale > len(self.live):
+            self.compact()
+
+    def compact(self):
+        """Drop stale entries from every heap"""
+        live = self.live
+        for quality_mark in list(self.heaps):
+            oldest, newest = self.heaps[quality_mark]
+            oldest = [entry for entry in oldest if live.get(entry[2]) == entry[1]]
+            if not oldest:
+                del self.heaps[quality_mark]
+                continue
+            newest = [entry for entry in newest if live.get(entry[2]) == entry[1]]
+            heapify(oldest)
+            heapify(newest)
+            self.heaps[quality_mark] = (oldest, newest)
+        self.stale = 0
+
+    def peek(self, n, order="oldest_first", quality=None):
+        """
+        Get the next packages to offload without removing them
+
+        Args:
+            n (int): Maximum number of packages to return
+            order (str): Either "oldest_first" or "newest_first"
+            quality (str, optional): Only return packages of this quality mark
+
+        Returns:
+            list: Packages in offload order
+        """
+        return list(islice(self.ordered(order, quality), n))
+
+    def ordered(self, order="oldest_first", quality=None):
+        """
+        Iterate packages in offload order without removing them
+
+        Walks the heaps as binary trees with a small frontier heap, so the
+        cost is O(n log n) in the number of packages taken, not the queue
+        size. The queue must not change while the iterator is in use.
+
+        Args:
+            order (str): Either "oldest_first" or "newest_first"
+            quality (str, optional): Only yield packages of this quality mark
+
+        Returns:
+            iterator: Packages in offload order
+        """
+        side = 0 if order == "oldest_first" else 1
+        if quality is None:
+            heaps = [pair[side] for pair in self.heaps.values()]
+        elif quality in self.heaps:
+            heaps = [self.heaps[quality][side]]
+        else:
+            heaps = []
+
+        frontier = [(heap[0], h, 0) for h, heap in enumerate(heaps) if heap]
+        heapify(frontier)
+
+        live = self.live
+        while frontier:
+            entry, h, i = heappop(frontier)
+            if live.get(entry[2]) == entry[1]:
+                yield entry[2]
+
+            heap = heaps[h]
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heappush(frontier, (heap[child], h, child))
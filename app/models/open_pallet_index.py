@@ -0,0 +1,116 @@
+from bisect import bisect_left, insort
+from heapq import merge
+
+
+class OpenPalletIndex:
+    """Pallets with room left, per quality mark, fullest first"""
+
+    def __init__(self):
+        """Initialize an empty index"""
+        # (quality mark, placed on a line) -> sorted [(available, seq, pallet)]
+        self.buckets = {}
+        self.entries = {}  # Pallet -> ((available, seq, pallet), bucket key)
+        self.seqs = {}  # Pallet -> seq, kept while the pallet is full
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, pallet):
+        return pallet in self.entries
+
+    def add(self, pallet):
+        """
+        Start tracking a pallet
+
+        Args:
+            pallet: The Pallet to add
+        """
+        if pallet not in self.seqs:
+            self.seq += 1
+            self.seqs[pallet] = self.seq
+        self.update(pallet)
+
+    def update(self, pallet):
+        """
+        Re-file a pallet after its contents or location changed
+
+        Args:
+            pallet: The Pallet that changed
+        """
+        seq = self.seqs.get(pallet)
+        if seq is None:
+            return
+        available = pallet.available_capacity
+        bucket_key = (pallet.quality_mark, pallet.location is not None)
+        entry = self.entries.get(pallet)
+        if entry is not None and entry[0][0] == available and entry[1] == bucket_key:
+            return
+        self._discard(pallet)
+        if available > 0:
+            key = (available, seq, pallet)
+            insort(self.buckets.setdefault(bucket_key, []), key)
+            self.entries[pallet] = (key, bucket_key)
+
+    def _discard(self, pallet):
+        entry = self.entries.pop(pallet, None)
+        if entry is None:
+            return
+        key, bucket_key = entry
+        bucket = self.buckets[bucket_key]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self.buckets[bucket_key]
+
+    def pallets(self, quality_mark, placed=None, room=1):
+        """
+        Iterate the open pallets of a quality mark, fullest first
+
+        Args:
+            quality_mark (str): The quality mark to look up
+            placed (bool, optional): True for pallets on a line only, False
+                for pallets not on a line only, None for both
+            room (int): Minimum number of free package slots
+
+        Returns:
+            iterator: Pallets with at least room free slots
+        """
+        states = (True, False) if placed is None else (placed,)
+        runs = []
+        for state in states:
+            bucket = self.buckets.get((quality_mark, state))
+            if bucket:
+                start = bisect_left(bucket, (room,))
+                runs.append(map(bucket.__getitem__, range(start, len(bucket))))
+        return (key[2] for key in merge(*runs))
+
+    def best(self, quality_mark, placed=None, room=1):
+        """
+        Find the fullest pallet of a quality mark that still has room
+
+        Args:
+            quality_mark (str): The quality mark to look up
+            placed (bool, optional): True for pallets on a line only, False
+                for pallets not on a line only, None for both
+            room (int): Minimum number of free package slots
+
+        Returns:
+            Pallet: The fullest matching pallet, None if there is none
+        """
+        return next(self.pallets(quality_mark, placed, room), None)
+
+    def is_current(self, pallet):
+        """
+        Check that a pallet is indexed under its current state
+
+        Args:
+            pallet: The Pallet to check
+
+        Returns:
+            bool: True if the pallet's entry matches its room and location
+        """
+        entry = self.entries.get(pallet)
+        if pallet.available_capacity <= 0:
+            return entry is None
+        return (entry is not None and entry[0][0] == pallet.available_capacity
+                and entry[1] == (pallet.quality_mark, pallet.location is not None))
@@ -0,0 +1,55 @@
+class OrderedSet:
+    """Insertion-ordered collection with O(1) add, remove and membership"""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items=()):
+        """
+        Initialize the collection
+
+        Args:
+            items: Optional iterable of initial items
+        """
+        self.items = dict.fromkeys(items)  # Dicts keep insertion order
+
+    def append(self, item):
+        """
+        Add an item at the end, keeping its position if already present
+
+        Args:
+            item: The item to add
+        """
+        self.items[item] = None
+
+    def remove(self, item):
+        """
+        Remove an item
+
+        Args:
+            item: The item to remove
+
+        Raises:
+            ValueError: If the item is not in the collection
+        """
+        try:
+            del self.items[item]
+        except KeyError:
+            raise ValueError(f"{item} is not in the collection") from None
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __reversed__(self):
+        return reversed(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self.items)})"
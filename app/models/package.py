@@ -1,9 +1,13 @@
-import datetime
 import uuid
+from app.models.timestamps import now_epoch_us, to_epoch_us, from_epoch_us
 
 class Package:
     """Base Package class for all package types"""
     
+    # Slots keep per-package memory small when millions are held in memory
+    __slots__ = ("serial_number", "quality_mark", "mass", "created_ts",
+                 "location", "discarded", "manager", "row")
+    
     def __init__(self, quality_mark, mass, serial_number=None, created_at=None):
         """
         Initialize a package
@@ -17,16 +21,32 @@ class Package:
         self.serial_number = serial_number or str(uuid.uuid4())
         self.quality_mark = quality_mark
         self.mass = mass
-        self.created_at = created_at or datetime.datetime.now()
+        self.created_ts = to_epoch_us(created_at) if created_at else now_epoch_us()
         self.location = None  # Will be set when assigned to a location
         self.discarded = False
+        self.manager = None  # Set when registered with a LogisticsManager
+        self.row = None  # Row in the manager's PackageStore
+    
+    @property
+    def created_at(self):
+        """Creation timestamp as a datetime"""
+        return from_epoch_us(self.created_ts)
+    
+    @created_at.setter
+    def created_at(self, value):
+        self.created_ts = to_epoch_us(value)
     
     def discard(self):
         """Mark package as discarded"""
+        if self.discarded:
+            return True
         self.discarded = True
         if self.location:
+            self.location.record_change("discarded", "carton", self)
             self.location.remove_package(self)
             self.location = None
+        if self.manager is not None:
+            self.manager.record_discard(self)
         return True
     
     def assign_location(self, location):
@@ -50,15 +70,26 @@ class Package:
 class LoosePackage(Package):
     """Class for loose packages that need to be placed in pallets"""
     
+    __slots__ = ("pallet",)
+    package_type = "loose"
+    
     def __init__(self, quality_mark, mass, serial_number=None, created_at=None):
         super().__init__(quality_mark, mass, serial_number, created_at)
-        self.package_type = "loose"
         self.pallet = None  # Will be set when assigned to a pallet
+    
+    def discard(self):
+        """Mark package as discarded and take it off its pallet"""
+        if self.discarded:
+            return True
+        if self.pallet:
+            if self.pallet.location is not None:
+                self.pallet.location.record_change("discarded", "package", self, pallet=self.pallet)
+            self.pallet.remove_package(self)
+        return super().discard()
 
 
 class Carton(Package):
     """Class for carton packages that can be placed directly on lines"""
     
-    def __init__(self, quality_mark, mass, serial_number=None, created_at=None):
-        super().__init__(quality_mark, mass, serial_number, created_at)
-        self.package_type = "carton"
\ No newline at end of file
+    __slots__ = ()
+    package_type = "carton"
\ No newline at end of file
@@ -0,0 +1,89 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from app.models.timestamps import now_epoch_us, to_epoch_us, from_epoch_us
+
+ACTIONS = ("added", "removed")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+
+class PackageHistory:
+    """Append-only log of packages placed on and removed from a line"""
+
+    def __init__(self):
+        """Initialize an empty history log"""
+        self.package_ids = array("i")  # Index into self.packages
+        self.actions = array("b")      # Index into ACTIONS
+        self.timestamps = array("q")   # Epoch microseconds, never decreasing
+        self.packages = []             # Distinct packages seen by this log
+        self.package_index = {}        # Package -> index in self.packages
+
+    def __len__(self):
+        return len(self.actions)
+
+    def append(self, package, action, timestamp=None):
+        """
+        Record an action for a package
+
+        Args:
+            package: The Package the action applies to
+            action (str): Either "added" or "removed"
+            timestamp (int, optional): Epoch microseconds, defaults to now
+        """
+        package_id = self.package_index.get(package)
+        if package_id is None:
+            package_id = len(self.packages)
+            self.package_index[package] = package_id
+            self.packages.append(package)
+
+        if timestamp is None:
+            timestamp = now_epoch_us()
+
+        # Clamp to the last timestamp so the log stays sorted for bisect
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            timestamp = self.timestamps[-1]
+
+        self.package_ids.append(package_id)
+        self.actions.append(ACTION_CODES[action])
+        self.timestamps.append(timestamp)
+
+    def window(self, since=None, until=None):
+        """
+        Find the entry positions inside a time range
+
+        Args:
+            since (datetime, optional): Inclusive lower bound
+            until (datetime, optional): Inclusive upper bound
+
+        Returns:
+            tuple: (start, end) positions, end exclusive
+        """
+        start = bisect_left(self.timestamps, to_epoch_us(since)) if since else 0
+        end = bisect_right(self.timestamps, to_epoch_us(until)) if until else len(self.timestamps)
+        return start, max(start, end)
+
+    def entries(self, since=None, until=None, limit=None, offset=0):
+        """
+        Get history entries in chronological order
+
+        Args:
+            since (datetime, optional): Inclusive lower bound
+            until (datetime, optional): Inclusive upper bound
+            limit (int, optional): Maximum number of entries to return
+            offset (int): Number of entries in the range to skip
+
+        Returns:
+            list: Entries as dicts with package, action and timestamp keys
+        """
+        start, end = self.window(since, until)
+        start = min(start + offset, end)
+        if limit is not None:
+            end = min(end, start + limit)
+
+        return [
+            {
+                "package": self.packages[self.package_ids[i]],
+                "action": ACTIONS[self.actions[i]],
+                "timestamp": from_epoch_us(self.timestamps[i])
+            }
+            for i in range(start, end)
+        ]
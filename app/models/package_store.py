@@ -0,0 +1,296 @@
+from array import array
+from bisect import bisect_right
+from app.models.quality_registry import quality_registry
+from app.models.timestamps import now_epoch_us
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to the array module
+    np = None
+
+# Column name -> typecode (shared by NumPy dtypes and the array module)
+COLUMNS = (
+    ("mass", "d"),
+    ("created_ts", "q"),
+    ("quality_id", "i"),
+    ("package_type", "b"),
+    ("discarded", "b"),
+    ("line_id", "i"),    # Line holding a carton, -1 if none
+    ("pallet_id", "i"),  # Pallet holding a loose package, -1 if none
+)
+
+PACKAGE_TYPES = {"loose": 0, "carton": 1}
+
+
+class PackageStore:
+    """Columnar store of package attributes kept alongside Package objects"""
+
+    def __init__(self, capacity=1024):
+        """
+        Initialize an empty store
+
+        Args:
+            capacity (int): Initial number of rows to allocate
+        """
+        self.size = 0
+        self.objects = []  # row -> Package
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            if np is not None:
+                self.columns[name] = np.empty(capacity, dtype=typecode)
+            else:
+                self.columns[name] = array(typecode)
+
+        # Locations are stored as small integer ids so they fit in columns
+        self.line_ids = {}       # Line -> id
+        self.line_warehouse = []  # line id -> warehouse id, -1 if none
+        self.warehouse_ids = {}  # Warehouse -> id
+        self.pallet_ids = {}     # Pallet -> id
+        self.pallet_line = []    # pallet id -> line id, -1 if none
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __getitem__(self, index):
+        return self.objects[index]
+
+    def __contains__(self, package):
+        row = package.row
+        return row is not None and row < self.size and self.objects[row] is package
+
+    def append(self, package):
+        """
+        Add a package as a new row
+
+        Args:
+            package: The Package object to store
+
+        Returns:
+            int: The row index assigned to the package
+        """
+        row = self.size
+        values = {
+            "mass": package.mass,
+            "created_ts": package.created_ts,
+            "quality_id": quality_registry.intern(package.quality_mark),
+            "package_type": PACKAGE_TYPES.get(package.package_type, -1),
+            "discarded": package.discarded,
+            "line_id": -1,
+            "pallet_id": -1,
+        }
+
+        if np is not None:
+            if row == len(self.columns["mass"]):
+                self._grow(max(row * 2, 1024))
+            for name, value in values.items():
+                self.columns[name][row] = value
+        else:
+            for name, value in values.items():
+                self.columns[name].append(value)
+
+        self.objects.append(package)
+        self.size += 1
+        package.row = row
+        return row
+
+    def extend(self, packages):
+        """
+        Add unplaced packages as new rows, filling each column in one pass
+
+        Args:
+            packages (list): The Package objects to store
+        """
+        start = self.size
+        end = start + len(packages)
+        values = {
+            "mass": [package.mass for package in packages],
+            "created_ts": [package.created_ts for package in packages],
+            "quality_id": [quality_registry.intern(package.quality_mark) for package in packages],
+            "package_type": [PACKAGE_TYPES.get(package.package_type, -1) for package in packages],
+            "discarded": [package.discarded for package in packages],
+            "line_id": [-1] * len(packages),
+            "pallet_id": [-1] * len(packages),
+        }
+
+        if np is not None:
+            if end > len(self.columns["mass"]):
+                self._grow(max(start * 2, end, 1024))
+            for name, column in values.items():
+                self.columns[name][start:end] = column
+        else:
+            for name, column in values.items():
+                self.columns[name].extend(column)
+
+        self.objects.extend(packages)
+        for row, package in enumerate(packages, start):
+            package.row = row
+        self.size = end
+
+    def _grow(self, capacity):
+        """Reallocate every column with room for capacity rows"""
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def column(self, name):
+        """
+        Get the filled part of a column
+
+        Args:
+            name (str): Column name
+
+        Returns:
+            A NumPy view, or an array.array when NumPy is not installed
+        """
+        return self.columns[name][:self.size]
+
+    def _line_id(self, line):
+        """Get the id for a line, assigning one if needed"""
+        line_id = self.line_ids.get(line)
+        if line_id is None:
+            line_id = len(self.line_warehouse)
+            self.line_ids[line] = line_id
+            self.line_warehouse.append(self._warehouse_id(line.warehouse))
+        return line_id
+
+    def _warehouse_id(self, warehouse):
+        """Get the id for a warehouse, assigning one if needed"""
+        if warehouse is None:
+            return -1
+        return self.warehouse_ids.setdefault(warehouse, len(self.warehouse_ids))
+
+    def _pallet_id(self, pallet):
+        """Get the id for a pallet, assigning one if needed"""
+        pallet_id = self.pallet_ids.get(pallet)
+        if pallet_id is None:
+            pallet_id = len(self.pallet_line)
+            self.pallet_ids[pallet] = pallet_id
+            self.pallet_line.append(self._line_id(pallet.location) if pallet.location else -1)
+        return pallet_id
+
+    def set_location(self, package, line=None, pallet=None):
+        """
+        Record where a package is stored
+
+        Args:
+            package: The stored Package
+            line: The Line holding the package directly (cartons)
+            pallet: The Pallet holding the package (loose packages)
+        """
+        if package.row is None:
+            return
+        self.columns["line_id"][package.row] = self._line_id(line) if line is not None else -1
+        self.columns["pallet_id"][package.row] = self._pallet_id(pallet) if pallet is not None else -1
+
+    def set_discarded(self, package):
+        """
+        Mark a package as discarded
+
+        Args:
+            package: The discarded Package
+        """
+        if package.row is not None:
+            self.columns["discarded"][package.row] = 1
+
+    def set_pallet_line(self, pallet, line):
+        """
+        Record which line a pallet sits on
+
+        Args:
+            pallet: The Pallet that moved
+            line: The Line now holding the pallet, or None
+        """
+        self.pallet_line[self._pallet_id(pallet)] = self._line_id(line) if line is not None else -1
+
+    def set_line_warehouse(self, line, warehouse):
+        """
+        Record which warehouse a line belongs to
+
+        Args:
+            line: The Line that moved
+            warehouse: The Warehouse now holding the line, or None
+        """
+        self.line_warehouse[self._line_id(line)] = self._warehouse_id(warehouse)
+
+    def resolved_line_ids(self):
+        """
+        Get the line holding each package, following pallets to their line
+
+        Returns:
+            list or ndarray: Line id per row, -1 for packages not on a line
+        """
+        line_ids = self.column("line_id")
+        pallet_ids = self.column("pallet_id")
+        if np is not None:
+            # The trailing -1 makes pallet id -1 (no pallet) map to no line
+            pallet_line = np.append(np.asarray(self.pallet_line, dtype="i"), -1)
+            return np.where(pallet_ids >= 0, pallet_line[pallet_ids], line_ids)
+        return [self.pallet_line[p] if p >= 0 else l for l, p in zip(line_ids, pallet_ids)]
+
+    def _live_rows(self, stored_only):
+        """Mask (or list of flags) for non-discarded rows, optionally only those on a line"""
+        discarded = self.column("discarded")
+        if np is not None:
+            mask = discarded == 0
+            if stored_only:
+                mask &= self.resolved_line_ids() >= 0
+            return mask
+        flags = [not d for d in discarded]
+        if stored_only:
+            flags = [f and l >= 0 for f, l in zip(flags, self.resolved_line_ids())]
+        return flags
+
+    def mass_by_quality(self, stored_only=False):
+        """
+        Total mass of non-discarded packages per quality mark
+
+        Args:
+            stored_only (bool): Only count packages currently on a line
+
+        Returns:
+            dict: Quality mark -> total mass in kg
+        """
+        quality_ids = self.column("quality_id")
+        masses = self.column("mass")
+        mask = self._live_rows(stored_only)
+        if np is not None:
+            totals = np.bincount(quality_ids[mask], weights=masses[mask],
+                                 minlength=len(quality_registry.marks))
+            return {quality_registry.get_mark(i): float(total)
+                    for i, total in enumerate(totals) if total}
+        totals = {}
+        for quality_id, mass, live in zip(quality_ids, masses, mask):
+            if live:
+                totals[quality_id] = totals.get(quality_id, 0) + mass
+        return {quality_registry.get_mark(i): total for i, total in totals.items()}
+
+    def age_buckets(self, edges, now=None, stored_only=True):
+        """
+        Count non-discarded packages by age
+
+        Args:
+            edges (list): Ascending bucket edges in seconds, e.g. [86400, 604800]
+            now (int, optional): Reference time in epoch microseconds
+            stored_only (bool): Only count packages currently on a line
+
+        Returns:
+            list: Counts for ages below edges[0], between each pair of edges,
+                and at or above edges[-1] (len(edges) + 1 entries)
+        """
+        now = now if now is not None else now_epoch_us()
+        edges_us = [edge * 1_000_000 for edge in edges]
+        created = self.column("created_ts")
+        mask = self._live_rows(stored_only)
+        if np is not None:
+            ages = now - created[mask]
+            buckets = np.searchsorted(np.asarray(edges_us), ages, side="right")
+            return np.bincount(buckets, minlength=len(edges) + 1).tolist()
+        counts = [0] * (len(edges) + 1)
+        for created_ts, live in zip(created, mask):
+            if live:
+                counts[bisect_right(edges_us, now - created_ts)] += 1
+        return counts
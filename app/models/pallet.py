@@ -1,9 +1,13 @@
 import uuid
-from datetime import datetime
+from app.models.ordered_set import OrderedSet
+from app.models.timestamps import now_epoch_us, to_epoch_us, from_epoch_us
 
 class Pallet:
     """Pallet to hold loose packages of the same quality"""
     
+    __slots__ = ("serial_number", "quality_mark", "max_capacity", "created_ts",
+                 "packages", "total_mass", "location", "manager")
+    
     def __init__(self, quality_mark, max_capacity, serial_number=None, created_at=None):
         """
         Initialize a pallet
@@ -17,9 +21,16 @@ class Pallet:
         self.serial_number = serial_number or str(uuid.uuid4())
         self.quality_mark = quality_mark
         self.max_capacity = max_capacity
-        self.created_at = created_at or datetime.now()
-        self.packages = []
+        self.created_ts = to_epoch_us(created_at) if created_at else now_epoch_us()
+        self.packages = OrderedSet()
+        self.total_mass = 0  # Running total, updated on add/remove
         self.location = None  # Will be set when assigned to a location
+        self.manager = None  # Set when registered with a LogisticsManager
+    
+    @property
+    def created_at(self):
+        """Creation timestamp as a datetime"""
+        return from_epoch_us(self.created_ts)
     
     @property
     def current_count(self):
@@ -31,9 +42,8 @@ class Pallet:
         """Get the remaining capacity of the pallet"""
         return self.max_capacity - self.current_count
     
-    @property
-    def total_mass(self):
-        """Calculate the total mass of all packages in the pallet"""
+    def recount_total_mass(self):
+        """Recalculate the total mass from scratch (used to verify the running total)"""
         return sum(package.mass for package in self.packages)
     
     def add_package(self, package):
@@ -53,13 +63,29 @@ class Pallet:
         if package.quality_mark != self.quality_mark:
             raise ValueError(f"Package quality ({package.quality_mark}) does not match pallet quality ({self.quality_mark})")
         
+        # Already on this pallet
+        if package in self.packages:
+            return True
+        
         # Check if pallet has space
         if self.current_count >= self.max_capacity:
             return False
         
+        # A package can only sit on one pallet at a time
+        if package.pallet is not None and package.pallet is not self:
+            package.pallet.remove_package(package)
+        
         # Add package to pallet and update package's pallet reference
         self.packages.append(package)
         package.pallet = self
+        self.total_mass += package.mass
+        if self.location is not None:
+            self.location.adjust_totals(package.mass, 1)
+            self.location.enqueue_packages((package,))
+            self.location.record_change("added", "package", package, pallet=self)
+        if self.manager is not None:
+            self.manager.record_location(package, pallet=self)
+            self.manager.open_pallet_index.update(self)
         return True
     
     def remove_package(self, package):
@@ -75,6 +101,14 @@ class Pallet:
         if package in self.packages:
             self.packages.remove(package)
             package.pallet = None
+            self.total_mass -= package.mass
+            if self.location is not None:
+                self.location.adjust_totals(-package.mass, -1)
+                self.location.dequeue_packages((package,))
+                self.location.record_change("removed", "package", package, pallet=self)
+            if self.manager is not None:
+                self.manager.clear_location(package)
+                self.manager.open_pallet_index.update(self)
             return True
         return False
     
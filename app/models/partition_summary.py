@@ -0,0 +1,222 @@
+# A partition summary describes one stored partition (a warehouse, or the
+# objects outside any warehouse) without building its objects. It is a plain
+# JSON-ready dict:
+#
+#   warehouse            [serial, name, max_capacity, created_ts], None outside warehouses
+#   version              the warehouse's version when summarized, None if unknown
+#   lines                number of lines in the warehouse
+#   capacity_types       capacity type -> [lines, max capacity, usage, mass, package count]
+#   available            capacity type -> most free capacity on any one line
+#   stored_by_quality    quality mark -> [packages on lines, mass]
+#   stored_by_type       package type -> [packages on lines, mass]
+#   registered_by_type   package type -> packages
+#   discarded_by_quality quality mark -> discarded packages
+#   pallet_qualities     quality marks of the pallets
+#   open_pallet_qualities quality marks of pallets with room left
+#   pallets, packages    object counts
+
+
+def new_summary(warehouse=None, version=None):
+    """
+    Create an empty partition summary
+
+    Args:
+        warehouse (list, optional): [serial, name, max_capacity, created_ts]
+        version (int, optional): The warehouse's version
+
+    Returns:
+        dict: The summary
+    """
+    return {
+        "warehouse": warehouse,
+        "version": version,
+        "lines": 0,
+        "capacity_types": {},
+        "available": {},
+        "stored_by_quality": {},
+        "stored_by_type": {},
+        "registered_by_type": {},
+        "discarded_by_quality": {},
+        "pallet_qualities": [],
+        "open_pallet_qualities": [],
+        "pallets": 0,
+        "packages": 0,
+    }
+
+
+def add_line(summary, capacity_type, max_capacity, mass, count, cartons):
+    """
+    Count a warehouse line and its contents in
+
+    Args:
+        summary (dict): The summary to update
+        capacity_type (str): "weight" or "count"
+        max_capacity (float): The line's capacity
+        mass (float): Mass stored on the line
+        count (int): Packages stored on the line, loose ones included
+        cartons (int): Cartons stored directly on the line
+    """
+    usage = cartons if capacity_type == "count" else mass
+    totals = summary["capacity_types"].setdefault(capacity_type, [0, 0, 0, 0, 0])
+    totals[0] += 1
+    totals[1] += max_capacity
+    totals[2] += usage
+    totals[3] += mass
+    totals[4] += count
+    available = summary["available"]
+    available[capacity_type] = max(available.get(capacity_type, 0), max_capacity - usage)
+    summary["lines"] += 1
+
+
+def add_stored(summary, quality_mark, package_type, count, mass):
+    """
+    Count packages stored on the partition's lines
+
+    Args:
+        summary (dict): The summary to update
+        quality_mark (str): Quality mark of the packages
+        package_type (str): "loose" or "carton"
+        count (int): Number of packages
+        mass (float): Their total mass
+    """
+    for totals in (summary["stored_by_quality"].setdefault(quality_mark, [0, 0]),
+                   summary["stored_by_type"].setdefault(package_type, [0, 0])):
+        totals[0] += count
+        totals[1] += mass
+
+
+def add_packages(summary, quality_mark, package_type, discarded, count):
+    """
+    Count packages held by the partition, stored or not
+
+    Args:
+        summary (dict): The summary to update
+        quality_mark (str): Quality mark of the packages
+        package_type (str): "loose" or "carton"
+        discarded (bool): Whether the packages are discarded
+        count (int): Number of packages
+    """
+    registered = summary["registered_by_type"]
+    registered[package_type] = registered.get(package_type, 0) + count
+    if discarded:
+        by_quality = summary["discarded_by_quality"]
+        by_quality[quality_mark] = by_quality.get(quality_mark, 0) + count
+    summary["packages"] += count
+
+
+def add_pallet(summary, quality_mark, room):
+    """
+    Count a pallet
+
+    Args:
+        summary (dict): The summary to update
+        quality_mark (str): The pallet's quality mark
+        room (int): Free package slots left on it
+    """
+    if quality_mark not in summary["pallet_qualities"]:
+        summary["pallet_qualities"].append(quality_mark)
+    if room > 0 and quality_mark not in summary["open_pallet_qualities"]:
+        summary["open_pallet_qualities"].append(quality_mark)
+    summary["pallets"] += 1
+
+
+def summarize_partition(state, version=None):
+    """
+    Summarize one partition
+
+    Args:
+        state (dict): The partition's objects in persistence.dump_state format
+        version (int, optional): Version of the partition's warehouse
+
+    Returns:
+        dict: The partition summary
+    """
+    summary = new_summary(state["warehouses"][0] if state["warehouses"] else None, version)
+    packages = {row[0]: row for row in state["packages"]}
+    pallets = {row[0]: row for row in state["pallets"]}
+
+    for line in state["lines"]:
+        if line["warehouse"] is None:
+            continue  # Lines outside warehouses are not part of any totals
+        stored = [packages[serial_number] for serial_number in line["cartons"]]
+        for pallet_serial in line["pallets"]:
+            stored.extend(packages[serial_number] for serial_number in pallets[pallet_serial][4])
+        mass = sum(row[3] for row in stored)
+        add_line(summary, line["capacity_type"], line["max_capacity"], mass, len(stored), len(line["cartons"]))
+        for _, package_type, quality_mark, package_mass, _, _ in stored:
+            add_stored(summary, quality_mark, package_type, 1, package_mass)
+
+    for _, package_type, quality_mark, _, _, discarded in state["packages"]:
+        add_packages(summary, quality_mark, package_type, discarded, 1)
+    for _, quality_mark, max_capacity, _, contents in state["pallets"]:
+        add_pallet(summary, quality_mark, max_capacity - len(contents))
+    return summary
+
+
+def merge_summary(summary, capacity_types, stored_by_quality, stored_by_type,
+                  registered_by_type, discarded_by_quality):
+    """
+    Add a summary's rollups into SystemStats-shaped dicts
+
+    Args:
+        summary (dict): The partition summary
+        capacity_types (dict): capacity type -> [lines, capacity, usage, mass, count]
+        stored_by_quality (dict): quality mark -> [packages, mass]
+        stored_by_type (dict): package type -> [packages, mass]
+        registered_by_type (dict): package type -> packages
+        discarded_by_quality (dict): quality mark -> discarded packages
+    """
+    for capacity_type, values in summary["capacity_types"].items():
+        totals = capacity_types.setdefault(capacity_type, [0, 0, 0, 0, 0])
+        for i, value in enumerate(values):
+            totals[i] += value
+    for target, source in ((stored_by_quality, summary["stored_by_quality"]),
+                           (stored_by_type, summary["stored_by_type"])):
+        for key, (count, mass) in source.items():
+            totals = target.setdefault(key, [0, 0])
+            totals[0] += count
+            totals[1] += mass
+    for target, source in ((registered_by_type, summary["registered_by_type"]),
+                           (discarded_by_quality, summary["discarded_by_quality"])):
+        for key, count in source.items():
+            target[key] = target.get(key, 0) + count
+
+
+def may_hold(summary, kind, filters):
+    """
+    Check whether a partition may hold packages or pallets matching a query
+
+    Args:
+        summary (dict): The partition summary
+        kind (str): "package" or "pallet"
+        filters (dict): Field name -> value or list of values, as given to
+            InventoryIndex.query
+
+    Returns:
+        bool: False only if no object of the partition can match
+    """
+    if summary["warehouse"] is None:
+        return True  # Objects outside warehouses can be in any state
+    # Everything in a warehouse partition is stored and not discarded
+    present = {
+        "package": {
+            "quality_mark": summary["stored_by_quality"],
+            "package_type": summary["stored_by_type"],
+            "placement": ("line", "pallet"),
+            "discarded": (False,),
+        },
+        "pallet": {
+            "quality_mark": summary["pallet_qualities"],
+            "placement": ("line",),
+        },
+    }[kind]
+    if not summary["packages" if kind == "package" else "pallets"]:
+        return False
+    for name, values in filters.items():
+        if values is None or name not in present:
+            continue
+        if not isinstance(values, (list, tuple, set, frozenset)):
+            values = (values,)
+        if not any(value in present[name] for value in values):
+            return False
+    return True
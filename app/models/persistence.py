@@ -0,0 +1,761 @@
+import json
+import os
+import queue
+import threading
+import time
+from app.models.binary_snapshot import SnapshotReader, write_snapshot
+from app.models.line import Line
+from app.models.package import LoosePackage, Carton
+from app.models.package_history import PackageHistory, ACTIONS
+from app.models.pallet import Pallet
+from app.models.warehouse import Warehouse, VERSION_BASE
+
+DURABILITY_MODES = ("sync", "async", "interval")
+
+
+class OperationLog:
+    """
+    Write-ahead log of WarehouseSystem operations with group commit
+
+    Records are appended to the file at path. Rotating the log closes that
+    segment at the next commit by renaming it to "<path>.<last lsn>", so a
+    snapshot can cover the closed segments and delete them while new
+    records go to a fresh file.
+    """
+
+    def __init__(self, path, commit_delay=0.0):
+        """
+        Initialize the log
+
+        Args:
+            path (str): File path of the current segment
+            commit_delay (float): Seconds a committing thread waits for other
+                requests to join its fsync (0 commits immediately)
+        """
+        self.path = path
+        self.commit_delay = commit_delay
+        self.file = None
+        self.cond = threading.Condition()
+        self.pending = []      # Encoded records not yet written
+        self.last_lsn = 0      # Sequence number of the last appended record
+        self.durable_lsn = 0   # Sequence number of the last fsynced record
+        self.flushing = False  # True while one thread writes for the group
+        self.records_since_snapshot = 0
+        self.valid_length = None  # Bytes of intact records found by read()
+        self.rotations = []    # Last lsn of each segment to close at the next commit
+
+    def closed_segments(self):
+        """
+        Find the segments closed by rotation
+
+        Returns:
+            list: (last lsn, path) pairs in log order
+        """
+        directory, name = os.path.split(self.path)
+        segments = []
+        for entry in os.listdir(directory or "."):
+            prefix, _, suffix = entry.rpartition(".")
+            if prefix == name and suffix.isdigit():
+                segments.append((int(suffix), os.path.join(directory, entry)))
+        return sorted(segments)
+
+    def read(self, after_lsn=0):
+        """
+        Read the records in the log, closed segments first
+
+        A torn record at the end of the current segment (from a crash
+        mid-write) ends the read and is cut off when the log is opened.
+
+        Args:
+            after_lsn (int): Skip records with a sequence number up to this
+
+        Returns:
+            list: Records as [lsn, timestamp, operation, *args]
+        """
+        records = []
+        for last_lsn, path in self.closed_segments():
+            if last_lsn > after_lsn:
+                self._read_segment(path, after_lsn, records)
+        self.valid_length = 0
+        if os.path.exists(self.path):
+            self.valid_length = self._read_segment(self.path, after_lsn, records)
+        return records
+
+    def _read_segment(self, path, after_lsn, records):
+        """Append the records of one segment file, returning its intact length"""
+        valid_length = 0
+        with open(path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                valid_length += len(raw)
+                self.records_since_snapshot += 1
+                if record[0] > after_lsn:
+                    records.append(record)
+        return valid_length
+
+    def open(self, last_lsn):
+        """
+        Open the log for appending
+
+        Args:
+            last_lsn (int): Sequence number of the last record already applied
+        """
+        self.file = open(self.path, "ab")
+        if self.valid_length is not None:
+            self.file.truncate(self.valid_length)
+        self.last_lsn = self.durable_lsn = last_lsn
+
+    def append(self, timestamp, operation, args):
+        """
+        Queue a record for the next commit
+
+        Args:
+            timestamp (int): Epoch microseconds the operation ran at
+            operation (str): Operation name
+            args (tuple): JSON-serializable operation arguments
+
+        Returns:
+            int: Sequence number of the record
+        """
+        with self.cond:
+            self.last_lsn += 1
+            record = [self.last_lsn, timestamp, operation, *args]
+            self.pending.append(json.dumps(record, separators=(",", ":")) + "\n")
+            self.records_since_snapshot += 1
+            return self.last_lsn
+
+    def rotate(self):
+        """
+        Start a new segment for the records appended from now on
+
+        Nothing is written here; the next commit closes the current segment.
+
+        Returns:
+            int: Sequence number of the last record in the closed segment
+        """
+        with self.cond:
+            self.rotations.append(self.last_lsn)
+            self.records_since_snapshot = 0
+            return self.last_lsn
+
+    def commit(self, lsn=None):
+        """
+        Block until a record is durable on disk
+
+        The first waiting thread writes and fsyncs every pending record,
+        so concurrent requests share a single fsync. It also closes the
+        segments rotated since the last commit.
+
+        Args:
+            lsn (int, optional): Sequence number to wait for, defaults to
+                the last appended record
+        """
+        with self.cond:
+            lsn = self.last_lsn if lsn is None else lsn
+            while self.durable_lsn < lsn or self.rotations:
+                if self.flushing:
+                    self.cond.wait()
+                    continue
+
+                self.flushing = True
+                if self.commit_delay:
+                    self.cond.wait(self.commit_delay)
+                batch, self.pending = self.pending, []
+                rotations, self.rotations = self.rotations, []
+                first_lsn = self.last_lsn - len(batch) + 1
+
+                # Write outside the lock so other requests can keep appending
+                self.cond.release()
+                written = 0
+                try:
+                    for last_lsn in rotations:
+                        end = max(written, last_lsn - first_lsn + 1)
+                        self._write(batch[written:end])
+                        written = end
+                        self._close_segment(last_lsn)
+                        rotations = rotations[1:]
+                    self._write(batch[written:])
+                    written = len(batch)
+                except Exception:
+                    self.cond.acquire()
+                    self.pending[:0] = batch[written:]
+                    self.rotations[:0] = rotations
+                    self.durable_lsn = first_lsn + written - 1
+                    self.flushing = False
+                    self.cond.notify_all()
+                    raise
+                self.cond.acquire()
+
+                self.durable_lsn = first_lsn + written - 1
+                self.flushing = False
+                self.cond.notify_all()
+
+    def _write(self, records):
+        """Write and fsync encoded records to the current segment"""
+        if not records:
+            return
+        self.file.write("".join(records).encode())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _close_segment(self, last_lsn):
+        """Rename the current segment after its last record and start a new one"""
+        self.file.close()
+        os.replace(self.path, f"{self.path}.{last_lsn}")
+        self.file = open(self.path, "ab")
+
+    def drop_segments(self, lsn):
+        """
+        Delete the closed segments a snapshot covers
+
+        Args:
+            lsn (int): Sequence number the snapshot includes
+        """
+        for last_lsn, path in self.closed_segments():
+            if last_lsn <= lsn:
+                os.remove(path)
+
+    def close(self):
+        """Close the log file"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class FileStorage:
+    """Storage backend keeping an operation log and a binary snapshot"""
+
+    def __init__(self, data_file, snapshot_interval=10000, commit_delay=0.0):
+        """
+        Initialize the backend
+
+        Args:
+            data_file (str): Base file path, the snapshot and log are
+                written next to it with .snap and .log suffixes
+            snapshot_interval (int): Logged operations between snapshots
+            commit_delay (float): Seconds a commit waits for concurrent
+                requests to share its fsync
+        """
+        base_path = os.path.splitext(data_file)[0]
+        self.snapshot_file = base_path + ".snap"
+        self.snapshot_interval = snapshot_interval
+        self.operation_log = OperationLog(base_path + ".log", commit_delay)
+        self.snapshot_lsn = 0  # Sequence number the loaded snapshot includes
+        self.loaded_lsn = 0
+        self.checkpoint_lock = threading.Lock()  # One checkpoint at a time
+        self.checkpoint_pause = 0.0  # Seconds the last checkpoint held the system lock
+
+    def load(self, system):
+        """
+        Open the last snapshot for lazy hydration
+
+        Args:
+            system: The WarehouseSystem to load into
+
+        Returns:
+            list: Logged operations the system must replay
+        """
+        if os.path.exists(self.snapshot_file):
+            reader = SnapshotReader(self.snapshot_file)
+            system.manager.set_offload_order(reader.offload_order)
+            system.manager.loader = LazyLoader(system, reader)
+            self.snapshot_lsn = self.loaded_lsn = reader.lsn
+
+        records = self.operation_log.read(after_lsn=self.loaded_lsn)
+        if records:
+            self.loaded_lsn = records[-1][0]
+        return records
+
+    def open(self):
+        """Start accepting operations once the loaded ones were replayed"""
+        # Left behind if the last run stopped between a snapshot and its cleanup
+        self.operation_log.drop_segments(self.snapshot_lsn)
+        self.operation_log.open(self.loaded_lsn)
+
+    def begin(self, operation, args):
+        """Called before an operation is applied"""
+
+    def record(self, timestamp, operation, args, result):
+        """
+        Log an applied operation
+
+        Args:
+            timestamp (int): Epoch microseconds the operation ran at
+            operation (str): Operation name
+            args (tuple): Operation arguments, objects are logged by serial
+            result: Value the operation returned
+        """
+        self.operation_log.append(timestamp, operation,
+                                  [getattr(arg, "serial_number", arg) for arg in args])
+
+    def commit(self):
+        """Make every recorded operation durable"""
+        self.operation_log.commit()
+
+    def unsaved(self):
+        """Number of recorded operations not yet durable"""
+        return self.operation_log.last_lsn - self.operation_log.durable_lsn
+
+    def maintain(self, system):
+        """
+        Write a snapshot when the log has grown past snapshot_interval
+
+        Returns:
+            bool: True if a snapshot was written
+        """
+        if self.operation_log.records_since_snapshot < self.snapshot_interval:
+            return False
+        self.checkpoint(system)
+        return True
+
+    def checkpoint(self, system):
+        """
+        Write the full system state to the snapshot file and drop the log it covers
+
+        The system lock is only held to rotate the log and capture the
+        state; encoding and writing the snapshot and deleting the old log
+        segment happen while requests keep running.
+        """
+        with self.checkpoint_lock:
+            start = time.perf_counter()
+            with system.lock:
+                lsn = self.operation_log.rotate()
+                state = dump_state(system, lsn)
+            self.checkpoint_pause = time.perf_counter() - start
+
+            self.operation_log.commit(lsn)
+            # Unbuilt partitions are copied from the snapshot the loader reads
+            source = SnapshotReader(self.snapshot_file) if state["unloaded"] else None
+            try:
+                placed = write_snapshot(self.snapshot_file, state, source)
+            finally:
+                if source is not None:
+                    source.close()
+            self.snapshot_lsn = lsn
+            self.operation_log.drop_segments(lsn)
+            if state["unloaded"]:
+                self._reopen(system, dict(zip(state["unloaded"], placed)))
+
+    def _reopen(self, system, placed):
+        """Point the lazy loader at the snapshot just written"""
+        reader = SnapshotReader(self.snapshot_file)
+        with system.lock:
+            loader = system.manager.loader
+            if loader is not None:
+                reader = loader.replace_reader(reader, placed)
+        reader.close()
+
+    def close(self):
+        """Release the operation log"""
+        self.operation_log.close()
+
+
+class PersistenceWriter:
+    """Background thread that makes logged operations durable"""
+
+    _STOP = object()
+
+    def __init__(self, system, mode="async", max_delay=0.05, interval=1.0):
+        """
+        Initialize the writer
+
+        Durability modes:
+            sync: save_data() returns once its operation is fsynced
+            async: save_data() returns at once, the writer fsyncs within
+                max_delay seconds of the first unsaved operation
+            interval: the writer fsyncs at most once every interval seconds
+
+        Args:
+            system: The WarehouseSystem whose storage is written
+            mode (str): One of DURABILITY_MODES
+            max_delay (float): Longest wait before an async write
+            interval (float): Seconds between interval writes
+        """
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self.system = system
+        self.mode = mode
+        self.max_delay = max_delay
+        self.interval = interval
+        self.queue = queue.Queue()  # Dirty-state notifications and flush requests
+        self.thread = None
+        self.last_write = 0.0       # time.monotonic() of the last write
+
+        # Metrics
+        self.notifications = 0
+        self.writes = 0
+        self.snapshots = 0
+        self.errors = 0
+        self.total_write_time = 0.0
+        self.last_write_time = 0.0
+        self.max_write_time = 0.0
+        self.total_checkpoint_time = 0.0
+        self.last_checkpoint_time = 0.0
+        self.max_checkpoint_time = 0.0
+        self.max_checkpoint_pause = 0.0  # Longest time a checkpoint held the system lock
+
+    def start(self):
+        """Start the writer thread"""
+        self.thread = threading.Thread(target=self.run, name="persistence-writer", daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        """Tell the writer that new operations were logged"""
+        self.queue.put(None)
+
+    def flush(self):
+        """Block until every logged operation is durable"""
+        if self.thread is None or not self.thread.is_alive():
+            self.write()
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def stop(self):
+        """Flush outstanding operations and stop the writer thread"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join()
+        self.thread = None
+
+    def run(self):
+        """Writer loop: gather a burst of notifications, then write once"""
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if self.mode == "interval":
+                deadline = self.last_write + self.interval
+            elif self.mode == "async":
+                deadline = time.monotonic() + self.max_delay
+            else:
+                deadline = 0.0
+
+            waiters = []
+            while True:
+                if item is self._STOP:
+                    stopping = True
+                    deadline = 0.0
+                elif item is None:
+                    self.notifications += 1
+                else:
+                    # A flush request skips the remaining delay
+                    waiters.append(item)
+                    deadline = 0.0
+
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            self.write()
+            for done in waiters:
+                done.set()
+
+    def write(self):
+        """Commit recorded operations and run storage maintenance"""
+        start = time.perf_counter()
+        try:
+            self.system.storage.commit()
+            checkpoint_start = time.perf_counter()
+            if self.system.storage.maintain(self.system):
+                checkpoint_time = time.perf_counter() - checkpoint_start
+                self.snapshots += 1
+                self.total_checkpoint_time += checkpoint_time
+                self.last_checkpoint_time = checkpoint_time
+                self.max_checkpoint_time = max(self.max_checkpoint_time, checkpoint_time)
+                self.max_checkpoint_pause = max(self.max_checkpoint_pause, self.system.storage.checkpoint_pause)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error saving data: {e}")
+
+        elapsed = time.perf_counter() - start
+        self.last_write = time.monotonic()
+        self.writes += 1
+        self.total_write_time += elapsed
+        self.last_write_time = elapsed
+        self.max_write_time = max(self.max_write_time, elapsed)
+
+    def metrics(self):
+        """
+        Get writer statistics
+
+        Returns:
+            dict: Queue depth, unsaved operations, and write and checkpoint
+                latency in ms; checkpoint_pause is how long a checkpoint
+                held up requests
+        """
+        return {
+            "mode": self.mode,
+            "running": self.thread is not None and self.thread.is_alive(),
+            "queue_depth": self.queue.qsize(),
+            "unsaved_operations": self.system.storage.unsaved(),
+            "notifications": self.notifications,
+            "writes": self.writes,
+            "snapshots": self.snapshots,
+            "errors": self.errors,
+            "last_write_ms": self.last_write_time * 1000,
+            "max_write_ms": self.max_write_time * 1000,
+            "avg_write_ms": self.total_write_time / self.writes * 1000 if self.writes else 0.0,
+            "last_checkpoint_ms": self.last_checkpoint_time * 1000,
+            "max_checkpoint_ms": self.max_checkpoint_time * 1000,
+            "avg_checkpoint_ms": self.total_checkpoint_time / self.snapshots * 1000 if self.snapshots else 0.0,
+            "last_checkpoint_pause_ms": self.system.storage.checkpoint_pause * 1000,
+            "max_checkpoint_pause_ms": self.max_checkpoint_pause * 1000
+        }
+
+
+class LazyLoader:
+    """Hydrates warehouses from a binary snapshot the first time they are used"""
+
+    def __init__(self, system, reader):
+        """
+        Initialize the loader
+
+        Args:
+            system: The WarehouseSystem to hydrate into
+            reader: SnapshotReader of the snapshot file
+        """
+        self.system = system
+        self.reader = reader
+        self.pending = set(reader.partitions())  # Partitions not hydrated yet
+        self.partition_summaries = None  # Partition -> summary, read on first use
+
+    def replace_reader(self, reader, placed):
+        """
+        Read the partitions still pending from a new snapshot
+
+        Args:
+            reader: SnapshotReader of the new snapshot
+            placed (dict): Old partition number -> number in the new snapshot
+
+        Returns:
+            SnapshotReader: The reader no longer used, for the caller to close
+        """
+        with self.system.lock:
+            self.pending = {placed[partition] for partition in self.pending}
+            self.partition_summaries = None
+            old, self.reader = self.reader, reader
+            return old
+
+    def hydrate_serial(self, serial_number):
+        """
+        Hydrate the partition holding an object
+
+        Args:
+            serial_number (str): Serial number of any object
+
+        Returns:
+            bool: True if a partition was hydrated
+        """
+        with self.system.lock:
+            partition = self.reader.find(serial_number, self.pending) if self.pending else None
+            if partition is None or partition not in self.pending:
+                return False
+            self.hydrate(partition)
+            return True
+
+    def hydrate(self, partition):
+        """
+        Build the objects of one partition
+
+        Args:
+            partition (int): Partition number
+        """
+        with self.system.lock:
+            if partition not in self.pending:
+                return
+            state = self.reader.partition_state(partition)
+
+            # Marked first, since history may hydrate other partitions that
+            # refer back to packages of this one
+            self.pending.discard(partition)
+            restore_state(self.system, state)
+            if not self.pending:
+                self.close()
+
+    def summaries(self):
+        """
+        Summarize the partitions not hydrated yet
+
+        Returns:
+            dict: Partition -> summary, None where the snapshot has none
+        """
+        with self.system.lock:
+            if self.partition_summaries is None:
+                self.partition_summaries = self.reader.summaries()
+            return {partition: self.partition_summaries.get(partition) for partition in self.pending}
+
+    def hydrate_where(self, needed):
+        """
+        Build the partitions a call may need
+
+        Partitions without a summary are always built, since nothing is
+        known about them.
+
+        Args:
+            needed (function): Called with a partition summary, returns True
+                if the partition must be built
+        """
+        with self.system.lock:
+            for partition, summary in sorted(self.summaries().items()):
+                if summary is None or needed(summary):
+                    self.hydrate(partition)
+
+    def hydrate_all(self):
+        """Build every partition still held only in the snapshot"""
+        with self.system.lock:
+            for partition in sorted(self.pending):
+                self.hydrate(partition)
+
+    def close(self):
+        """Detach from the manager and unmap the snapshot"""
+        if self.system.manager.loader is self:
+            self.system.manager.loader = None
+        self.reader.close()
+
+
+def dump_state(system, lsn):
+    """
+    Serialize the object graph of a WarehouseSystem
+
+    Only built objects are serialized. Partitions of the loaded snapshot
+    that were never built are listed under "unloaded", so the snapshot
+    writer can copy them from the old file instead.
+
+    Args:
+        system: The WarehouseSystem to serialize
+        lsn (int): Sequence number of the last operation included
+
+    Returns:
+        dict: JSON-serializable state
+    """
+    manager = system.manager
+    lines = list(manager.line_index.values()) + list(system.unassigned_lines.values())
+    return {
+        "lsn": lsn,
+        "offload_order": manager.offload_order,
+        "unloaded": sorted(manager.loader.pending) if manager.loader is not None else [],
+        "versions": {warehouse.serial_number: warehouse.version for warehouse in manager.warehouses},
+        "warehouses": [
+            [w.serial_number, w.name, w.max_capacity, w.created_ts]
+            for w in manager.warehouses
+        ],
+        "lines": [
+            {
+                "serial_number": line.serial_number,
+                "line_number": line.line_number,
+                "max_capacity": line.max_capacity,
+                "capacity_type": line.capacity_type,
+                "max_quality_types": line.max_quality_types,
+                "mixed_quality_approved": line.mixed_quality_approved,
+                "warehouse": line.warehouse.serial_number if line.warehouse else None,
+                "cartons": [carton.serial_number for carton in line.packages],
+                "pallets": [pallet.serial_number for pallet in line.pallets],
+                "history": [
+                    [
+                        line.package_history.packages[package_id].serial_number,
+                        action,
+                        timestamp
+                    ]
+                    for package_id, action, timestamp in zip(line.package_history.package_ids,
+                                                             line.package_history.actions,
+                                                             line.package_history.timestamps)
+                ]
+            }
+            for line in lines
+        ],
+        "pallets": [
+            [pallet.serial_number, pallet.quality_mark, pallet.max_capacity, pallet.created_ts,
+             [package.serial_number for package in pallet.packages]]
+            for pallet in manager.pallets
+        ],
+        "packages": [
+            [package.serial_number, package.package_type, package.quality_mark,
+             package.mass, package.created_ts, package.discarded]
+            for package in manager.packages
+        ]
+    }
+
+
+def restore_state(system, state):
+    """
+    Rebuild the object graph of a WarehouseSystem from dump_state output
+
+    Also used for single partitions of a binary snapshot. Objects are placed through the normal model methods so every index and
+    counter is rebuilt. Quality rules are relaxed while placing, since the
+    saved placement was valid when it happened.
+
+    Args:
+        system: An empty WarehouseSystem to populate
+        state (dict): State produced by dump_state
+    """
+    manager = system.manager
+    manager.set_offload_order(state["offload_order"])
+
+    warehouses = []
+    for serial_number, name, max_capacity, created_ts in state["warehouses"]:
+        warehouse = Warehouse(name, max_capacity, serial_number)
+        warehouse.created_ts = created_ts
+        manager.add_warehouse(warehouse)
+        warehouses.append(warehouse)
+
+    packages = {}
+    for serial_number, package_type, quality_mark, mass, created_ts, discarded in state["packages"]:
+        cls = LoosePackage if package_type == "loose" else Carton
+        package = cls(quality_mark, mass, serial_number)
+        package.created_ts = created_ts
+        package.discarded = discarded
+        manager.register_package(package)
+        packages[serial_number] = package
+
+    # Pallets are placed empty and filled afterwards, since packages may
+    # have been added after the pallet passed the line's weight check
+    pallets = {}
+    for serial_number, quality_mark, max_capacity, created_ts, _ in state["pallets"]:
+        pallet = Pallet(quality_mark, max_capacity, serial_number)
+        pallet.created_ts = created_ts
+        manager.register_pallet(pallet)
+        pallets[serial_number] = pallet
+
+    for data in state["lines"]:
+        line = Line(data["line_number"], data["max_capacity"], data["capacity_type"],
+                    serial_number=data["serial_number"])
+        warehouse = manager.get_warehouse(data["warehouse"]) if data["warehouse"] else None
+        if warehouse is not None:
+            manager.add_line_to_warehouse(line, warehouse)
+        else:
+            system.unassigned_lines[line.serial_number] = line
+
+        line.set_mixed_quality_approval(True, len(data["cartons"]) + len(data["pallets"]) + 1)
+        for carton_serial in data["cartons"]:
+            line.add_carton(packages[carton_serial])
+        for pallet_serial in data["pallets"]:
+            line.add_pallet(pallets[pallet_serial])
+        line.set_mixed_quality_approval(data["mixed_quality_approved"], data["max_quality_types"])
+
+    for serial_number, _, _, _, contents in state["pallets"]:
+        for package_serial in contents:
+            pallets[serial_number].add_package(packages[package_serial])
+
+    # Placing objects above wrote history entries, replace them with the saved log
+    for data in state["lines"]:
+        line = manager.line_index.get(data["serial_number"]) or system.unassigned_lines[data["serial_number"]]
+        line.package_history = PackageHistory()
+        for package_serial, action, timestamp in data["history"]:
+            # Packages since moved elsewhere may belong to another partition
+            package = packages.get(package_serial) or manager.get_package(package_serial)
+            if package is not None:
+                line.package_history.append(package, ACTIONS[action], timestamp)
+
+    # Restoring placed everything again, which is not a change clients
+    # missed; restored warehouses start at this process's first version
+    for warehouse in warehouses:
+        warehouse.version = VERSION_BASE
+        warehouse.changes.reset(warehouse.version)
@@ -0,0 +1,97 @@
+from app.models.pallet import Pallet
+
+# Put-away strategies rank the lines that can take an item: each maps
+# (line, item, demand) to a sort key and the line with the smallest key
+# wins. Candidates are visited least free capacity first, and ties go to the
+# line visited first.
+
+
+def item_demand(item):
+    """
+    Capacity an item uses on a line
+
+    Args:
+        item: A Pallet (weight lines) or Carton (count lines)
+
+    Returns:
+        float: Pallet mass, or 1 for a carton
+    """
+    return item.total_mass if isinstance(item, Pallet) else 1
+
+
+def line_accepts(line, item, demand):
+    """
+    Check whether a line could take an item right now
+
+    Args:
+        line: The candidate Line
+        item: A Pallet or Carton
+        demand (float): The item's demand, from item_demand
+
+    Returns:
+        bool: True if loading the item would succeed
+    """
+    capacity_type = "weight" if isinstance(item, Pallet) else "count"
+    return (line.capacity_type == capacity_type
+            and line.current_capacity_usage + demand <= line.max_capacity
+            and line.can_add_quality(item.quality_mark))
+
+
+def first_fit(line, item, demand):
+    """Take the first line with room, by warehouse age then line number"""
+    return line.warehouse.created_ts, line.line_number
+
+
+def best_fit(line, item, demand):
+    """Take the line left with the least free capacity"""
+    return line.available_capacity - demand
+
+
+def least_mixed(line, item, demand):
+    """Take the line left holding the fewest quality marks, then best fit"""
+    quality_types = len(line.quality_counts)
+    if line.quality_count(item.quality_mark) == 0:
+        quality_types += 1
+    return quality_types, line.available_capacity - demand
+
+
+def keep_qualities_together(line, item, demand):
+    """Take the line holding the most of the item's quality, then an empty line, then best fit"""
+    count = line.quality_count(item.quality_mark)
+    if count:
+        rank = 0
+    elif not line.quality_counts:
+        rank = 1
+    else:
+        rank = 2
+    return rank, -count, line.available_capacity - demand
+
+
+PUT_AWAY_STRATEGIES = {
+    "best_fit": best_fit,
+    "first_fit": first_fit,
+    "least_mixed": least_mixed,
+    "keep_qualities_together": keep_qualities_together,
+}
+
+
+def resolve_strategy(strategy):
+    """
+    Get a strategy function
+
+    Args:
+        strategy: A name from PUT_AWAY_STRATEGIES or a function with the
+            same signature
+
+    Returns:
+        function: The strategy
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if callable(strategy):
+        return strategy
+    try:
+        return PUT_AWAY_STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown put-away strategy: {strategy}") from None
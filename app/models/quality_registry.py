@@ -0,0 +1,52 @@
+class QualityRegistry:
+    """System-wide registry that interns quality marks to small integer ids"""
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self.ids = {}    # quality mark -> id
+        self.marks = []  # id -> quality mark
+
+    def intern(self, quality_mark):
+        """
+        Get the id for a quality mark, assigning a new one if needed
+
+        Args:
+            quality_mark (str): The quality mark to intern
+
+        Returns:
+            int: The quality id
+        """
+        quality_id = self.ids.get(quality_mark)
+        if quality_id is None:
+            quality_id = len(self.marks)
+            self.ids[quality_mark] = quality_id
+            self.marks.append(quality_mark)
+        return quality_id
+
+    def get_id(self, quality_mark):
+        """
+        Get the id for a quality mark without assigning one
+
+        Args:
+            quality_mark (str): The quality mark to look up
+
+        Returns:
+            int: The quality id, or None if the mark was never interned
+        """
+        return self.ids.get(quality_mark)
+
+    def get_mark(self, quality_id):
+        """
+        Get the quality mark for an id
+
+        Args:
+            quality_id (int): The quality id
+
+        Returns:
+            str: The quality mark
+        """
+        return self.marks[quality_id]
+
+
+# Shared by every line so quality ids and bitmasks agree across the system
+quality_registry = QualityRegistry()
@@ -0,0 +1,67 @@
+import gzip
+import json
+import uuid
+
+
+class CachedSnapshot:
+    """A warehouse snapshot serialized for one warehouse version"""
+
+    __slots__ = ("version", "etag", "snapshot", "body", "gzip_body")
+
+    def __init__(self, version, etag, snapshot):
+        """
+        Serialize and compress a snapshot
+
+        Args:
+            version (int): Warehouse version the snapshot was taken at
+            etag (str): Entity tag for this version
+            snapshot (dict): The snapshot from Warehouse.get_snapshot
+        """
+        self.version = version
+        self.etag = etag
+        self.snapshot = snapshot
+        self.body = json.dumps(snapshot, separators=(",", ":")).encode()
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+
+
+class SnapshotCache:
+    """Warehouse snapshots, reused until the warehouse version changes"""
+
+    def __init__(self):
+        """Initialize an empty cache"""
+        # Versions restart with the process, so entity tags carry a per-process token
+        self.token = uuid.uuid4().hex[:12]
+        self.entries = {}  # Warehouse serial number -> CachedSnapshot
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, warehouse):
+        """
+        Get the entity tag of a warehouse's current version
+
+        Args:
+            warehouse: The Warehouse
+
+        Returns:
+            str: Unquoted entity tag
+        """
+        return f"{self.token}-{warehouse.serial_number}-{warehouse.version}"
+
+    def get(self, warehouse):
+        """
+        Get the snapshot of a warehouse's current version, building it if needed
+
+        Args:
+            warehouse: The Warehouse
+
+        Returns:
+            CachedSnapshot: The cached snapshot
+        """
+        entry = self.entries.get(warehouse.serial_number)
+        if entry is not None and entry.version == warehouse.version:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = CachedSnapshot(warehouse.version, self.etag(warehouse), warehouse.get_snapshot())
+        self.entries[warehouse.serial_number] = entry
+        return entry
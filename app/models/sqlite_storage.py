@@ -0,0 +1,551 @@
+import sqlite3
+import threading
+from itertools import groupby
+from app.models.line import Line
+from app.models.package import Package
+from app.models.partition_summary import new_summary, add_line, add_stored, add_packages, add_pallet
+from app.models.pallet import Pallet
+from app.models.persistence import LazyLoader, restore_state
+from app.models.warehouse import Warehouse, VERSION_BASE
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS warehouses (
+    id INTEGER PRIMARY KEY,
+    serial_number TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    max_capacity REAL NOT NULL,
+    created_ts INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    serial_number TEXT NOT NULL UNIQUE,
+    warehouse_id INTEGER REFERENCES warehouses(id),
+    line_number INTEGER NOT NULL,
+    max_capacity REAL NOT NULL,
+    capacity_type TEXT NOT NULL,
+    max_quality_types INTEGER NOT NULL,
+    mixed_quality_approved INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pallets (
+    id INTEGER PRIMARY KEY,
+    serial_number TEXT NOT NULL UNIQUE,
+    quality_mark TEXT NOT NULL,
+    max_capacity INTEGER NOT NULL,
+    created_ts INTEGER NOT NULL,
+    line_id INTEGER REFERENCES lines(id),
+    seq INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    serial_number TEXT NOT NULL UNIQUE,
+    package_type TEXT NOT NULL,
+    quality_mark TEXT NOT NULL,
+    mass REAL NOT NULL,
+    created_ts INTEGER NOT NULL,
+    discarded INTEGER NOT NULL,
+    line_id INTEGER REFERENCES lines(id),
+    pallet_id INTEGER REFERENCES pallets(id),
+    seq INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    line_id INTEGER NOT NULL REFERENCES lines(id),
+    package_id INTEGER NOT NULL REFERENCES packages(id),
+    action INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+
+-- Covering indexes: serial lookups resolve a location, quality and age
+-- queries read package stock, all without touching the table rows
+CREATE INDEX IF NOT EXISTS packages_by_serial ON packages (serial_number, line_id, pallet_id);
+CREATE INDEX IF NOT EXISTS pallets_by_serial ON pallets (serial_number, line_id);
+CREATE INDEX IF NOT EXISTS lines_by_serial ON lines (serial_number, warehouse_id);
+CREATE INDEX IF NOT EXISTS packages_by_quality ON packages (quality_mark, discarded, mass, created_ts);
+CREATE INDEX IF NOT EXISTS pallets_by_quality ON pallets (quality_mark, line_id);
+CREATE INDEX IF NOT EXISTS packages_by_created ON packages (created_ts, quality_mark, mass);
+
+-- Partition loading
+CREATE INDEX IF NOT EXISTS lines_by_warehouse ON lines (warehouse_id, seq);
+CREATE INDEX IF NOT EXISTS pallets_by_line ON pallets (line_id, seq);
+CREATE INDEX IF NOT EXISTS packages_by_line ON packages (line_id, seq);
+CREATE INDEX IF NOT EXISTS packages_by_pallet ON packages (pallet_id, seq);
+CREATE INDEX IF NOT EXISTS history_by_line ON history (line_id, id);
+CREATE INDEX IF NOT EXISTS pallets_unplaced ON pallets (seq) WHERE line_id IS NULL;
+CREATE INDEX IF NOT EXISTS packages_unplaced ON packages (seq) WHERE line_id IS NULL AND pallet_id IS NULL;
+"""
+
+# Statements are constant strings so every connection's statement cache
+# reuses their prepared form
+
+SAVE_SETTING = """
+INSERT INTO settings (key, value) VALUES (?, ?)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value
+"""
+
+SAVE_WAREHOUSE = """
+INSERT INTO warehouses (serial_number, name, max_capacity, created_ts) VALUES (?, ?, ?, ?)
+ON CONFLICT (serial_number) DO NOTHING
+"""
+
+# seq orders rows inside their container, it only changes when the row moves
+SAVE_LINE = """
+INSERT INTO lines (serial_number, warehouse_id, line_number, max_capacity, capacity_type,
+                   max_quality_types, mixed_quality_approved, seq)
+VALUES (?, (SELECT id FROM warehouses WHERE serial_number = ?), ?, ?, ?, ?, ?, ?)
+ON CONFLICT (serial_number) DO UPDATE SET
+    seq = CASE WHEN warehouse_id IS excluded.warehouse_id THEN seq ELSE excluded.seq END,
+    warehouse_id = excluded.warehouse_id,
+    max_quality_types = excluded.max_quality_types,
+    mixed_quality_approved = excluded.mixed_quality_approved
+"""
+
+SAVE_PALLET = """
+INSERT INTO pallets (serial_number, quality_mark, max_capacity, created_ts, line_id, seq)
+VALUES (?, ?, ?, ?, (SELECT id FROM lines WHERE serial_number = ?), ?)
+ON CONFLICT (serial_number) DO UPDATE SET
+    seq = CASE WHEN line_id IS excluded.line_id THEN seq ELSE excluded.seq END,
+    line_id = excluded.line_id
+"""
+
+SAVE_PACKAGE = """
+INSERT INTO packages (serial_number, package_type, quality_mark, mass, created_ts, discarded,
+                      line_id, pallet_id, seq)
+VALUES (?, ?, ?, ?, ?, ?, (SELECT id FROM lines WHERE serial_number = ?),
+        (SELECT id FROM pallets WHERE serial_number = ?), ?)
+ON CONFLICT (serial_number) DO UPDATE SET
+    seq = CASE WHEN line_id IS excluded.line_id AND pallet_id IS excluded.pallet_id
+               THEN seq ELSE excluded.seq END,
+    line_id = excluded.line_id,
+    pallet_id = excluded.pallet_id,
+    discarded = excluded.discarded
+"""
+
+SAVE_HISTORY = """
+INSERT INTO history (line_id, package_id, action, timestamp)
+VALUES ((SELECT id FROM lines WHERE serial_number = ?),
+        (SELECT id FROM packages WHERE serial_number = ?), ?, ?)
+"""
+
+FIND_PARTITION = """
+SELECT id FROM warehouses WHERE serial_number = ?1
+UNION ALL
+SELECT warehouse_id FROM lines WHERE serial_number = ?1
+UNION ALL
+SELECT l.warehouse_id FROM pallets p LEFT JOIN lines l ON l.id = p.line_id
+WHERE p.serial_number = ?1
+UNION ALL
+SELECT l.warehouse_id FROM packages k
+LEFT JOIN pallets p ON p.id = k.pallet_id
+LEFT JOIN lines l ON l.id = coalesce(k.line_id, p.line_id)
+WHERE k.serial_number = ?1
+LIMIT 1
+"""
+
+# Partition queries take a warehouse id, or NULL for objects outside any warehouse
+PARTITION_WAREHOUSES = """
+SELECT serial_number, name, max_capacity, created_ts FROM warehouses WHERE id IS ?
+"""
+
+PARTITION_LINES = """
+SELECT l.id, l.serial_number, l.line_number, l.max_capacity, l.capacity_type,
+       l.max_quality_types, l.mixed_quality_approved, w.serial_number
+FROM lines l LEFT JOIN warehouses w ON w.id = l.warehouse_id
+WHERE l.warehouse_id IS ? ORDER BY l.seq
+"""
+
+# Each branch of the unions below is an index lookup; the branches for
+# objects outside any line only apply to the NULL partition
+PARTITION_PALLETS = """
+SELECT p.id, p.serial_number, p.quality_mark, p.max_capacity, p.created_ts, p.line_id, p.seq
+FROM pallets p JOIN lines l ON l.id = p.line_id WHERE l.warehouse_id IS ?1
+UNION ALL
+SELECT id, serial_number, quality_mark, max_capacity, created_ts, line_id, seq
+FROM pallets WHERE line_id IS NULL AND ?1 IS NULL
+ORDER BY 7
+"""
+
+PARTITION_PACKAGES = """
+SELECT k.serial_number, k.package_type, k.quality_mark, k.mass, k.created_ts, k.discarded,
+       k.line_id, k.pallet_id, k.seq
+FROM packages k JOIN lines l ON l.id = k.line_id WHERE l.warehouse_id IS ?1
+UNION ALL
+SELECT k.serial_number, k.package_type, k.quality_mark, k.mass, k.created_ts, k.discarded,
+       k.line_id, k.pallet_id, k.seq
+FROM packages k JOIN pallets p ON p.id = k.pallet_id JOIN lines l ON l.id = p.line_id
+WHERE l.warehouse_id IS ?1
+UNION ALL
+SELECT k.serial_number, k.package_type, k.quality_mark, k.mass, k.created_ts, k.discarded,
+       k.line_id, k.pallet_id, k.seq
+FROM packages k JOIN pallets p ON p.id = k.pallet_id WHERE p.line_id IS NULL AND ?1 IS NULL
+UNION ALL
+SELECT serial_number, package_type, quality_mark, mass, created_ts, discarded,
+       line_id, pallet_id, seq
+FROM packages WHERE line_id IS NULL AND pallet_id IS NULL AND ?1 IS NULL
+ORDER BY 9
+"""
+
+# Summaries aggregate every warehouse in one pass without reading partitions;
+# objects outside warehouses are always loaded, so they need no summary
+SUMMARY_WAREHOUSES = """
+SELECT id, serial_number, name, max_capacity, created_ts FROM warehouses
+"""
+
+SUMMARY_LINES = """
+SELECT id, warehouse_id, capacity_type, max_capacity FROM lines WHERE warehouse_id IS NOT NULL
+"""
+
+# (line, stored directly, quality mark, package type, packages, mass)
+SUMMARY_STORED = """
+SELECT line_id, 1, quality_mark, package_type, count(*), total(mass)
+FROM packages WHERE line_id IS NOT NULL GROUP BY line_id, quality_mark, package_type
+UNION ALL
+SELECT p.line_id, 0, k.quality_mark, k.package_type, count(*), total(k.mass)
+FROM packages k JOIN pallets p ON p.id = k.pallet_id WHERE p.line_id IS NOT NULL
+GROUP BY p.line_id, k.quality_mark, k.package_type
+"""
+
+SUMMARY_PALLETS = """
+SELECT l.warehouse_id, p.quality_mark, p.max_capacity - (SELECT count(*) FROM packages k WHERE k.pallet_id = p.id)
+FROM pallets p JOIN lines l ON l.id = p.line_id WHERE l.warehouse_id IS NOT NULL
+"""
+
+PARTITION_HISTORY = """
+SELECT h.line_id, k.serial_number, h.action, h.timestamp
+FROM history h JOIN lines l ON l.id = h.line_id JOIN packages k ON k.id = h.package_id
+WHERE l.warehouse_id IS ? ORDER BY h.id
+"""
+
+
+class SQLiteStorage:
+    """Storage backend writing normalized tables to a SQLite database"""
+
+    def __init__(self, path):
+        """
+        Initialize the backend
+
+        Args:
+            path (str): Database file path
+        """
+        self.path = path
+        self.system = None
+        self.local = threading.local()  # One connection per thread
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        self.pending = []         # (statement, parameters) not yet committed
+        self.seq = 0              # Last row position handed out
+        self.history_saved = {}   # Line serial -> history entries already stored
+        self.lines_before = ()    # Lines touched by the running operation
+        self.checkpoint_pause = 0.0  # Checkpoints never hold the system lock
+
+    def connection(self):
+        """
+        Get the calling thread's connection
+
+        Returns:
+            sqlite3.Connection: A connection opened on first use
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # Closed from whichever thread shuts the system down
+            connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = FULL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self.local.connection = connection
+            with self.connections_lock:
+                self.connections.append(connection)
+        return connection
+
+    def load(self, system):
+        """
+        Prepare lazy hydration of stored warehouses
+
+        Objects outside any warehouse are built right away, so objects
+        created later are never also waiting in an unhydrated partition.
+
+        Args:
+            system: The WarehouseSystem to load into
+
+        Returns:
+            list: Always empty, every operation is already in the tables
+        """
+        self.system = system
+        connection = self.connection()
+        connection.executescript(SCHEMA)
+        settings = dict(connection.execute("SELECT key, value FROM settings"))
+        if "offload_order" in settings:
+            system.manager.set_offload_order(settings["offload_order"])
+        self.seq = int(settings.get("seq", 0))
+
+        loader = LazyLoader(system, SQLiteReader(self))
+        restore_state(system, loader.reader.partition_state(None))
+        if loader.pending:
+            system.manager.loader = loader
+        return []
+
+    def open(self):
+        """Start accepting operations"""
+
+    def begin(self, operation, args):
+        """Remember the lines holding the operation's objects before it runs"""
+        self.lines_before = self._lines_of(args)
+
+    def record(self, timestamp, operation, args, result):
+        """
+        Queue the row changes made by an applied operation
+
+        Every object involved is saved whole, along with the history the
+        lines holding it gained, before and after the operation.
+
+        Args:
+            timestamp (int): Epoch microseconds the operation ran at
+            operation (str): Operation name
+            args (tuple): Operation arguments
+            result: Value the operation returned
+        """
+        objects = list(args)
+        if isinstance(result, list):
+            objects.extend(result)
+        elif operation.startswith("create_"):
+            objects.append(result)
+
+        changes = []
+        if operation == "set_offload_order":
+            changes.append((SAVE_SETTING, ("offload_order", args[0])))
+        for item in objects:
+            row = self._row(item)
+            if row is not None:
+                changes.append(row)
+        for line in self.lines_before | self._lines_of(objects):
+            changes.extend(self._history_rows(line))
+
+        with self.pending_lock:
+            self.pending.extend(changes)
+
+    def _lines_of(self, objects):
+        """Lines holding, or being, the given objects"""
+        lines = set()
+        for item in objects:
+            if isinstance(item, Line):
+                lines.add(item)
+            elif isinstance(item, (Package, Pallet)):
+                location = self.system.manager.location_index.locate(item.serial_number)
+                if location is not None and location[1] is not None:
+                    lines.add(location[1])
+        return lines
+
+    def _row(self, item):
+        """Upsert for a model object, None for plain values"""
+        self.seq += 1
+        if isinstance(item, Warehouse):
+            return SAVE_WAREHOUSE, (item.serial_number, item.name, item.max_capacity, item.created_ts)
+        if isinstance(item, Line):
+            warehouse = item.warehouse.serial_number if item.warehouse is not None else None
+            return SAVE_LINE, (item.serial_number, warehouse, item.line_number, item.max_capacity,
+                               item.capacity_type, item.max_quality_types,
+                               item.mixed_quality_approved, self.seq)
+        if not isinstance(item, (Package, Pallet)):
+            return None
+
+        # Cartons and pallets are stored against their line, loose packages against their pallet
+        line, pallet = self.system.manager.location_index.locations.get(item.serial_number, (None, None))
+        line = line.serial_number if line is not None else None
+        if isinstance(item, Pallet):
+            return SAVE_PALLET, (item.serial_number, item.quality_mark, item.max_capacity,
+                                 item.created_ts, line, self.seq)
+        pallet = pallet.serial_number if pallet is not None else None
+        return SAVE_PACKAGE, (item.serial_number, item.package_type, item.quality_mark, item.mass,
+                              item.created_ts, item.discarded, line, pallet, self.seq)
+
+    def _history_rows(self, line):
+        """History inserts for entries a line gained since the last save"""
+        history = line.package_history
+        saved = self.history_saved.get(line.serial_number, 0)
+        self.history_saved[line.serial_number] = len(history)
+        return [
+            (SAVE_HISTORY, (line.serial_number, history.packages[history.package_ids[i]].serial_number,
+                            history.actions[i], history.timestamps[i]))
+            for i in range(saved, len(history))
+        ]
+
+    def commit(self):
+        """Write queued changes in one transaction, batching runs of the same statement"""
+        with self.commit_lock:
+            with self.pending_lock:
+                batch, self.pending = self.pending, []
+                if not batch:
+                    return
+                batch.append((SAVE_SETTING, ("seq", str(self.seq))))
+
+            connection = self.connection()
+            try:
+                with connection:
+                    for statement, group in groupby(batch, key=lambda change: change[0]):
+                        connection.executemany(statement, [parameters for _, parameters in group])
+            except Exception:
+                with self.pending_lock:
+                    self.pending[:0] = batch[:-1]
+                raise
+
+    def unsaved(self):
+        """Number of queued row changes"""
+        return len(self.pending)
+
+    def maintain(self, system):
+        """SQLite checkpoints its own write-ahead log"""
+        return False
+
+    def checkpoint(self, system):
+        """Commit and fold the write-ahead log back into the database"""
+        self.commit()
+        self.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Close every pooled connection"""
+        with self.connections_lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+        self.local = threading.local()
+
+
+class SQLiteReader:
+    """Reads SQLiteStorage tables one warehouse at a time for LazyLoader"""
+
+    def __init__(self, storage):
+        """
+        Initialize the reader
+
+        Args:
+            storage: The SQLiteStorage to read from
+        """
+        self.storage = storage
+
+    def partitions(self):
+        """Warehouse ids in the database"""
+        return [row[0] for row in self.storage.connection().execute("SELECT id FROM warehouses")]
+
+    def find(self, serial_number, partitions=None):
+        """
+        Find the warehouse holding a serial number
+
+        Args:
+            serial_number (str): Serial number of any object
+            partitions (iterable, optional): Unused, one query covers every
+                warehouse
+
+        Returns:
+            int: Warehouse id, or None if outside any warehouse or unknown
+        """
+        row = self.storage.connection().execute(FIND_PARTITION, (serial_number,)).fetchone()
+        return row[0] if row is not None else None
+
+    def summaries(self):
+        """
+        Summarize every warehouse from aggregate queries
+
+        Returns:
+            dict: Warehouse id -> partition summary
+        """
+        connection = self.storage.connection()
+        # Nothing in the tables changed since start-up, so a warehouse
+        # loaded now would start at this process's first version
+        summaries = {
+            warehouse_id: new_summary([serial_number, name, max_capacity, created_ts], VERSION_BASE)
+            for warehouse_id, serial_number, name, max_capacity, created_ts
+            in connection.execute(SUMMARY_WAREHOUSES)
+        }
+
+        # line id -> [warehouse id, capacity type, max capacity, mass, packages, cartons]
+        lines = {line_id: [warehouse_id, capacity_type, max_capacity, 0, 0, 0]
+                 for line_id, warehouse_id, capacity_type, max_capacity in connection.execute(SUMMARY_LINES)}
+        for line_id, direct, quality_mark, package_type, count, mass in connection.execute(SUMMARY_STORED):
+            line = lines.get(line_id)
+            if line is None:
+                continue  # A line outside any warehouse
+            line[3] += mass
+            line[4] += count
+            if direct:
+                line[5] += count
+            summary = summaries[line[0]]
+            add_stored(summary, quality_mark, package_type, count, mass)
+            # Discarded packages are never on a line
+            add_packages(summary, quality_mark, package_type, False, count)
+        for warehouse_id, capacity_type, max_capacity, mass, count, cartons in lines.values():
+            add_line(summaries[warehouse_id], capacity_type, max_capacity, mass, count, cartons)
+
+        for warehouse_id, quality_mark, room in connection.execute(SUMMARY_PALLETS):
+            add_pallet(summaries[warehouse_id], quality_mark, room)
+        return summaries
+
+    def partition_state(self, warehouse_id):
+        """
+        Read one warehouse, or everything outside warehouses if warehouse_id is None
+
+        Returns:
+            dict: The partition's objects in persistence.dump_state format
+        """
+        connection = self.storage.connection()
+        parameters = (warehouse_id,)
+
+        lines = {}
+        for (line_id, serial_number, line_number, max_capacity, capacity_type,
+             max_quality_types, approved, warehouse) in connection.execute(PARTITION_LINES, parameters):
+            lines[line_id] = {
+                "serial_number": serial_number,
+                "line_number": line_number,
+                "max_capacity": max_capacity,
+                "capacity_type": capacity_type,
+                "max_quality_types": max_quality_types,
+                "mixed_quality_approved": bool(approved),
+                "warehouse": warehouse,
+                "cartons": [],
+                "pallets": [],
+                "history": []
+            }
+
+        pallets = {}
+        for pallet_id, serial_number, quality_mark, max_capacity, created_ts, line_id, _ in connection.execute(
+                PARTITION_PALLETS, parameters):
+            pallets[pallet_id] = [serial_number, quality_mark, max_capacity, created_ts, []]
+            if line_id is not None:
+                lines[line_id]["pallets"].append(serial_number)
+
+        packages = []
+        for (serial_number, package_type, quality_mark, mass, created_ts, discarded,
+             line_id, pallet_id, _) in connection.execute(PARTITION_PACKAGES, parameters):
+            packages.append([serial_number, package_type, quality_mark, mass, created_ts, bool(discarded)])
+            if pallet_id is not None:
+                pallets[pallet_id][4].append(serial_number)
+            elif line_id is not None:
+                lines[line_id]["cartons"].append(serial_number)
+
+        for line_id, package_serial, action, timestamp in connection.execute(PARTITION_HISTORY, parameters):
+            lines[line_id]["history"].append([package_serial, action, timestamp])
+        for line in lines.values():
+            self.storage.history_saved[line["serial_number"]] = len(line["history"])
+
+        return {
+            "offload_order": self.storage.system.manager.offload_order,
+            "warehouses": [list(row) for row in connection.execute(PARTITION_WAREHOUSES, parameters)],
+            "lines": list(lines.values()),
+            "pallets": list(pallets.values()),
+            "packages": packages
+        }
+
+    def close(self):
+        """Connections belong to the storage backend"""
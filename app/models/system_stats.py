@@ -0,0 +1,206 @@
+from app.models.partition_summary import merge_summary
+
+
+class SystemStats:
+    """Inventory rollups kept current by LogisticsManager as things change"""
+
+    def __init__(self):
+        """Initialize empty rollups"""
+        # capacity type -> [lines, max capacity, capacity usage, total mass, package count]
+        self.capacity_types = {}
+        # quality mark / package type -> [packages, mass] stored on lines
+        self.stored_by_quality = {}
+        self.stored_by_type = {}
+        self.registered_by_type = {}  # package type -> packages known to the system
+        self.discarded_by_quality = {}  # quality mark -> discarded packages
+        self.discarded = 0
+
+    def add_line(self, line, sign=1):
+        """
+        Count a line's capacity and contents in, or out with sign=-1
+
+        Args:
+            line: The Line joining or leaving the system
+            sign (int): 1 to add, -1 to remove
+        """
+        totals = self.capacity_types.setdefault(line.capacity_type, [0, 0, 0, 0, 0])
+        totals[0] += sign
+        totals[1] += sign * line.max_capacity
+        self.adjust_line(line, sign * line.total_mass, sign * line.package_count,
+                         sign * line.current_capacity_usage)
+        self.store(line.offload_queue.live, sign)
+
+    def adjust_line(self, line, mass, count, usage):
+        """
+        Apply a change in a line's stored mass, package count and usage
+
+        Args:
+            line: The Line that changed
+            mass (float): Change in stored mass in kg
+            count (int): Change in number of stored packages
+            usage (float): Change in capacity usage
+        """
+        totals = self.capacity_types.setdefault(line.capacity_type, [0, 0, 0, 0, 0])
+        totals[2] += usage
+        totals[3] += mass
+        totals[4] += count
+
+    def store(self, packages, sign=1):
+        """
+        Count packages arriving on a line, or leaving it with sign=-1
+
+        Args:
+            packages: Iterable of Package objects
+            sign (int): 1 when stored, -1 when taken off
+        """
+        by_quality = self.stored_by_quality
+        by_type = self.stored_by_type
+        for package in packages:
+            totals = by_quality.get(package.quality_mark)
+            if totals is None:
+                totals = by_quality[package.quality_mark] = [0, 0]
+            totals[0] += sign
+            totals[1] += sign * package.mass
+            totals = by_type.get(package.package_type)
+            if totals is None:
+                totals = by_type[package.package_type] = [0, 0]
+            totals[0] += sign
+            totals[1] += sign * package.mass
+
+    def register(self, package):
+        """
+        Count a package newly known to the system
+
+        Args:
+            package: The registered Package
+        """
+        self.registered_by_type[package.package_type] = self.registered_by_type.get(package.package_type, 0) + 1
+        if package.discarded:
+            self.discard(package)
+
+    def discard(self, package):
+        """
+        Count a discarded package
+
+        Args:
+            package: The discarded Package
+        """
+        self.discarded += 1
+        self.discarded_by_quality[package.quality_mark] = self.discarded_by_quality.get(package.quality_mark, 0) + 1
+
+    def to_dict(self, manager, summaries=()):
+        """
+        Build the rollups as a JSON-ready dict
+
+        Only the warehouse list grows with the inventory, and it is read
+        from each warehouse's running totals.
+
+        Args:
+            manager: The LogisticsManager the rollups belong to
+            summaries: Summaries of stored partitions not built yet, see
+                partition_summary
+
+        Returns:
+            dict: Totals, and breakdowns by warehouse, capacity type,
+                quality mark and package type
+        """
+        def utilization(usage, capacity):
+            return (usage / capacity) * 100 if capacity else 0
+
+        capacity_types = {key: list(values) for key, values in self.capacity_types.items()}
+        stored_by_quality = {key: list(values) for key, values in self.stored_by_quality.items()}
+        stored_by_type = {key: list(values) for key, values in self.stored_by_type.items()}
+        registered_by_type = dict(self.registered_by_type)
+        discarded_by_quality = dict(self.discarded_by_quality)
+        warehouses = [
+            {
+                "id": warehouse.serial_number,
+                "name": warehouse.name,
+                "version": warehouse.version,
+                "lines": len(warehouse.lines),
+                "max_capacity": warehouse.max_capacity,
+                "capacity_usage": warehouse.current_capacity_usage,
+                "total_mass": warehouse.total_mass,
+                "package_count": warehouse.package_count,
+                "utilization_percentage": utilization(warehouse.current_capacity_usage, warehouse.max_capacity),
+            }
+            for warehouse in manager.warehouses
+        ]
+        totals = {
+            "lines": len(manager.line_index),
+            "pallets": len(manager.pallets),
+            "packages": len(manager.packages),
+            "total_capacity": manager.total_capacity,
+            "used_capacity": manager.current_capacity_usage,
+        }
+
+        for summary in summaries:
+            merge_summary(summary, capacity_types, stored_by_quality, stored_by_type,
+                          registered_by_type, discarded_by_quality)
+            totals["lines"] += summary["lines"]
+            totals["pallets"] += summary["pallets"]
+            totals["packages"] += summary["packages"]
+            if summary["warehouse"] is None:
+                continue
+            serial_number, name, max_capacity, _ = summary["warehouse"]
+            line_totals = summary["capacity_types"].values()
+            usage = sum(values[2] for values in line_totals)
+            totals["total_capacity"] += max_capacity
+            totals["used_capacity"] += usage
+            warehouses.append({
+                "id": serial_number,
+                "name": name,
+                "version": summary["version"],
+                "lines": summary["lines"],
+                "max_capacity": max_capacity,
+                "capacity_usage": usage,
+                "total_mass": sum(values[3] for values in line_totals),
+                "package_count": sum(values[4] for values in line_totals),
+                "utilization_percentage": utilization(usage, max_capacity),
+            })
+
+        stored = stored_by_type.values()
+        qualities = set(stored_by_quality) | set(discarded_by_quality)
+        package_types = set(stored_by_type) | set(registered_by_type)
+        return {
+            "totals": {
+                "warehouses": len(warehouses),
+                "lines": totals["lines"],
+                "pallets": totals["pallets"],
+                "packages": totals["packages"],
+                "stored_packages": sum(values[0] for values in stored),
+                "stored_mass": sum(values[1] for values in stored),
+                "discarded_packages": sum(discarded_by_quality.values()),
+                "total_capacity": totals["total_capacity"],
+                "used_capacity": totals["used_capacity"],
+                "utilization_percentage": utilization(totals["used_capacity"], totals["total_capacity"]),
+            },
+            "warehouses": warehouses,
+            "capacity_types": {
+                capacity_type: {
+                    "lines": lines,
+                    "max_capacity": capacity,
+                    "capacity_usage": usage,
+                    "total_mass": mass,
+                    "package_count": count,
+                    "utilization_percentage": utilization(usage, capacity),
+                }
+                for capacity_type, (lines, capacity, usage, mass, count) in capacity_types.items()
+            },
+            "quality_marks": {
+                quality_mark: {
+                    "stored_packages": stored_by_quality.get(quality_mark, (0, 0))[0],
+                    "stored_mass": stored_by_quality.get(quality_mark, (0, 0))[1],
+                    "discarded_packages": discarded_by_quality.get(quality_mark, 0),
+                }
+                for quality_mark in sorted(qualities)
+            },
+            "package_types": {
+                package_type: {
+                    "packages": registered_by_type.get(package_type, 0),
+                    "stored_packages": stored_by_type.get(package_type, (0, 0))[0],
+                    "stored_mass": stored_by_type.get(package_type, (0, 0))[1],
+                }
+                for package_type in sorted(package_types)
+            },
+        }
@@ -0,0 +1,71 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Timestamps are stored as integer microseconds since the Unix epoch and
+# converted to naive local datetimes only when read.
+
+_clock = threading.local()
+
+
+def now_epoch_us():
+    """
+    Get the current time as epoch microseconds
+
+    Returns:
+        int: Microseconds since the Unix epoch, or the pinned time if set
+    """
+    pinned = getattr(_clock, "pinned", None)
+    if pinned is not None:
+        return pinned
+    return time.time_ns() // 1000
+
+
+@contextmanager
+def pinned_time(epoch_us):
+    """
+    Pin now_epoch_us() for the current thread
+
+    Used so an operation and its log record share one timestamp, and so a
+    replayed operation reproduces the timestamps it had originally.
+
+    Args:
+        epoch_us (int): Microseconds since the Unix epoch
+
+    Yields:
+        int: The pinned timestamp
+    """
+    previous = getattr(_clock, "pinned", None)
+    _clock.pinned = epoch_us
+    try:
+        yield epoch_us
+    finally:
+        _clock.pinned = previous
+
+
+def to_epoch_us(value):
+    """
+    Convert a datetime to epoch microseconds
+
+    Args:
+        value (datetime): The datetime to convert
+
+    Returns:
+        int: Microseconds since the Unix epoch
+    """
+    return int(value.replace(microsecond=0).timestamp()) * 1_000_000 + value.microsecond
+
+
+def from_epoch_us(value):
+    """
+    Convert epoch microseconds to a naive local datetime
+
+    Args:
+        value (int): Microseconds since the Unix epoch
+
+    Returns:
+        datetime: The matching local datetime
+    """
+    seconds, microseconds = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=microseconds)
@@ -1,9 +1,22 @@
+import time
 import uuid
-from datetime import datetime
+from app.models.change_log import ChangeLog
+from app.models.offload_queue import OffloadQueue
+from app.models.ordered_set import OrderedSet
+from app.models.timestamps import now_epoch_us, from_epoch_us
+
+# Versions count up from the time this process started (in microseconds), so
+# every version handed out before a restart is below every version handed out
+# after it and clients holding one fall back to a full snapshot
+VERSION_BASE = time.time_ns() // 1000
 
 class Warehouse:
     """Warehouse to store lines of packages"""
     
+    __slots__ = ("serial_number", "name", "max_capacity", "lines", "created_ts",
+                 "manager", "total_mass", "package_count", "current_capacity_usage",
+                 "offload_queue", "version", "changes")
+    
     def __init__(self, name, max_capacity, serial_number=None):
         """
         Initialize a warehouse
@@ -16,16 +29,72 @@ class Warehouse:
         self.serial_number = serial_number or str(uuid.uuid4())
         self.name = name
         self.max_capacity = max_capacity
-        self.lines = []  # List of storage lines
-        self.created_at = datetime.now()
+        self.lines = OrderedSet()  # Storage lines in insertion order
+        self.created_ts = now_epoch_us()
+        self.manager = None  # Set when added to a LogisticsManager
+        self.offload_queue = OffloadQueue()  # Stored packages ordered by creation time
+        self.version = VERSION_BASE  # Bumped on every change to the warehouse or its lines
+        self.changes = ChangeLog(floor=self.version)  # Recent adds, removals and discards by version
+        
+        # Running totals, updated as lines change
+        self.total_mass = 0
+        self.package_count = 0
+        self.current_capacity_usage = 0
     
     @property
-    def current_capacity_usage(self):
-        """Calculate current weight capacity usage"""
-        total = 0
+    def created_at(self):
+        """Creation timestamp as a datetime"""
+        return from_epoch_us(self.created_ts)
+    
+    def adjust_totals(self, mass, count, usage):
+        """
+        Apply a change in stored mass, package count and capacity usage
+        
+        Args:
+            mass (float): Change in stored mass in kg
+            count (int): Change in number of stored packages
+            usage (float): Change in capacity usage
+        """
+        self.total_mass += mass
+        self.package_count += count
+        self.current_capacity_usage += usage
+        self.version += 1
+        if self.manager is not None:
+            self.manager.adjust_totals(mass, count, usage)
+    
+    def bump_version(self):
+        """Record a change that does not affect the running totals"""
+        self.version += 1
+    
+    def record_change(self, action, kind, item, line, pallet=None, packages=None):
+        """
+        Add a record to the change log under a new version
+        
+        Args:
+            action (str): "added", "removed" or "discarded"
+            kind (str): "carton", "pallet" or "package"
+            item: The Package or Pallet that changed
+            line: The Line involved
+            pallet: The Pallet a loose package went onto or left, if any
+            packages (tuple): Serial numbers of an added pallet's packages
+        """
+        self.version += 1
+        self.changes.append(self.version, action, kind, item, line.line_number, pallet, packages)
+    
+    def recount_totals(self):
+        """
+        Recalculate mass, package count and usage from scratch
+        
+        Returns:
+            tuple: (total mass, package count, capacity usage)
+        """
+        mass = count = usage = 0
         for line in self.lines:
-            total += line.current_capacity_usage
-        return total
+            line_mass, line_count, line_usage = line.recount_totals()
+            mass += line_mass
+            count += line_count
+            usage += line_usage
+        return mass, count, usage
     
     @property
     def available_capacity(self):
@@ -52,6 +121,12 @@ class Warehouse:
         # Set warehouse reference for the line
         line.warehouse = self
         self.lines.append(line)
+        self.adjust_totals(line.total_mass, line.package_count, line.current_capacity_usage)
+        for package in line.offload_queue.live:
+            self.offload_queue.add(package)
+        
+        # A whole line of contents cannot be described by change records
+        self.changes.reset(self.version)
         return True
     
     def remove_line(self, line):
@@ -67,6 +142,10 @@ class Warehouse:
         if line in self.lines:
             self.lines.remove(line)
             line.warehouse = None
+            self.adjust_totals(-line.total_mass, -line.package_count, -line.current_capacity_usage)
+            for package in line.offload_queue.live:
+                self.offload_queue.remove(package)
+            self.changes.reset(self.version)
             return True
         return False
     
@@ -98,6 +177,7 @@ class Warehouse:
         """
         snapshot = {
             "warehouse_name": self.name,
+            "version": self.version,
             "capacity_usage": self.current_capacity_usage,
             "max_capacity": self.max_capacity,
             "utilization_percentage": self.capacity_utilization_percentage,
@@ -111,7 +191,8 @@ class Warehouse:
                 "capacity_usage": line.current_capacity_usage,
                 "max_capacity": line.max_capacity,
                 "line_type": line.line_type,
-                "packages": []
+                "packages": [],
+                "pallets": []
             }
             
             # Add cartons
@@ -143,7 +224,7 @@ class Warehouse:
                         "created_at": package.created_at.isoformat()
                     })
                 
-                line_data["pallets"] = pallet_data
+                line_data["pallets"].append(pallet_data)
                 line_data["packages"].extend(pallet_data["packages"])
             
             snapshot["lines"].append(line_data)
@@ -151,6 +232,82 @@ class Warehouse:
         
         return snapshot
     
+    def iter_snapshot(self, line_number=None, fields=None):
+        """
+        Iterate a warehouse snapshot one record at a time
+        
+        Yields a "warehouse" record, then for each line a "line" record
+        followed by a "carton" record per carton and a "pallet" record per
+        pallet (with its packages). Each line's contents are copied when the
+        line is reached, so the warehouse may change between records.
+        
+        Args:
+            line_number (int, optional): Only include this line
+            fields (set, optional): Keys to keep in each record and in the
+                packages of pallet records; "record" and the serial numbers
+                of pallet packages are always kept
+            
+        Yields:
+            dict: Snapshot records
+        """
+        def project(record):
+            if fields is None:
+                return record
+            return {key: value for key, value in record.items() if key == "record" or key in fields}
+        
+        def package_data(package):
+            data = {"serial_number": package.serial_number}
+            if fields is None or "quality_mark" in fields:
+                data["quality_mark"] = package.quality_mark
+            if fields is None or "mass" in fields:
+                data["mass"] = package.mass
+            if fields is None or "created_at" in fields:
+                data["created_at"] = package.created_at.isoformat()
+            return data
+        
+        lines = [line for line in self.lines if line_number is None or line.line_number == line_number]
+        yield project({
+            "record": "warehouse",
+            "serial_number": self.serial_number,
+            "warehouse_name": self.name,
+            "version": self.version,
+            "capacity_usage": self.current_capacity_usage,
+            "max_capacity": self.max_capacity,
+            "utilization_percentage": self.capacity_utilization_percentage,
+            "line_count": len(lines)
+        })
+        
+        for line in lines:
+            cartons = list(line.packages)
+            pallets = [(pallet, list(pallet.packages), pallet.total_mass) for pallet in line.pallets]
+            yield project({
+                "record": "line",
+                "serial_number": line.serial_number,
+                "line_number": line.line_number,
+                "capacity_usage": line.current_capacity_usage,
+                "max_capacity": line.max_capacity,
+                "line_type": line.line_type,
+                "package_count": line.package_count
+            })
+            
+            for carton in cartons:
+                record = package_data(carton)
+                record["record"] = "carton"
+                record["line_number"] = line.line_number
+                yield project(record)
+            
+            for pallet, packages, total_mass in pallets:
+                yield project({
+                    "record": "pallet",
+                    "serial_number": pallet.serial_number,
+                    "line_number": line.line_number,
+                    "quality_mark": pallet.quality_mark,
+                    "package_count": len(packages),
+                    "max_capacity": pallet.max_capacity,
+                    "total_mass": total_mass,
+                    "packages": [package_data(package) for package in packages]
+                })
+    
     def search_package(self, serial_number):
         """
         Search for a package by its serial number
@@ -1,25 +1,123 @@
-import json
-import os
-import datetime
+import threading
+import uuid
+from itertools import islice
 from app.models.package import Package, LoosePackage, Carton
 from app.models.pallet import Pallet
 from app.models.line import Line
 from app.models.warehouse import Warehouse
 from app.models.logistics_manager import LogisticsManager
+from app.models.persistence import FileStorage, PersistenceWriter
+from app.models.change_log import format_change
+from app.models.snapshot_cache import SnapshotCache
+from app.models.sqlite_storage import SQLiteStorage, SQLITE_SUFFIXES
+from app.models.timestamps import now_epoch_us, pinned_time
+
+PACKAGE_TYPES = ("loose", "carton")
+
+# Bulk results list at most this many row errors, error_count has the total
+MAX_REPORTED_ERRORS = 1000
+
+
+def validate_package_rows(rows, first_row=1):
+    """
+    Validate a batch of package rows column by column
+    
+    Args:
+        rows (list): Dicts with package_type, quality_mark and mass keys,
+            None for rows that could not be parsed
+        first_row (int): Row number of the first row, for error reports
+        
+    Returns:
+        tuple: ([package_type, quality_mark, mass] for valid rows,
+            errors as dicts with row and message keys)
+    """
+    rows = [row if isinstance(row, dict) else None for row in rows]
+    problems = [None if row is not None else "Malformed row" for row in rows]
+    
+    package_types = [row.get("package_type") if row is not None else None for row in rows]
+    quality_marks = [row.get("quality_mark") if row is not None else None for row in rows]
+    masses = []
+    for row in rows:
+        try:
+            masses.append(float(row.get("mass")) if row is not None else None)
+        except (TypeError, ValueError):
+            masses.append(None)
+    
+    for i, (package_type, quality_mark, mass) in enumerate(zip(package_types, quality_marks, masses)):
+        if problems[i] is not None:
+            continue
+        if package_type not in PACKAGE_TYPES:
+            problems[i] = "Invalid package type"
+        elif not quality_mark or not isinstance(quality_mark, str):
+            problems[i] = "Quality mark is required"
+        elif mass is None:
+            problems[i] = "Invalid mass"
+        elif not mass > 0:
+            problems[i] = "Mass must be positive"
+    
+    valid = [
+        [package_type, quality_mark, mass]
+        for package_type, quality_mark, mass, problem in zip(package_types, quality_marks, masses, problems)
+        if problem is None
+    ]
+    errors = [
+        {"row": first_row + i, "message": problem}
+        for i, problem in enumerate(problems)
+        if problem is not None
+    ]
+    return valid, errors
+
+
+# Object arguments of logged operations, resolved from serial numbers on replay
+OBJECT_ARGUMENTS = {
+    "add_line_to_warehouse": ("line", "warehouse"),
+    "load_package_to_pallet": ("package", "pallet"),
+    "load_pallet_to_line": ("pallet", "line"),
+    "load_carton_to_line": ("package", "line"),
+    "offload_package": ("package",),
+    "offload_pallet": ("pallet",),
+    "discard_package": ("package",),
+    "approve_mixed_quality_line": ("line",),
+}
 
 class WarehouseSystem:
     """Main system class to interact with the logistics system"""
     
-    def __init__(self, data_file="warehouse_data.json"):
+    def __init__(self, data_file="warehouse_data.json", storage=None, snapshot_interval=10000,
+                 commit_delay=0.0, durability="async", max_delay=0.05, flush_interval=1.0):
         """
         Initialize the warehouse system
         
+        Every mutation is recorded by a storage backend. By default a
+        FileStorage keeps an operation log and a binary snapshot next to
+        data_file; a data_file ending in .db, .sqlite or .sqlite3 selects
+        SQLiteStorage. Writing happens on a background thread, see
+        PersistenceWriter for the durability modes.
+        
         Args:
-            data_file (str): File path to save/load data
+            data_file (str): Base file path of the stored data
+            storage: Storage backend to use instead of one chosen from data_file
+            snapshot_interval (int): Logged operations between file snapshots
+            commit_delay (float): Seconds a file commit waits for concurrent
+                requests to share its fsync
+            durability (str): "sync", "async" or "interval"
+            max_delay (float): Longest wait before an async write
+            flush_interval (float): Seconds between interval writes
         """
         self.manager = LogisticsManager()
         self.data_file = data_file
+        self.unassigned_lines = {}  # Lines created but not yet added to a warehouse
+        self.lock = threading.RLock()  # Serializes mutations and their recording order
+        self.snapshot_cache = SnapshotCache()  # Serialized snapshots per warehouse version
+        if storage is None:
+            if data_file.endswith(SQLITE_SUFFIXES):
+                storage = SQLiteStorage(data_file)
+            else:
+                storage = FileStorage(data_file, snapshot_interval, commit_delay)
+        self.storage = storage
+        self.writer = PersistenceWriter(self, durability, max_delay, flush_interval)
         self.load_data()
+        self.writer.start()
     
     def create_warehouse(self, name, max_capacity):
         """
@@ -32,8 +130,7 @@ class WarehouseSystem:
         Returns:
             Warehouse: The created warehouse object
         """
-        warehouse = Warehouse(name, max_capacity)
-        self.manager.add_warehouse(warehouse)
+        warehouse = self._execute("create_warehouse", str(uuid.uuid4()), name, max_capacity)
         self.save_data()
         return warehouse
     
@@ -49,7 +146,7 @@ class WarehouseSystem:
         Returns:
             Line: The created line object
         """
-        line = Line(line_number, max_capacity, capacity_type)
+        line = self._execute("create_line", str(uuid.uuid4()), line_number, max_capacity, capacity_type)
         self.save_data()
         return line
     
@@ -64,9 +161,9 @@ class WarehouseSystem:
         Returns:
             bool: True if added successfully
         """
-        result = warehouse.add_line(line)
+        result = self._execute("add_line_to_warehouse", line, warehouse)
         self.save_data()
-        return
+        return result
     
     def create_package(self, package_type, quality_mark, mass):
             """
@@ -80,15 +177,51 @@ class WarehouseSystem:
             Returns:
                 Package: The created package object
             """
-            if package_type == "loose":
-                package = LoosePackage(quality_mark, mass)
-            else:
-                package = Carton(quality_mark, mass)
-            
-            self.manager.register_package(package)
+            package = self._execute("create_package", str(uuid.uuid4()), package_type, quality_mark, mass)
             self.save_data()
             return package
         
+    def create_packages_bulk(self, rows, batch_size=1000):
+        """
+        Create many packages, saving once per batch
+        
+        Rows are consumed lazily, so a streamed upload is never held in
+        memory whole.
+        
+        Args:
+            rows: Iterable of dicts with package_type, quality_mark and mass
+                keys, None for rows that could not be parsed
+            batch_size (int): Rows validated and saved together
+            
+        Returns:
+            dict: "created" serial numbers, "error_count" and "errors" for
+                the first MAX_REPORTED_ERRORS rejected rows (numbered from 1)
+        """
+        created = []
+        errors = []
+        error_count = 0
+        rows = iter(rows)
+        first_row = 1
+        
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            
+            valid, batch_errors = validate_package_rows(batch, first_row)
+            first_row += len(batch)
+            error_count += len(batch_errors)
+            errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            
+            if valid:
+                serial_numbers = [str(uuid.uuid4()) for _ in valid]
+                specs = [[serial_number, *row] for serial_number, row in zip(serial_numbers, valid)]
+                self._execute("create_packages", specs)
+                self.save_data()
+                created.extend(serial_numbers)
+        
+        return {"created": created, "error_count": error_count, "errors": errors}
+        
     def create_pallet(self, quality_mark, max_capacity):
         """
         Create a new pallet
@@ -100,11 +233,51 @@ class WarehouseSystem:
         Returns:
             Pallet: The created pallet object
         """
-        pallet = Pallet(quality_mark, max_capacity)
-        self.manager.register_pallet(pallet)
+        pallet = self._execute("create_pallet", str(uuid.uuid4()), quality_mark, max_capacity)
         self.save_data()
         return pallet
 
+    def auto_palletize(self, packages, pallet_capacity):
+        """
+        Put unassigned loose packages on pallets of their quality
+        
+        Existing pallets that are not on a line are filled first, fullest
+        first; new pallets are created only for what is left. The whole
+        assignment is saved as one operation.
+        
+        Args:
+            packages: Iterable of Package objects, None for every package
+            pallet_capacity (int): Maximum number of packages on a new pallet
+            
+        Returns:
+            dict: "pallets" as a list of dicts with pallet, quality_mark, new
+                and packages (serial numbers), and "skipped" as a list of
+                dicts with package and reason
+        """
+        with self.lock:
+            if packages is None:
+                packages = (package for package in self.manager.get_all_packages()
+                            if package.package_type == "loose" and package.pallet is None
+                            and not package.discarded)
+            plan, skipped = self.manager.plan_palletization(packages, pallet_capacity)
+            
+            assignments = [
+                [pallet.serial_number if pallet else str(uuid.uuid4()), quality_mark, pallet is None,
+                 [package.serial_number for package in planned]]
+                for pallet, quality_mark, planned in plan
+            ]
+            if assignments:
+                self._execute("palletize", assignments, pallet_capacity)
+        self.save_data()
+        
+        return {
+            "pallets": [
+                {"pallet": serial_number, "quality_mark": quality_mark, "new": new, "packages": serial_numbers}
+                for serial_number, quality_mark, new, serial_numbers in assignments
+            ],
+            "skipped": [{"package": package.serial_number, "reason": reason} for package, reason in skipped]
+        }
+
     def load_package_to_pallet(self, package, pallet):
         """
         Load a package to a pallet
@@ -116,7 +289,7 @@ class WarehouseSystem:
         Returns:
             bool: True if loaded successfully
         """
-        result = self.manager.load_package_to_pallet(package, pallet)
+        result = self._execute("load_package_to_pallet", package, pallet)
         self.save_data()
         return result
 
@@ -131,7 +304,7 @@ class WarehouseSystem:
         Returns:
             bool: True if loaded successfully
         """
-        result = self.manager.load_pallet_to_line(pallet, line)
+        result = self._execute("load_pallet_to_line", pallet, line)
         self.save_data()
         return result
 
@@ -146,10 +319,62 @@ class WarehouseSystem:
         Returns:
             bool: True if loaded successfully
         """
-        result = self.manager.load_package_to_line(carton, line)
+        result = self._execute("load_carton_to_line", carton, line)
         self.save_data()
         return result
 
+    def best_open_pallet(self, quality_mark, placed=None):
+        """
+        Find the fullest pallet of a quality mark that still has room
+        
+        Args:
+            quality_mark (str): Quality mark of the package to be palletized
+            placed (bool, optional): True for pallets on a line only, False
+                for pallets not on a line only
+            
+        Returns:
+            Pallet: The best pallet, None if every pallet is full
+        """
+        with self.lock:
+            return self.manager.best_open_pallet(quality_mark, placed)
+
+    def suggest_location(self, item, strategy="best_fit"):
+        """
+        Choose a line for a pallet or carton across all warehouses
+        
+        Args:
+            item: The pallet or carton to place
+            strategy: A put-away strategy name or function
+            
+        Returns:
+            Line: The chosen line, None if no line can take the item
+        """
+        with self.lock:
+            return self.manager.suggest_location(item, strategy)
+
+    def auto_put_away(self, items, strategy="best_fit"):
+        """
+        Place many pallets and cartons on the lines chosen by a strategy
+        
+        Each placement is logged as an ordinary load, so replay does not
+        depend on the strategy.
+        
+        Args:
+            items: The pallets and cartons to place
+            strategy: A put-away strategy name or function
+            
+        Returns:
+            list: (item, line) pairs, line is None for items not placed
+        """
+        with self.lock:
+            placements = self.manager.auto_put_away(items, strategy, place=self._place)
+        self.save_data()
+        return placements
+
+    def _place(self, item, line):
+        operation = "load_pallet_to_line" if isinstance(item, Pallet) else "load_carton_to_line"
+        return self._execute(operation, item, line)
+
     def offload_package(self, package):
         """
         Offload a package from its current location
@@ -160,7 +385,7 @@ class WarehouseSystem:
         Returns:
             bool: True if offloaded successfully
         """
-        result = self.manager.offload_package(package)
+        result = self._execute("offload_package", package)
         self.save_data()
         return result
 
@@ -174,7 +399,7 @@ class WarehouseSystem:
         Returns:
             bool: True if offloaded successfully
         """
-        result = self.manager.offload_pallet(pallet)
+        result = self._execute("offload_pallet", pallet)
         self.save_data()
         return result
 
@@ -188,7 +413,7 @@ class WarehouseSystem:
         Returns:
             bool: True if discarded successfully
         """
-        result = self.manager.discard_package(package)
+        result = self._execute("discard_package", package)
         self.save_data()
         return result
 
@@ -202,10 +427,64 @@ class WarehouseSystem:
         Returns:
             bool: True if set successfully
         """
-        result = self.manager.set_offload_order(order)
+        result = self._execute("set_offload_order", order)
         self.save_data()
         return result
 
+    def next_to_offload(self, location, n, quality=None):
+        """
+        Get the next packages to offload from a line or warehouse
+        
+        Args:
+            location: The line or warehouse to offload from
+            n (int): Maximum number of packages to return
+            quality (str, optional): Only return packages of this quality mark
+            
+        Returns:
+            list: Up to n packages in offload order
+        """
+        return self.manager.next_to_offload(location, n, quality)
+
+    def plan_pick(self, quality, quantity, unit="units", order=None):
+        """
+        Choose the packages that fill an outbound order
+        
+        Args:
+            quality (str): Quality mark to pick
+            quantity (float): Number of packages, or kilograms if unit is "kg"
+            unit (str): Either "units" or "kg"
+            order (str, optional): "oldest_first" or "newest_first", defaults
+                to the current offload order
+            
+        Returns:
+            dict: The pick list, grouped by warehouse and line
+        """
+        with self.lock:
+            return self.manager.plan_pick(quality, quantity, unit, order)
+
+    def execute_pick(self, plan):
+        """
+        Offload every package in a pick list as one logged operation
+        
+        Packages that left their planned line since the plan was made are
+        skipped.
+        
+        Args:
+            plan (dict): A pick list from plan_pick
+            
+        Returns:
+            list: The packages offloaded
+        """
+        picks = [
+            [package.serial_number, line_group["line"].serial_number]
+            for group in plan["warehouses"]
+            for line_group in group["lines"]
+            for package in line_group["packages"]
+        ]
+        touched = self._execute("pick", picks)
+        self.save_data()
+        return [item for item in touched if isinstance(item, Package)]
+
     def approve_mixed_quality_line(self, line, max_types=3):
         """
         Approve a line for mixed quality packages
@@ -217,33 +496,184 @@ class WarehouseSystem:
         Returns:
             bool: True if approved successfully
         """
-        result = self.manager.approve_mixed_quality_line(line, max_types)
+        result = self._execute("approve_mixed_quality_line", line, max_types)
         self.save_data()
         return result
 
-    def get_package_history(self, line):
+    def get_package_history(self, line, since=None, until=None, limit=None, offset=0):
         """
         Get package history for a line
         
         Args:
             line: The line to get history for
+            since (datetime, optional): Only entries at or after this time
+            until (datetime, optional): Only entries at or before this time
+            limit (int, optional): Maximum number of entries to return
+            offset (int): Number of matching entries to skip
             
         Returns:
             list: Package history
         """
-        return self.manager.get_package_history(line)
+        return self.manager.get_package_history(line, since, until, limit, offset)
+
+    def count_package_history(self, line, since=None, until=None):
+        """
+        Count package history entries for a line
+        
+        Args:
+            line: The line to count history for
+            since (datetime, optional): Only entries at or after this time
+            until (datetime, optional): Only entries at or before this time
+            
+        Returns:
+            int: Number of matching entries
+        """
+        return self.manager.count_package_history(line, since, until)
+
+    def list_page(self, kind, column=None, descending=False, start=0, length=10, search=None):
+        """
+        Get one page of packages, pallets, lines or warehouses
+        
+        Args:
+            kind (str): "package", "pallet", "line" or "warehouse"
+            column (str, optional): Column to order by
+            descending (bool): Reverse the order
+            start (int): Number of matching objects to skip
+            length (int): Maximum number of objects to return
+            search (str, optional): Search term, see LogisticsManager.list_page
+            
+        Returns:
+            tuple: (total count, matching count, list of objects)
+        """
+        with self.lock:
+            return self.manager.list_page(kind, column, descending, start, length, search)
+
+    def query(self, kind, created_after=None, created_before=None, **filters):
+        """
+        Find packages or pallets by their indexed attributes
+        
+        The lock is held only while each match is found, so a slow reader
+        does not block writers.
+        
+        Args:
+            kind (str): "package" or "pallet"
+            created_after (datetime, optional): Earliest creation time, inclusive
+            created_before (datetime, optional): Latest creation time, exclusive
+            **filters: Field name -> value or list of values, see
+                LogisticsManager.query
+            
+        Returns:
+            iterator: Matching objects in the order they were registered
+            
+        Raises:
+            ValueError: If the kind or a filter field is unknown
+        """
+        with self.lock:
+            results = self.manager.query(kind, created_after, created_before, **filters)
+        return self._iter_locked(results)
+    
+    def _iter_locked(self, results):
+        """Yield from an iterator, holding the lock for each step"""
+        while True:
+            with self.lock:
+                item = next(results, None)
+            if item is None:
+                return
+            yield item
+
+    def get_stats(self):
+        """
+        Get the inventory rollups
+        
+        Returns:
+            dict: Totals, and breakdowns by warehouse, capacity type,
+                quality mark and package type
+        """
+        with self.lock:
+            return self.manager.get_stats()
 
     def get_warehouse_snapshot(self, warehouse):
         """
         Get a snapshot of a warehouse
         
+        The snapshot is shared with other callers until the warehouse
+        changes, so it must not be modified.
+        
         Args:
             warehouse: The warehouse to get snapshot for
             
         Returns:
             dict: Warehouse snapshot
         """
-        return self.manager.get_warehouse_snapshot(warehouse)
+        return self.get_cached_snapshot(warehouse).snapshot
+
+    def get_cached_snapshot(self, warehouse):
+        """
+        Get a warehouse snapshot with its JSON and gzip bodies and entity tag
+        
+        Args:
+            warehouse: The warehouse to get snapshot for
+            
+        Returns:
+            CachedSnapshot: The snapshot of the warehouse's current version
+        """
+        with self.lock:
+            return self.snapshot_cache.get(warehouse)
+
+    def get_warehouse_changes(self, warehouse, since):
+        """
+        Get the changes to a warehouse's contents after a version
+        
+        Args:
+            warehouse: The warehouse
+            since (int): The version the caller last saw
+            
+        Returns:
+            tuple: (current version, list of change dicts), the list is None
+                if the changes are no longer kept and a full snapshot is needed
+        """
+        with self.lock:
+            if since > warehouse.version:
+                return warehouse.version, None
+            records = warehouse.changes.since(since)
+            if records is None:
+                return warehouse.version, None
+            return warehouse.version, [format_change(record) for record in records]
+
+    def warehouse_etag(self, warehouse):
+        """
+        Get the entity tag of a warehouse's current version
+        
+        Args:
+            warehouse: The warehouse
+            
+        Returns:
+            str: Unquoted entity tag, changes whenever the warehouse does
+        """
+        return self.snapshot_cache.etag(warehouse)
+
+    def iter_warehouse_snapshot(self, warehouse, line_number=None, fields=None):
+        """
+        Iterate a warehouse snapshot one record at a time
+        
+        The lock is held only while each record is built, so a slow reader
+        does not block writers.
+        
+        Args:
+            warehouse: The warehouse to get the snapshot for
+            line_number (int, optional): Only include this line
+            fields (set, optional): Keys to keep in each record
+            
+        Yields:
+            dict: Snapshot records, see Warehouse.iter_snapshot
+        """
+        records = warehouse.iter_snapshot(line_number, fields)
+        while True:
+            with self.lock:
+                record = next(records, None)
+            if record is None:
+                return
+            yield record
 
     def search_package(self, serial_number):
         """
@@ -269,6 +699,54 @@ class WarehouseSystem:
         """
         return self.manager.search_pallet(serial_number)
 
+    def get_warehouse(self, serial_number):
+        """
+        Get a warehouse by serial number
+        
+        Args:
+            serial_number (str): Serial number of the warehouse
+            
+        Returns:
+            Warehouse: The warehouse if found, None otherwise
+        """
+        return self.manager.get_warehouse(serial_number)
+
+    def get_line(self, serial_number):
+        """
+        Get a line by serial number
+        
+        Args:
+            serial_number (str): Serial number of the line
+            
+        Returns:
+            Line: The line if found, None otherwise
+        """
+        return self.manager.get_line(serial_number)
+
+    def get_pallet(self, serial_number):
+        """
+        Get a pallet by serial number
+        
+        Args:
+            serial_number (str): Serial number of the pallet
+            
+        Returns:
+            Pallet: The pallet if found, None otherwise
+        """
+        return self.manager.get_pallet(serial_number)
+
+    def get_package(self, serial_number):
+        """
+        Get a package by serial number
+        
+        Args:
+            serial_number (str): Serial number of the package
+            
+        Returns:
+            Package: The package if found, None otherwise
+        """
+        return self.manager.get_package(serial_number)
+
     def get_all_warehouses(self):
         """
         Get all warehouses
@@ -278,40 +756,190 @@ class WarehouseSystem:
         """
         return self.manager.get_all_warehouses()
 
+    def get_all_pallets(self):
+        """
+        Get all pallets
+        
+        Returns:
+            list: All pallets
+        """
+        return self.manager.get_all_pallets()
+
+    def get_all_packages(self):
+        """
+        Get all packages
+        
+        Returns:
+            PackageStore: All packages
+        """
+        return self.manager.get_all_packages()
+
     def save_data(self):
-        """Save system data to file"""
+        """Hand logged operations to the writer, waiting for them in sync mode"""
         try:
-            # This is a placeholder for data serialization
-            # In a real system, you would implement proper serialization
-            # of complex objects to JSON or use a database
-            data = {
-                "timestamp": datetime.datetime.now().isoformat(),
-                "warehouses_count": len(self.manager.warehouses),
-                "packages_count": len(self.manager.packages),
-                "pallets_count": len(self.manager.pallets)
-            }
-            
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f)
-                
+            if self.writer.mode == "sync":
+                self.storage.commit()
+            self.writer.notify()
             return True
         except Exception as e:
             print(f"Error saving data: {e}")
             return False
 
+    def flush(self):
+        """Block until every logged operation is on disk"""
+        self.writer.flush()
+
+    def close(self):
+        """Flush outstanding operations and release the storage backend"""
+        self.writer.stop()
+        self.storage.close()
+
+    def persistence_metrics(self):
+        """
+        Get background writer statistics
+        
+        Returns:
+            dict: Queue depth, unsaved operations and write latency
+        """
+        return self.writer.metrics()
+
+    def write_snapshot(self):
+        """Compact stored data (a full snapshot for FileStorage)"""
+        self.storage.checkpoint(self)
+        return True
+
     def load_data(self):
-        """Load system data from file"""
+        """
+        Load stored data and replay operations recorded after it
+        
+        Stored objects are built lazily, one warehouse at a time, the
+        first time a lookup needs them.
+        """
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    
-                # This is a placeholder for data deserialization
-                # In a real system, you would implement proper deserialization
-                # of complex objects from JSON or use a database
-                    
-                return True
-            return False
+            for record in self.storage.load(self):
+                self._replay(record)
+            
+            # Storage only accepts writes once replay succeeded, so a
+            # damaged data file is never overwritten
+            self.storage.open()
+            return True
         except Exception as e:
             print(f"Error loading data: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def _execute(self, operation, *args):
+        """Apply an operation and hand it to the storage backend"""
+        with self.lock, pinned_time(now_epoch_us()) as timestamp:
+            self.storage.begin(operation, args)
+            result = getattr(self, "_apply_" + operation)(*args)
+            
+            # Failed operations change nothing, so they are not recorded
+            if result is not False:
+                self.storage.record(timestamp, operation, args, result)
+        return result
+
+    def _replay(self, record):
+        """Re-apply a logged operation at its original time"""
+        _, timestamp, operation, *args = record
+        for i, kind in enumerate(OBJECT_ARGUMENTS.get(operation, ())):
+            args[i] = self._resolve(kind, args[i])
+        with pinned_time(timestamp):
+            getattr(self, "_apply_" + operation)(*args)
+
+    def _resolve(self, kind, serial_number):
+        """Find a logged object by kind and serial number"""
+        if kind == "line":
+            found = self.manager.get_line(serial_number) or self.unassigned_lines.get(serial_number)
+        else:
+            found = getattr(self.manager, "get_" + kind)(serial_number)
+        if found is None:
+            raise ValueError(f"Unknown {kind} {serial_number} in operation log")
+        return found
+
+    def _apply_create_warehouse(self, serial_number, name, max_capacity):
+        warehouse = Warehouse(name, max_capacity, serial_number)
+        self.manager.add_warehouse(warehouse)
+        return warehouse
+
+    def _apply_create_line(self, serial_number, line_number, max_capacity, capacity_type):
+        line = Line(line_number, max_capacity, capacity_type, serial_number=serial_number)
+        self.unassigned_lines[serial_number] = line
+        return line
+
+    def _apply_add_line_to_warehouse(self, line, warehouse):
+        self.unassigned_lines.pop(line.serial_number, None)
+        return self.manager.add_line_to_warehouse(line, warehouse)
+
+    def _apply_create_package(self, serial_number, package_type, quality_mark, mass):
+        if package_type == "loose":
+            package = LoosePackage(quality_mark, mass, serial_number)
+        else:
+            package = Carton(quality_mark, mass, serial_number)
+        self.manager.register_package(package)
+        return package
+
+    def _apply_create_packages(self, specs):
+        packages = [
+            (LoosePackage if package_type == "loose" else Carton)(quality_mark, mass, serial_number)
+            for serial_number, package_type, quality_mark, mass in specs
+        ]
+        self.manager.register_packages(packages)
+        return packages
+
+    def _apply_create_pallet(self, serial_number, quality_mark, max_capacity):
+        pallet = Pallet(quality_mark, max_capacity, serial_number)
+        self.manager.register_pallet(pallet)
+        return pallet
+
+    def _apply_palletize(self, assignments, pallet_capacity):
+        touched = []
+        for serial_number, quality_mark, new, package_serials in assignments:
+            if new:
+                pallet = self._apply_create_pallet(serial_number, quality_mark, pallet_capacity)
+            else:
+                pallet = self._resolve("pallet", serial_number)
+            touched.append(pallet)
+            for package_serial in package_serials:
+                package = self._resolve("package", package_serial)
+                pallet.add_package(package)
+                touched.append(package)
+        return touched
+
+    def _apply_load_package_to_pallet(self, package, pallet):
+        return self.manager.load_package_to_pallet(package, pallet)
+
+    def _apply_load_pallet_to_line(self, pallet, line):
+        return self.manager.load_pallet_to_line(pallet, line)
+
+    def _apply_load_carton_to_line(self, carton, line):
+        return self.manager.load_package_to_line(carton, line)
+
+    def _apply_offload_package(self, package):
+        return self.manager.offload_package(package)
+
+    def _apply_offload_pallet(self, pallet):
+        return self.manager.offload_pallet(pallet)
+
+    def _apply_pick(self, picks):
+        # The lines are returned too, as they gained history entries
+        picked = []
+        lines = {}
+        for serial_number, line_serial in picks:
+            package = self._resolve("package", serial_number)
+            location = self.manager.location_index.locate(serial_number)
+            line = location[1] if location is not None else None
+            if line is None or line.serial_number != line_serial:
+                continue
+            if self.manager.offload_package(package):
+                picked.append(package)
+                lines[line] = None
+        return picked + list(lines)
+
+    def _apply_discard_package(self, package):
+        return self.manager.discard_package(package)
+
+    def _apply_set_offload_order(self, order):
+        return self.manager.set_offload_order(order)
+
+    def _apply_approve_mixed_quality_line(self, line, max_types):
+        return self.manager.approve_mixed_quality_line(line, max_types)
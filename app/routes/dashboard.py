@@ -6,25 +6,37 @@ bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 def index():
     """Dashboard home page"""
     warehouses = current_app.warehouse_system.get_all_warehouses()
+    totals = current_app.warehouse_system.get_stats()['totals']
     
-    # Calculate system statistics
+    # System statistics come from the manager's rollups
     statistics = {
-        'total_warehouses': len(warehouses),
-        'total_lines': sum(len(w.lines) for w in warehouses),
-        'total_packages': len(current_app.warehouse_system.manager.packages),
-        'total_pallets': len(current_app.warehouse_system.manager.pallets),
-        'total_capacity': sum(w.max_capacity for w in warehouses),
-        'used_capacity': sum(w.current_capacity_usage for w in warehouses)
+        'total_warehouses': totals['warehouses'],
+        'total_lines': totals['lines'],
+        'total_packages': totals['packages'],
+        'total_pallets': totals['pallets'],
+        'total_capacity': totals['total_capacity'],
+        'used_capacity': totals['used_capacity'],
+        'utilization_percentage': totals['utilization_percentage']
     }
     
-    # Add utilization percentage
-    if statistics['total_capacity'] > 0:
-        statistics['utilization_percentage'] = (statistics['used_capacity'] / statistics['total_capacity']) * 100
-    else:
-        statistics['utilization_percentage'] = 0
-    
     return render_template('dashboard/index.html', warehouses=warehouses, statistics=statistics)
 
+@bp.route('/stats.json', methods=['GET'])
+def stats():
+    """Inventory rollups by warehouse, capacity type, quality mark and package type"""
+    return jsonify({
+        'status': 'success',
+        'stats': current_app.warehouse_system.get_stats()
+    })
+
+@bp.route('/persistence', methods=['GET'])
+def persistence():
+    """Background writer metrics"""
+    return jsonify({
+        'status': 'success',
+        'persistence': current_app.warehouse_system.persistence_metrics()
+    })
+
 @bp.route('/set-offload-order', methods=['POST'])
 def set_offload_order():
     """Set package offloading order"""
@@ -0,0 +1,42 @@
+from flask import jsonify, current_app
+
+# Longest page a table may ask for; "All" (-1) is capped to this
+MAX_PAGE_LENGTH = 1000
+
+def data_response(kind, args, format_row):
+    """
+    Answer a DataTables server-side request for one of the index tables
+
+    Args:
+        kind (str): "package", "pallet", "line" or "warehouse"
+        args: The request's query arguments
+        format_row (function): Converts one object to a row dict
+
+    Returns:
+        Response: JSON with draw, recordsTotal, recordsFiltered and data
+    """
+    draw = args.get('draw', 0, type=int)
+    try:
+        start = max(args.get('start', 0, type=int), 0)
+        length = args.get('length', 10, type=int)
+        if length < 0 or length > MAX_PAGE_LENGTH:
+            length = MAX_PAGE_LENGTH
+
+        column = None
+        index = args.get('order[0][column]', type=int)
+        if index is not None:
+            column = args.get(f'columns[{index}][data]')
+        descending = args.get('order[0][dir]') == 'desc'
+        search = args.get('search[value]', '').strip() or None
+
+        total, filtered, items = current_app.warehouse_system.list_page(
+            kind, column, descending, start, length, search)
+        return jsonify({
+            'draw': draw,
+            'recordsTotal': total,
+            'recordsFiltered': filtered,
+            'data': [format_row(item) for item in items]
+        })
+    except Exception as e:
+        # DataTables shows the "error" field instead of the table
+        return jsonify({'draw': draw, 'error': str(e)}), 500
@@ -0,0 +1,51 @@
+from datetime import datetime
+from itertools import islice
+from flask import jsonify, current_app, Response, stream_with_context
+from app.routes.warehouse import ndjson_chunks
+
+def query_response(kind, args, fields, format_record):
+    """
+    Stream the packages or pallets matching the query arguments as NDJSON
+
+    Each field in fields is filtered on when given, with comma-separated
+    values accepted as alternatives. created_after and created_before take
+    ISO timestamps and limit caps the number of rows.
+
+    Args:
+        kind (str): "package" or "pallet"
+        args: The request's query arguments
+        fields (tuple): Names of the filterable fields for this kind
+        format_record (function): Converts one object to a record dict
+
+    Returns:
+        Response: One JSON record per line, or a JSON error
+    """
+    try:
+        filters = {}
+        for field in fields:
+            value = args.get(field)
+            if value is None or not value.strip():
+                continue
+            values = [part.strip() for part in value.split(',') if part.strip()]
+            if field == 'discarded':
+                if any(part.lower() not in ('true', 'false') for part in values):
+                    raise ValueError('discarded must be true or false')
+                values = [part.lower() == 'true' for part in values]
+            filters[field] = values
+
+        created_after = args.get('created_after')
+        created_before = args.get('created_before')
+        created_after = datetime.fromisoformat(created_after) if created_after else None
+        created_before = datetime.fromisoformat(created_before) if created_before else None
+        limit = args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            raise ValueError('Limit must be positive')
+
+        results = current_app.warehouse_system.query(kind, created_after, created_before, **filters)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    if limit is not None:
+        results = islice(results, limit)
+    records = map(format_record, results)
+    return Response(stream_with_context(ndjson_chunks(records)), mimetype='application/x-ndjson')
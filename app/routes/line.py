@@ -1,15 +1,50 @@
+from datetime import datetime
 from flask import Blueprint, render_template, request, jsonify, current_app, redirect, url_for
+from app.models.pallet import Pallet
+from app.routes.datatables import data_response
 
 bp = Blueprint('line', __name__, url_prefix='/line')
 
+# Number of most recent history entries rendered on the history page
+HISTORY_PAGE_SIZE = 500
+
+# Most entries history.json returns at once; larger limits are capped to this
+MAX_HISTORY_LIMIT = 1000
+
+def format_history_entry(entry):
+    """Format a package history entry for display"""
+    return {
+        'package_serial': entry['package'].serial_number,
+        'package_quality': entry['package'].quality_mark,
+        'package_mass': entry['package'].mass,
+        'action': entry['action'],
+        'timestamp': entry['timestamp'].isoformat()
+    }
+
 @bp.route('/', methods=['GET'])
 def index():
     """List all lines"""
-    warehouses = current_app.warehouse_system.get_all_warehouses()
-    lines = []
-    for warehouse in warehouses:
-        lines.extend(warehouse.lines)
-    return render_template('line/index.html', lines=lines)
+    return render_template('line/index.html')
+
+
+def format_line_row(line):
+    """Convert a line to a row of the lines table"""
+    return {
+        'serial_number': line.serial_number,
+        'line_number': line.line_number,
+        'warehouse': line.warehouse.name if line.warehouse else None,
+        'capacity_type': line.capacity_type,
+        'unit': 'kg' if line.capacity_type == 'weight' else 'units',
+        'max_capacity': line.max_capacity,
+        'current_capacity_usage': line.current_capacity_usage,
+        'mixed_quality_approved': line.mixed_quality_approved
+    }
+
+
+@bp.route('/data', methods=['GET'])
+def data():
+    """One page of the lines table, for DataTables server-side processing"""
+    return data_response('line', request.args, format_line_row)
 
 
 @bp.route('/create', methods=['GET', 'POST'])
@@ -39,7 +74,7 @@ def create():
                 return jsonify({'status': 'error', 'message': 'Invalid capacity type'}), 400
             
             # Find warehouse
-            warehouse = next((w for w in warehouses if w.serial_number == warehouse_id), None)
+            warehouse = current_app.warehouse_system.get_warehouse(warehouse_id)
             
             if warehouse is None:
                 return jsonify({'status': 'error', 'message': 'Warehouse not found'}), 404
@@ -65,6 +100,75 @@ def create():
     
     return render_template('line/create.html', warehouses=warehouses)
 
+def format_placement(item, line):
+    """Format a put-away placement for a JSON response"""
+    return {
+        'item': item.serial_number,
+        'kind': 'pallet' if isinstance(item, Pallet) else 'carton',
+        'line': line.serial_number if line is not None else None,
+        'line_number': line.line_number if line is not None else None,
+        'warehouse': line.warehouse.serial_number if line is not None and line.warehouse else None
+    }
+
+@bp.route('/suggest', methods=['GET'])
+def suggest():
+    """Suggest a line for a pallet or carton"""
+    try:
+        system = current_app.warehouse_system
+        strategy = request.args.get('strategy', 'best_fit')
+        
+        if 'pallet_id' in request.args:
+            item = system.get_pallet(request.args['pallet_id'])
+        else:
+            item = system.get_package(request.args.get('package_id', ''))
+        
+        if item is None:
+            return jsonify({'status': 'error', 'message': 'Pallet or carton not found'}), 404
+        
+        line = system.suggest_location(item, strategy)
+        
+        if line is None:
+            return jsonify({'status': 'error', 'message': 'No line can take this item'}), 409
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'Line {line.line_number} suggested',
+            'placement': format_placement(item, line)
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/put-away', methods=['POST'])
+def put_away():
+    """Place many pallets and cartons on lines chosen by a put-away strategy"""
+    try:
+        system = current_app.warehouse_system
+        data = request.get_json(silent=True) or {}
+        strategy = data.get('strategy', request.form.get('strategy', 'best_fit'))
+        pallet_ids = data.get('pallet_ids', request.form.getlist('pallet_ids'))
+        package_ids = data.get('package_ids', request.form.getlist('package_ids'))
+        
+        items = [system.get_pallet(pallet_id) for pallet_id in pallet_ids]
+        items += [system.get_package(package_id) for package_id in package_ids]
+        missing = [item_id for item_id, item in zip(list(pallet_ids) + list(package_ids), items) if item is None]
+        if missing:
+            return jsonify({'status': 'error', 'message': f'Items not found: {", ".join(missing)}'}), 404
+        
+        placements = system.auto_put_away(items, strategy)
+        placed = sum(1 for item, line in placements if line is not None)
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'{placed} of {len(placements)} items placed',
+            'placements': [format_placement(item, line) for item, line in placements]
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/<serial_number>/approve-mixed', methods=['POST'])
 def approve_mixed(serial_number):
     """Approve a line for mixed quality packages"""
@@ -72,12 +176,7 @@ def approve_mixed(serial_number):
         max_types = int(request.form.get('max_types', 3))
         
         # Find the line
-        line = None
-        for warehouse in current_app.warehouse_system.get_all_warehouses():
-            for l in warehouse.lines:
-                if l.serial_number == serial_number:
-                    line = l
-                    break
+        line = current_app.warehouse_system.get_line(serial_number)
         
         if line is None:
             return jsonify({'status': 'error', 'message': 'Line not found'}), 404
@@ -96,29 +195,50 @@ def approve_mixed(serial_number):
 def history(serial_number):
     """Get package history for a line"""
     # Find the line
-    line = None
-    for warehouse in current_app.warehouse_system.get_all_warehouses():
-        for l in warehouse.lines:
-            if l.serial_number == serial_number:
-                line = l
-                break
+    line = current_app.warehouse_system.get_line(serial_number)
     
     if line is None:
         return jsonify({'status': 'error', 'message': 'Line not found'}), 404
     
-    # Get package history
-    history = current_app.warehouse_system.get_package_history(line)
+    # Only the most recent page is rendered, older entries come from history.json
+    total = current_app.warehouse_system.count_package_history(line)
+    offset = max(0, total - HISTORY_PAGE_SIZE)
+    history = current_app.warehouse_system.get_package_history(line, offset=offset)
     
     # Format history for display
-    formatted_history = []
-    for entry in history:
-        formatted_entry = {
-            'package_serial': entry['package'].serial_number,
-            'package_quality': entry['package'].quality_mark,
-            'package_mass': entry['package'].mass,
-            'action': entry['action'],
-            'timestamp': entry['timestamp'].isoformat()
-        }
-        formatted_history.append(formatted_entry)
+    formatted_history = [format_history_entry(entry) for entry in history]
+    
+    return render_template('line/history.html', line=line, history=formatted_history, total=total)
+
+@bp.route('/<serial_number>/history.json', methods=['GET'])
+def history_json(serial_number):
+    """Get a page of package history for a line in JSON format"""
+    line = current_app.warehouse_system.get_line(serial_number)
+    
+    if line is None:
+        return jsonify({'status': 'error', 'message': 'Line not found'}), 404
+    
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        limit = int(request.args.get('limit', 100))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid history query'}), 400
+    
+    if limit < 1 or offset < 0:
+        return jsonify({'status': 'error', 'message': 'Limit must be positive and offset non-negative'}), 400
+    limit = min(limit, MAX_HISTORY_LIMIT)
+    
+    total = current_app.warehouse_system.count_package_history(line, since, until)
+    history = current_app.warehouse_system.get_package_history(line, since, until, limit, offset)
     
-    return render_template('line/history.html', line=line, history=formatted_history)
\ No newline at end of file
+    return jsonify({
+        'status': 'success',
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'history': [format_history_entry(entry) for entry in history]
+    })
\ No newline at end of file
@@ -1,12 +1,69 @@
+import csv
+import io
+import json
+import math
 from flask import Blueprint, render_template, request, jsonify, current_app
+from app.models.inventory_index import package_placement
+from app.routes.datatables import data_response
+from app.routes.inventory_query import query_response
 
 bp = Blueprint('package', __name__, url_prefix='/package')
 
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def read_ndjson(stream):
+    """Yield one dict per non-blank line, None for lines that are not JSON objects"""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
 @bp.route('/', methods=['GET'])
 def index():
     """List all packages"""
-    packages = current_app.warehouse_system.manager.packages
-    return render_template('package/index.html', packages=packages)
+    return render_template('package/index.html')
+
+def format_package_row(package):
+    """Convert a package to a row of the packages table"""
+    return {
+        'serial_number': package.serial_number,
+        'package_type': package.package_type,
+        'quality_mark': package.quality_mark,
+        'mass': package.mass,
+        'created_at': package.created_at.isoformat()
+    }
+
+@bp.route('/data', methods=['GET'])
+def data():
+    """One page of the packages table, for DataTables server-side processing"""
+    return data_response('package', request.args, format_package_row)
+
+def format_package_record(package):
+    """Convert a package to a row of a query result"""
+    pallet = getattr(package, 'pallet', None)
+    line = pallet.location if pallet is not None else package.location
+    return {
+        'serial_number': package.serial_number,
+        'package_type': package.package_type,
+        'quality_mark': package.quality_mark,
+        'mass': package.mass,
+        'created_at': package.created_at.isoformat(),
+        'discarded': package.discarded,
+        'placement': package_placement(package),
+        'pallet': pallet.serial_number if pallet is not None else None,
+        'line': line.serial_number if line is not None else None
+    }
+
+@bp.route('/query', methods=['GET'])
+def query():
+    """Stream the packages matching indexed filters as NDJSON"""
+    return query_response('package', request.args,
+                          ('quality_mark', 'package_type', 'placement', 'discarded'),
+                          format_package_record)
 
 @bp.route('/create', methods=['GET', 'POST'])
 def create():
@@ -44,6 +101,33 @@ def create():
     
     return render_template('package/create.html')
 
+@bp.route('/bulk', methods=['POST'])
+def bulk():
+    """Create packages from a CSV or NDJSON request body, read as a stream"""
+    try:
+        if request.mimetype == 'text/csv':
+            stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+            rows = csv.DictReader(stream)
+        elif request.mimetype in NDJSON_TYPES:
+            rows = read_ndjson(io.TextIOWrapper(request.stream, encoding='utf-8'))
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Send text/csv or application/x-ndjson with package_type, quality_mark and mass'
+            }), 415
+        
+        result = current_app.warehouse_system.create_packages_bulk(rows)
+        
+        return jsonify({
+            'status': 'success',
+            'message': f"{len(result['created'])} packages created, {result['error_count']} rows rejected",
+            'packages': result['created'],
+            'error_count': result['error_count'],
+            'errors': result['errors']
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/load-to-pallet', methods=['POST'])
 def load_to_pallet():
     """Load a package to a pallet"""
@@ -52,17 +136,8 @@ def load_to_pallet():
         pallet_id = request.form['pallet_id']
         
         # Find package and pallet
-        package = None
-        for p in current_app.warehouse_system.manager.packages:
-            if p.serial_number == package_id:
-                package = p
-                break
-        
-        pallet = None
-        for p in current_app.warehouse_system.manager.pallets:
-            if p.serial_number == pallet_id:
-                pallet = p
-                break
+        package = current_app.warehouse_system.get_package(package_id)
+        pallet = current_app.warehouse_system.get_pallet(pallet_id)
         
         if package is None:
             return jsonify({'status': 'error', 'message': 'Package not found'}), 404
@@ -94,18 +169,8 @@ def load_to_line():
         line_id = request.form['line_id']
         
         # Find package and line
-        package = None
-        for p in current_app.warehouse_system.manager.packages:
-            if p.serial_number == package_id:
-                package = p
-                break
-        
-        line = None
-        for warehouse in current_app.warehouse_system.get_all_warehouses():
-            for l in warehouse.lines:
-                if l.serial_number == line_id:
-                    line = l
-                    break
+        package = current_app.warehouse_system.get_package(package_id)
+        line = current_app.warehouse_system.get_line(line_id)
         
         if package is None:
             return jsonify({'status': 'error', 'message': 'Package not found'}), 404
@@ -142,11 +207,7 @@ def offload():
         package_id = request.form['package_id']
         
         # Find package
-        package = None
-        for p in current_app.warehouse_system.manager.packages:
-            if p.serial_number == package_id:
-                package = p
-                break
+        package = current_app.warehouse_system.get_package(package_id)
         
         if package is None:
             return jsonify({'status': 'error', 'message': 'Package not found'}), 404
@@ -167,6 +228,66 @@ def offload():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def format_pick_plan(plan):
+    """Format a pick list for a JSON response"""
+    return {
+        'quality_mark': plan['quality_mark'],
+        'quantity': plan['quantity'],
+        'unit': plan['unit'],
+        'order': plan['order'],
+        'picked_units': plan['picked_units'],
+        'picked_mass': plan['picked_mass'],
+        'short': plan['short'],
+        'warehouses': [
+            {
+                'id': group['warehouse'].serial_number,
+                'name': group['warehouse'].name,
+                'lines': [
+                    {
+                        'id': line_group['line'].serial_number,
+                        'line_number': line_group['line'].line_number,
+                        'packages': [package.serial_number for package in line_group['packages']]
+                    }
+                    for line_group in group['lines']
+                ]
+            }
+            for group in plan['warehouses']
+        ]
+    }
+
+@bp.route('/pick', methods=['POST'])
+def pick():
+    """Plan, and unless dry_run is set offload, the packages for an outbound order"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        quality_mark = data.get('quality_mark', '')
+        quantity = float(data.get('quantity', 0))
+        unit = data.get('unit', 'units')
+        order = data.get('order') or None
+        dry_run = str(data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        
+        if not quality_mark:
+            return jsonify({'status': 'error', 'message': 'Quality mark is required'}), 400
+        if not math.isfinite(quantity) or quantity <= 0:
+            return jsonify({'status': 'error', 'message': 'Quantity must be a positive number'}), 400
+        
+        plan = current_app.warehouse_system.plan_pick(quality_mark, quantity, unit, order)
+        
+        picked = None
+        if not dry_run:
+            picked = current_app.warehouse_system.execute_pick(plan)
+        
+        return jsonify({
+            'status': 'success',
+            'message': f"{plan['picked_units']} packages planned" if dry_run else f"{len(picked)} packages picked",
+            'plan': format_pick_plan(plan),
+            'picked': [package.serial_number for package in picked] if picked is not None else None
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/discard', methods=['POST'])
 def discard():
     """Discard a package (mark as bad)"""
@@ -174,11 +295,7 @@ def discard():
         package_id = request.form['package_id']
         
         # Find package
-        package = None
-        for p in current_app.warehouse_system.manager.packages:
-            if p.serial_number == package_id:
-                package = p
-                break
+        package = current_app.warehouse_system.get_package(package_id)
         
         if package is None:
             return jsonify({'status': 'error', 'message': 'Package not found'}), 404
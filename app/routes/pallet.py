@@ -1,12 +1,47 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
+from app.models.inventory_index import pallet_placement
+from app.routes.datatables import data_response
+from app.routes.inventory_query import query_response
 
 bp = Blueprint('pallet', __name__, url_prefix='/pallet')
 
 @bp.route('/', methods=['GET'])
 def index():
     """List all pallets"""
-    pallets = current_app.warehouse_system.manager.pallets
-    return render_template('pallet/index.html', pallets=pallets)
+    return render_template('pallet/index.html')
+
+def format_pallet_row(pallet):
+    """Convert a pallet to a row of the pallets table"""
+    return {
+        'serial_number': pallet.serial_number,
+        'quality_mark': pallet.quality_mark,
+        'max_capacity': pallet.max_capacity,
+        'current_count': pallet.current_count,
+        'created_at': pallet.created_at.isoformat()
+    }
+
+@bp.route('/data', methods=['GET'])
+def data():
+    """One page of the pallets table, for DataTables server-side processing"""
+    return data_response('pallet', request.args, format_pallet_row)
+
+def format_pallet_record(pallet):
+    """Convert a pallet to a row of a query result"""
+    line = pallet.location
+    return {
+        'serial_number': pallet.serial_number,
+        'quality_mark': pallet.quality_mark,
+        'max_capacity': pallet.max_capacity,
+        'current_count': pallet.current_count,
+        'created_at': pallet.created_at.isoformat(),
+        'placement': pallet_placement(pallet),
+        'line': line.serial_number if line is not None else None
+    }
+
+@bp.route('/query', methods=['GET'])
+def query():
+    """Stream the pallets matching indexed filters as NDJSON"""
+    return query_response('pallet', request.args, ('quality_mark', 'placement'), format_pallet_record)
 
 @bp.route('/create', methods=['GET', 'POST'])
 def create():
@@ -39,6 +74,73 @@ def create():
     
     return render_template('pallet/create.html')
 
+@bp.route('/auto-palletize', methods=['POST'])
+def auto_palletize():
+    """Put unassigned loose packages on pallets and return the assignments"""
+    try:
+        data = request.get_json(silent=True) or {}
+        pallet_capacity = int(data.get('pallet_capacity', request.form.get('pallet_capacity', 0)))
+        package_ids = data.get('package_ids', request.form.getlist('package_ids'))
+        
+        if pallet_capacity <= 0:
+            return jsonify({'status': 'error', 'message': 'Pallet capacity must be positive'}), 400
+        
+        # Without a package list every unassigned loose package is palletized
+        packages = None
+        if package_ids:
+            packages = [current_app.warehouse_system.get_package(package_id) for package_id in package_ids]
+            missing = [package_id for package_id, package in zip(package_ids, packages) if package is None]
+            if missing:
+                return jsonify({'status': 'error', 'message': f'Packages not found: {", ".join(missing)}'}), 404
+        
+        result = current_app.warehouse_system.auto_palletize(packages, pallet_capacity)
+        
+        return jsonify({
+            'status': 'success',
+            'message': f"{sum(len(entry['packages']) for entry in result['pallets'])} packages placed on "
+                       f"{len(result['pallets'])} pallets",
+            'pallets': result['pallets'],
+            'skipped': result['skipped']
+        })
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Pallet capacity must be a whole number'}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/best', methods=['GET'])
+def best():
+    """Get the fullest pallet of a quality mark that still has room"""
+    try:
+        quality_mark = request.args.get('quality_mark', '')
+        placed = request.args.get('placed')
+        
+        if not quality_mark:
+            return jsonify({'status': 'error', 'message': 'Quality mark is required'}), 400
+        
+        # placed=true limits the search to pallets on a line, placed=false to pallets off a line
+        if placed is not None:
+            placed = placed.lower() in ('1', 'true', 'yes')
+        
+        pallet = current_app.warehouse_system.best_open_pallet(quality_mark, placed)
+        
+        if pallet is None:
+            return jsonify({'status': 'error', 'message': f'No pallet with room for quality {quality_mark}'}), 404
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Pallet found',
+            'pallet': {
+                'id': pallet.serial_number,
+                'quality_mark': pallet.quality_mark,
+                'current_count': pallet.current_count,
+                'max_capacity': pallet.max_capacity,
+                'available_capacity': pallet.available_capacity,
+                'line': pallet.location.serial_number if pallet.location is not None else None
+            }
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @bp.route('/load-to-line', methods=['POST'])
 def load_to_line():
     """Load a pallet to a line"""
@@ -47,18 +149,8 @@ def load_to_line():
         line_id = request.form['line_id']
         
         # Find pallet and line
-        pallet = None
-        for p in current_app.warehouse_system.manager.pallets:
-            if p.serial_number == pallet_id:
-                pallet = p
-                break
-        
-        line = None
-        for warehouse in current_app.warehouse_system.get_all_warehouses():
-            for l in warehouse.lines:
-                if l.serial_number == line_id:
-                    line = l
-                    break
+        pallet = current_app.warehouse_system.get_pallet(pallet_id)
+        line = current_app.warehouse_system.get_line(line_id)
         
         if pallet is None:
             return jsonify({'status': 'error', 'message': 'Pallet not found'}), 404
@@ -90,11 +182,7 @@ def offload():
         pallet_id = request.form['pallet_id']
         
         # Find pallet
-        pallet = None
-        for p in current_app.warehouse_system.manager.pallets:
-            if p.serial_number == pallet_id:
-                pallet = p
-                break
+        pallet = current_app.warehouse_system.get_pallet(pallet_id)
         
         if pallet is None:
             return jsonify({'status': 'error', 'message': 'Pallet not found'}), 404
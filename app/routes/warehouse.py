@@ -1,12 +1,48 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for
+import json
+from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for, Response, make_response, stream_with_context
+from app.routes.datatables import data_response
 
 bp = Blueprint('warehouse', __name__, url_prefix='/warehouse')
 
+# Bytes of NDJSON gathered before a chunk of a streamed snapshot is sent
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def ndjson_chunks(records):
+    """Encode records as NDJSON, grouped into chunks of about STREAM_CHUNK_SIZE bytes"""
+    chunk = []
+    size = 0
+    for record in records:
+        text = json.dumps(record, separators=(',', ':')) + '\n'
+        chunk.append(text)
+        size += len(text)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
 @bp.route('/', methods=['GET'])
 def index():
     """Show all warehouses"""
-    warehouses = current_app.warehouse_system.get_all_warehouses()
-    return render_template('warehouse/index.html', warehouses=warehouses)
+    return render_template('warehouse/index.html')
+
+def format_warehouse_row(warehouse):
+    """Convert a warehouse to a row of the warehouses table"""
+    usage = warehouse.current_capacity_usage
+    return {
+        'serial_number': warehouse.serial_number,
+        'name': warehouse.name,
+        'max_capacity': warehouse.max_capacity,
+        'lines': len(warehouse.lines),
+        'current_capacity_usage': usage,
+        'utilization_percentage': (usage / warehouse.max_capacity) * 100 if warehouse.max_capacity else 0
+    }
+
+@bp.route('/data', methods=['GET'])
+def data():
+    """One page of the warehouses table, for DataTables server-side processing"""
+    return data_response('warehouse', request.args, format_warehouse_row)
 
 @bp.route('/create', methods=['GET', 'POST'])
 def create():
@@ -38,26 +74,100 @@ def create():
     
     return render_template('warehouse/create.html')
 
+def not_modified(*etags):
+    """Build a 304 response if the client already holds one of the entity tags"""
+    for etag in etags:
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+    return None
+
 @bp.route('/<serial_number>', methods=['GET'])
 def detail(serial_number):
     """Show warehouse details"""
-    warehouses = current_app.warehouse_system.get_all_warehouses()
-    warehouse = next((w for w in warehouses if w.serial_number == serial_number), None)
+    warehouse = current_app.warehouse_system.get_warehouse(serial_number)
     
     if warehouse is None:
         return jsonify({'status': 'error', 'message': 'Warehouse not found'}), 404
     
+    etag = current_app.warehouse_system.warehouse_etag(warehouse) + '-html'
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
     snapshot = current_app.warehouse_system.get_warehouse_snapshot(warehouse)
-    return render_template('warehouse/detail.html', warehouse=warehouse, snapshot=snapshot)
+    response = make_response(render_template('warehouse/detail.html', warehouse=warehouse, snapshot=snapshot))
+    response.set_etag(etag)
+    return response
 
 @bp.route('/<serial_number>/snapshot', methods=['GET'])
 def snapshot(serial_number):
     """Get warehouse snapshot in JSON format"""
-    warehouses = current_app.warehouse_system.get_all_warehouses()
-    warehouse = next((w for w in warehouses if w.serial_number == serial_number), None)
+    warehouse = current_app.warehouse_system.get_warehouse(serial_number)
+    
+    if warehouse is None:
+        return jsonify({'status': 'error', 'message': 'Warehouse not found'}), 404
+    
+    # The gzip body is a different representation, so it gets its own entity tag
+    etag = current_app.warehouse_system.warehouse_etag(warehouse)
+    cached = not_modified(etag, etag + '-gzip')
+    if cached is not None:
+        return cached
+    
+    snapshot = current_app.warehouse_system.get_cached_snapshot(warehouse)
+    if 'gzip' in request.accept_encodings:
+        response = Response(snapshot.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(snapshot.etag + '-gzip')
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/<serial_number>/changes', methods=['GET'])
+def changes(serial_number):
+    """Get the changes to a warehouse since a version, or a full snapshot if they are gone"""
+    warehouse = current_app.warehouse_system.get_warehouse(serial_number)
     
     if warehouse is None:
         return jsonify({'status': 'error', 'message': 'Warehouse not found'}), 404
     
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'status': 'error', 'message': 'since must be a version number'}), 400
+    
+    version, records = current_app.warehouse_system.get_warehouse_changes(warehouse, since)
+    if records is not None:
+        return jsonify({
+            'status': 'success',
+            'version': version,
+            'full': False,
+            'changes': records
+        })
+    
+    # The version is too old (or from before a restart), start again from a snapshot
     snapshot = current_app.warehouse_system.get_warehouse_snapshot(warehouse)
-    return jsonify(snapshot)
\ No newline at end of file
+    return jsonify({
+        'status': 'success',
+        'version': snapshot['version'],
+        'full': True,
+        'snapshot': snapshot
+    })
+
+@bp.route('/<serial_number>/snapshot.ndjson', methods=['GET'])
+def snapshot_stream(serial_number):
+    """Stream a warehouse snapshot as NDJSON, one line or pallet record per row"""
+    warehouse = current_app.warehouse_system.get_warehouse(serial_number)
+    
+    if warehouse is None:
+        return jsonify({'status': 'error', 'message': 'Warehouse not found'}), 404
+    
+    line_number = request.args.get('line', type=int)
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = set(field.strip() for field in fields.split(',') if field.strip())
+    
+    records = current_app.warehouse_system.iter_warehouse_snapshot(warehouse, line_number, fields)
+    return Response(stream_with_context(ndjson_chunks(records)), mimetype='application/x-ndjson')
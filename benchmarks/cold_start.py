@@ -0,0 +1,74 @@
+"""
+Measure worker start-up from a binary snapshot.
+
+Builds an inventory of cartons spread over several warehouses, writes a
+snapshot, then times opening it, serving one warehouse and hydrating
+everything.
+
+Usage:
+    python benchmarks/cold_start.py [packages] [warehouses]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.line import Line
+from app.models.package import Carton
+from app.models.warehouse import Warehouse
+from app.models.warehouse_system import WarehouseSystem
+
+LINES_PER_WAREHOUSE = 10
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    warehouse_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    data_file = os.path.join(tempfile.mkdtemp(), "benchmark.json")
+
+    # Built through the manager so the operation log stays empty
+    system = WarehouseSystem(data_file, durability="sync")
+    manager = system.manager
+    lines = []
+    for i in range(warehouse_count):
+        warehouse = Warehouse(f"Warehouse {i}", count)
+        manager.add_warehouse(warehouse)
+        for number in range(LINES_PER_WAREHOUSE):
+            line = Line(number, count, capacity_type="count")
+            manager.add_line_to_warehouse(line, warehouse)
+            lines.append(line)
+    for i in range(count):
+        manager.load_package_to_line(Carton("ABC"[i % 3], 10.0), lines[i % len(lines)])
+    first_warehouse = manager.warehouses[0].serial_number
+
+    start = time.perf_counter()
+    system.write_snapshot()
+    written = time.perf_counter() - start
+    system.close()
+
+    start = time.perf_counter()
+    system = WarehouseSystem(data_file, durability="sync")
+    opened = time.perf_counter() - start
+
+    start = time.perf_counter()
+    system.get_warehouse(first_warehouse)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    system.get_all_warehouses()
+    rest = time.perf_counter() - start
+    assert len(system.manager.packages) == count
+    system.close()
+
+    print(f"Packages:        {count:,} in {warehouse_count} warehouses")
+    print(f"Snapshot size:   {os.path.getsize(system.storage.snapshot_file) / 1e6:.1f} MB")
+    print(f"Write snapshot:  {written:.2f}s")
+    print(f"Open:            {opened * 1000:.1f} ms")
+    print(f"First warehouse: {first * 1000:.1f} ms")
+    print(f"Everything else: {rest:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measure offloading every carton from a single line.
+
+Cartons are offloaded newest first, which is the worst case for the
+old list-backed line (every removal scanned to the end of the list).
+
+Usage:
+    python benchmarks/offload_cartons.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.line import Line
+from app.models.logistics_manager import LogisticsManager
+from app.models.package import Carton
+from app.models.warehouse import Warehouse
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    manager = LogisticsManager()
+    warehouse = Warehouse("Benchmark", count * 10)
+    manager.add_warehouse(warehouse)
+    line = Line(1, count, capacity_type="count")
+    manager.add_line_to_warehouse(line, warehouse)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        manager.load_package_to_line(Carton("A", 10.0), line)
+    loaded = time.perf_counter() - start
+
+    manager.set_offload_order("newest_first")
+    cartons = manager.get_packages_for_offloading(line)
+
+    start = time.perf_counter()
+    for carton in cartons:
+        manager.offload_package(carton)
+    offloaded = time.perf_counter() - start
+
+    assert line.package_count == 0 and len(line.packages) == 0
+
+    print(f"Cartons:   {count:,}")
+    print(f"Load:      {loaded:.2f}s ({loaded / count * 1e6:.1f} us/carton)")
+    print(f"Offload:   {offloaded:.2f}s ({offloaded / count * 1e6:.1f} us/carton)")
+
+
+if __name__ == "__main__":
+    main()
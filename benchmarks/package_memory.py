@@ -0,0 +1,59 @@
+"""
+Measure the memory cost of holding packages in memory.
+
+Compares the slotted Carton model with a replica of the original
+__dict__-based layout (per-instance package_type string and datetime).
+
+Usage:
+    python benchmarks/package_memory.py [count]
+"""
+import datetime
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.package import Carton
+
+
+class LegacyCarton:
+    """Replica of the Carton layout before slots were introduced"""
+
+    def __init__(self, quality_mark, mass):
+        self.serial_number = str(uuid.uuid4())
+        self.quality_mark = quality_mark
+        self.mass = mass
+        self.created_at = datetime.datetime.now()
+        self.location = None
+        self.discarded = False
+        self.package_type = "carton"
+
+
+def measure(factory, count):
+    """Return the bytes allocated per package when creating count packages"""
+    gc.collect()
+    tracemalloc.start()
+    packages = [factory("A", 12.5) for _ in range(count)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del packages
+    return allocated / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    before = measure(LegacyCarton, count)
+    after = measure(Carton, count)
+
+    print(f"Packages:           {count:,}")
+    print(f"Before (__dict__):  {before:.1f} bytes/package")
+    print(f"After (__slots__):  {after:.1f} bytes/package")
+    print(f"Saved:              {before - after:.1f} bytes/package ({(1 - after / before) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()